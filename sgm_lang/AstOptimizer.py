@@ -0,0 +1,300 @@
+from sgm_lang.CompoundToken import CompoundToken
+from sgm_lang.DataType import DataType
+from sgm_lang.Interpreter import BINARY_OPERATORS
+from sgm_lang.Parser import Compound, Assign, Var, Num, BinOp, LogicOp, Print, NoOp, If, While, Logic, postorder
+from sgm_lang.Token import Token
+from sgm_lang.TokenType import TokenType
+from sgm_lang.TypeChecker import valueType, isShortCircuit
+
+# Name of the n-th temporary holding a hoisted loop invariant expression, '$' keeps it apart from user variables
+LICM_TEMPORARY = "$licm{}"
+
+# Folded strings longer than this are left to be built at runtime, so "x" * 100000000 does not blow up compilation
+MAX_FOLDED_STRING_LENGTH = 4096
+
+PYTHON_TYPES = {
+    DataType.BOOL: bool,
+    DataType.INT: int,
+    DataType.FLOAT: float,
+    DataType.STRING: str,
+}
+
+CONSTANT_TOKENS = {
+    bool: CompoundToken.BOOL,
+    int: CompoundToken.INT,
+    float: CompoundToken.FLOAT,
+    str: CompoundToken.STRING,
+}
+
+COMPARISONS = (TokenType.EQUAL, TokenType.LESS, TokenType.GREATER, TokenType.LESS_EQUAL, TokenType.GREATER_EQUAL)
+
+
+def isConstant(node) -> bool:
+    return node.__class__ in (Num, Logic)
+
+
+class AstOptimizer:
+    """
+    Optimization pass over the AST, run before bytecode generation.
+    level 1 - folds constant subexpressions and replaces if/while with a constant condition by the taken branch,
+              computes loop invariant expressions of while loops once before the loop (see hoistInvariants)
+    level 2 - additionally removes identity operations (x * 1, x + 0, !!b, True && e, ...).
+              These depend on static types, so level 2 assumes variables hold values of their declared types.
+    """
+
+    def __init__(self, level: int = 1, inputs: dict = None):
+        """inputs : variable name -> DataType of variables given to the program, they are assigned from the start"""
+        self.level = level
+        # variable name -> python type from its declaration
+        self.declaredTypes = {name: PYTHON_TYPES[dataType] for name, dataType in (inputs or {}).items()}
+        # Variables declared in the blocks being optimized, they are assigned wherever the block goes on
+        self.assignedScopes = [set(self.declaredTypes)]
+        self.temporaries = 0
+
+    def optimize(self, ast: Compound) -> Compound:
+        if self.level > 0:
+            ast.children = self.optimizeStatements(ast.children)
+        return ast
+
+    def optimizeStatements(self, statements) -> list:
+        result = []
+        for node in statements:
+            if node.__class__ == Assign:
+                if node.left.ID:
+                    self.declaredTypes[node.left.name] = PYTHON_TYPES.get(node.left.ID)
+                    self.assignedScopes[-1].add(node.left.name)
+                node.right = self.optimizeExpression(node.right)
+                if node.toFloat and isConstant(node.right):
+                    self.foldToFloat(node)
+                result.append(node)
+            elif node.__class__ == Print:
+                node.value = self.optimizeExpression(node.value)
+                result.append(node)
+            elif node.__class__ == If:
+                result.extend(self.optimizeIf(node))
+            elif node.__class__ == While:
+                result.extend(self.optimizeWhile(node))
+            elif node.__class__ != NoOp:
+                result.append(node)
+        return result
+
+    def optimizeBlock(self, compound) -> list:
+        self.assignedScopes.append(set())
+        statements = self.optimizeStatements(compound.children)
+        self.assignedScopes.pop()
+        return statements
+
+    def optimizeIf(self, node) -> list:
+        node.expression = self.optimizeExpression(node.expression)
+        node.statements.children = self.optimizeBlock(node.statements)
+        if not isConstant(node.expression):
+            return [node]
+        if node.expression.value:
+            for statement in node.statements.children:
+                if statement.__class__ == Assign and statement.left.ID:
+                    self.assignedScopes[-1].add(statement.left.name)
+            return node.statements.children
+        # Declarations have to stay, later statements may refer to these variables
+        return [node] if self.declaresVariables(node.statements) else []
+
+    def optimizeWhile(self, node) -> list:
+        node.expression = self.optimizeExpression(node.expression)
+        node.statements.children = self.optimizeBlock(node.statements)
+        if isConstant(node.expression) and not node.expression.value and not self.declaresVariables(node.statements):
+            return []
+        return self.hoistInvariants(node) + [node]
+
+    def hoistInvariants(self, loop) -> list:
+        """
+        Replaces the largest subexpressions of the loop that read only variables the loop does not assign
+        with temporaries. Returns declarations of the temporaries, which go right before the loop.
+        A subexpression of the body, or of a part of the condition that may be skipped, is hoisted only if it cannot
+        fail and all variables it reads are already assigned, so computing it in advance is never observable.
+        The rest of the condition runs before the first iteration anyway, so it is hoisted as it is.
+        Nested loops are optimized first, their hoisted declarations are then hoisted further if possible.
+        """
+        self.loopAssigned = self.assignedVariables(loop.statements)
+        self.loopDefined = set().union(*self.assignedScopes)
+        self.hoisted = []
+        loop.expression = self.hoistExpression(loop.expression, loop.token, True)
+        self.hoistStatements(loop.statements.children, loop.token)
+        for declaration in self.hoisted:
+            self.assignedScopes[-1].add(declaration.left.name)
+        return self.hoisted
+
+    def hoistStatements(self, statements, token):
+        for node in statements:
+            if node.__class__ == Assign:
+                node.right = self.hoistExpression(node.right, token, False)
+            elif node.__class__ == Print:
+                node.value = self.hoistExpression(node.value, token, False)
+            elif node.__class__ in (If, While):
+                node.expression = self.hoistExpression(node.expression, token, False)
+                self.hoistStatements(node.statements.children, token)
+
+    def hoistExpression(self, expression, token, always: bool):
+        """always : the expression is evaluated every time the loop is reached"""
+        # Whether every subexpression is invariant and safe, computed bottom-up once
+        invariant, safe = {}, {}
+        for node in postorder(expression):
+            if node.__class__ == Var:
+                invariant[id(node)] = node.name not in self.loopAssigned
+                safe[id(node)] = node.name in self.loopDefined
+            elif node.__class__ in (BinOp, LogicOp):
+                operands = (node.right,) if node.left is None else (node.left, node.right)
+                invariant[id(node)] = all(invariant[id(operand)] for operand in operands)
+                safe[id(node)] = all(safe[id(operand)] for operand in operands) and not self.mayFail(node)
+            else:
+                invariant[id(node)] = safe[id(node)] = True
+
+        def hoistable(node, always):
+            return node.__class__ in (BinOp, LogicOp) and valueType(node) is not None and invariant[id(node)] \
+                and (always or safe[id(node)])
+
+        # Top-down, the largest hoistable subexpressions are replaced
+        if hoistable(expression, always):
+            return self.hoist(expression, token)
+        pending = [(expression, always)]
+        while pending:
+            node, always = pending.pop()
+            if node.__class__ not in (BinOp, LogicOp):
+                continue
+            # The right operand of && and || of bools is skipped when the left one decides the result
+            for name, operandAlways in (("left", always), ("right", always and not isShortCircuit(node))):
+                operand = getattr(node, name)
+                if operand is None:
+                    continue
+                if hoistable(operand, operandAlways):
+                    setattr(node, name, self.hoist(operand, token))
+                else:
+                    pending.append((operand, operandAlways))
+        return expression
+
+    def hoist(self, node, token) -> Var:
+        name = LICM_TEMPORARY.format(self.temporaries)
+        self.temporaries += 1
+        dataType = valueType(node)
+        self.declaredTypes[name] = PYTHON_TYPES[dataType]
+        declaration = Var(CompoundToken.DATA_TYPE, dataType, name)
+        self.hoisted.append(Assign(declaration, Token(TokenType.ASSIGN, None, token.line, token.column), node))
+        variable = Var(None, None, name)
+        variable.valueType = dataType
+        return variable
+
+    @staticmethod
+    def mayFail(node) -> bool:
+        """The operation itself may fail at runtime, types are known to match from the type checker"""
+        opType = node.op.type
+        if opType in (TokenType.DIV, TokenType.MOD) and not (isConstant(node.right) and node.right.value != 0):
+            return True
+        # Repeating a string may take any amount of memory
+        return opType == TokenType.MUL and DataType.STRING in (valueType(node.left), valueType(node.right))
+
+    def assignedVariables(self, compound) -> set:
+        names = set()
+        for node in compound.children:
+            if node.__class__ == Assign:
+                names.add(node.left.name)
+            elif node.__class__ in (If, While):
+                names |= self.assignedVariables(node.statements)
+        return names
+
+    def declaresVariables(self, compound) -> bool:
+        for node in compound.children:
+            if node.__class__ == Assign and node.left.ID:
+                return True
+            if node.__class__ in (If, While) and self.declaresVariables(node.statements):
+                return True
+        return False
+
+    def optimizeExpression(self, expression):
+        # Bottom-up without recursion, so deeply nested expressions are fine
+        optimized = {}  # id of a node -> node replacing it
+        for node in postorder(expression):
+            if node.__class__ in (BinOp, LogicOp):
+                if node.left is not None:
+                    node.left = optimized.pop(id(node.left))
+                node.right = optimized.pop(id(node.right))
+            optimized[id(node)] = self.optimizeOperation(node)
+        return optimized[id(expression)]
+
+    def optimizeOperation(self, node):
+        """Folds or simplifies an operation whose operands are already optimized"""
+        if node.__class__ == LogicOp:
+            if isConstant(node.right):
+                return self.constant(not node.right.value, node.op)
+            if self.level > 1 and node.right.__class__ == LogicOp and self.staticType(node.right.right) == bool:
+                # !!b -> b
+                return node.right.right
+            return node
+        if node.__class__ != BinOp:
+            return node
+        if isConstant(node.left) and isConstant(node.right):
+            return self.fold(node)
+        if self.level > 1:
+            return self.simplify(node)
+        return node
+
+    def fold(self, node):
+        left, right = node.left.value, node.right.value
+        if node.op.type == TokenType.MUL and (isinstance(left, str) or isinstance(right, str)):
+            text, count = (left, right) if isinstance(left, str) else (right, left)
+            if not isinstance(count, int) or len(text) * count > MAX_FOLDED_STRING_LENGTH:
+                return node
+        try:
+            value = BINARY_OPERATORS[node.op.type.getOpcode()](left, right)
+        except Exception:
+            # e.g. division by zero - left for the runtime to report
+            return node
+        if isinstance(value, str) and len(value) > MAX_FOLDED_STRING_LENGTH:
+            return node
+        return self.constant(value, node.op)
+
+    def foldToFloat(self, node):
+        """Converts the constant assigned to a boatWhichFloat variable at compile time"""
+        try:
+            value = float(node.right.value)
+        except OverflowError:
+            # Left for the runtime to report
+            return
+        node.right = self.constant(value, node.right.token)
+        node.toFloat = False
+
+    def simplify(self, node):
+        opType = node.op.type
+        leftType, rightType = self.staticType(node.left), self.staticType(node.right)
+        # x + 0 and x - 0 change -0.0 into 0.0 for floats, so only ints drop them
+        if opType in (TokenType.ADD, TokenType.SUB) and leftType == int and self.isConstantEqual(node.right, int, 0):
+            return node.left
+        if opType == TokenType.ADD and rightType == int and self.isConstantEqual(node.left, int, 0):
+            return node.right
+        if opType == TokenType.SUB and leftType == float and self.isConstantEqual(node.right, int, 0):
+            return node.left
+        if opType == TokenType.MUL:
+            if leftType in (int, float) and self.isConstantEqual(node.right, int, 1):
+                return node.left
+            if rightType in (int, float) and self.isConstantEqual(node.left, int, 1):
+                return node.right
+        if opType == TokenType.DIV and leftType == float and self.isConstantEqual(node.right, int, 1):
+            return node.left
+        if opType in (TokenType.AND, TokenType.OR):
+            neutral = opType == TokenType.AND
+            if rightType == bool and self.isConstantEqual(node.left, bool, neutral):
+                return node.right
+            if leftType == bool and self.isConstantEqual(node.right, bool, neutral):
+                return node.left
+        return node
+
+    @staticmethod
+    def isConstantEqual(node, valueType, value) -> bool:
+        return isConstant(node) and type(node.value) == valueType and node.value == value
+
+    def staticType(self, node):
+        """Python type the expression evaluates to, None when it cannot be told before running"""
+        if node.__class__ == Var and node.valueType is None:
+            return self.declaredTypes.get(node.name)
+        return PYTHON_TYPES.get(valueType(node))
+
+    @staticmethod
+    def constant(value, token):
+        return Num(Token(CONSTANT_TOKENS[type(value)], value, token.line, token.column))
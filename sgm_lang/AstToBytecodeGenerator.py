@@ -1,216 +1,131 @@
-from sgm_lang.tokenizer import Tokenizer
 from sgm_lang.TokenType import TokenType
-from sgm_lang.Parser import Parser, Assign, Var, Num, BinOp, LogicOp, Print, NoOp, If, While, Logic
-from sgm_lang.BytecodeGenerator import BytecodeGenerator
-from sgm_lang.Opcode import Operation
-from sgm_lang.Interpreter import BytecodeInterpreter
+from sgm_lang.Parser import Assign, Var, Num, BinOp, LogicOp, Print, NoOp, If, While, Logic
+from sgm_lang.BytecodeEmitter import BytecodeEmitter, Label
+from sgm_lang.Opcode import Opcode, Operation
+from sgm_lang.TypeChecker import typedOpcode, isShortCircuit, variableSlot
 from typing import List
 
 class AstToBytecodeGenerator():
-    def __init__(self, ast):
+    """
+    Generates bytecode in one pass over the AST, appending to a single BytecodeEmitter buffer.
+    Operations on operands whose types TypeChecker has inferred get typed opcodes.
+    && and || of bools skip their right operand once the left one decides the result.
+    In if and while conditions they, and !, are compiled to jumps instead of values.
+    """
+    def __init__(self, ast, inputs=()):
+        """inputs : names of variables given to the program, they take the first slots"""
         self.ast = ast
-        self.variables = set()
+        self.variables = {name: slot for slot, name in enumerate(inputs)}  # variable name -> slot number
+        self.emitter = BytecodeEmitter()
 
     def generate(self) -> List[Operation]:
-        program = []
         for node in self.ast.children:
             if node.__class__ == NoOp:
                 continue
-            elif node.__class__ == Assign:
-                op = self.generateAssign(node)
-            elif node.__class__ == Print:
-                op = self.generatePrint(node)
-            elif node.__class__ == If:
-                op = self.generateIf(node)
-            elif node.__class__ == While:
-                op = self.generateWhile(node)
+            self.generateStatement(node)
+        return self.emitter.finish()
 
-            program.extend(op)
-        return program
+    def slotNames(self) -> List[str]:
+        names = [None] * len(self.variables)
+        for name, slot in self.variables.items():
+            names[slot] = name
+        return names
 
-    def generateSubprogram(self, nodes) -> List[Operation]:
-        program = []
+    def generateSubprogram(self, nodes):
         for node in nodes.children:
-            op = None
             if node.__class__ == NoOp:
-                return program
-            elif node.__class__ == Assign:
-                op = self.generateAssign(node)
-            elif node.__class__ == Print:
-                op = self.generatePrint(node)
-            elif node.__class__ == If:
-                op = self.generateIf(node)
-            elif node.__class__ == While:
-                op = self.generateWhile(node)
-
-            program.extend(op)
-        return program
-
-    def checkVarAssign(self, var):
-        if not var.ID:
-            if var.name not in self.variables:
-                raise Exception(f"Variable {var.name} was not defined")
-        else:
-            if var.name in self.variables:
-                raise Exception(f"Variable {var.name} redefinition")
-        self.variables.add(var.name)
-
-
-    def generateAssign(self, node) -> Operation:
-        self.checkVarAssign(node.left)
-        if node.right.__class__ == Var:
-            op = BytecodeGenerator.generateVariableSet(
-                node.left.name, BytecodeGenerator.generateVariableDereference(node.right.name))
-        elif node.right.__class__ in (Num, Logic):
-            op = BytecodeGenerator.generateVariableSetConstant(
-                node.left.name, node.right.value)
-        elif node.right.__class__ in (BinOp, LogicOp):
-            op = BytecodeGenerator.generateVariableSet(node.left.name, self.generateExpresion(node.right))
-
-        return op
-
-    def generateExpresion(self, node):
-        if (node.__class__ == Var):
-            return BytecodeGenerator.generateVariableDereference(node.name)
-        elif node.__class__ in (Num, Logic):
-            return BytecodeGenerator.generateConstant(node.value)
-        else:
-            if node.left.__class__ in (BinOp, LogicOp):
-                leftOp = self.generateExpresion(node.left)
-            else:
-                if node.left.__class__ == Var:
-                    leftOp = BytecodeGenerator.generateVariableDereference(node.left.name)
-                elif node.left.__class__ in (Num, Logic):
-                    leftOp = BytecodeGenerator.generateConstant(node.left.value)
-
-            if node.right.__class__ in (BinOp, LogicOp):
-                rightOp = self.generateExpresion(node.right)
+                return
+            self.generateStatement(node)
+
+    def generateStatement(self, node):
+        """Operations of a statement are tagged with its source line, nested statements keep their own"""
+        outerLine = self.emitter.line
+        self.emitter.line = node.token.line
+        if node.__class__ == Assign:
+            self.generateAssign(node)
+        elif node.__class__ == Print:
+            self.generatePrint(node)
+        elif node.__class__ == If:
+            self.generateIf(node)
+        elif node.__class__ == While:
+            self.generateWhile(node)
+        self.emitter.line = outerLine
+
+    def generateVariableDereference(self, name: str):
+        self.emitter.emit(Opcode.LOAD_SLOT, self.variables[name])
+
+    def generateAssign(self, node):
+        self.generateExpresion(node.right)
+        if node.toFloat:
+            self.emitter.emit(Opcode.TO_FLOAT)
+        self.emitter.emit(Opcode.STORE_SLOT, variableSlot(self.variables, node.left))
+
+    def generateExpresion(self, expression):
+        # A work list instead of recursion, so deeply nested expressions are fine. Items are nodes still to generate,
+        # opcodes to emit once their operands are, jumps (opcode, label) and labels to place
+        pending = [expression]
+        while pending:
+            item = pending.pop()
+            if item.__class__ == Var:
+                self.generateVariableDereference(item.name)
+            elif item.__class__ in (Num, Logic):
+                self.emitter.emitConstant(item.value)
+            elif item.__class__ == Opcode:
+                self.emitter.emit(item)
+            elif item.__class__ == tuple:
+                self.emitter.emitJump(*item)
+            elif item.__class__ == Label:
+                self.emitter.placeLabel(item)
+            elif isShortCircuit(item):
+                end = self.emitter.newLabel()
+                jump = Opcode.JMP_IF_FALSE_OR_POP if item.op.type == TokenType.AND else Opcode.JMP_IF_TRUE_OR_POP
+                pending += [end, item.right, (jump, end), item.left]
+            elif item.__class__ in (BinOp, LogicOp):
+                pending += [typedOpcode(item), item.right]
+                if item.left is not None:
+                    pending.append(item.left)
+
+    def generateConditionJump(self, condition, label, when: bool):
+        """Jumps to label if the condition evaluates to 'when', falls through otherwise"""
+        # Work list of (node, label, when) still to generate and labels to place
+        pending = [(condition, label, when)]
+        while pending:
+            item = pending.pop()
+            if item.__class__ == Label:
+                self.emitter.placeLabel(item)
+                continue
+            node, label, when = item
+            if node.__class__ == LogicOp:
+                pending.append((node.right, label, not when))
+            elif isShortCircuit(node):
+                if (node.op.type == TokenType.OR) == when:
+                    # a || b jumps on true and a && b on false as soon as either operand does
+                    pending += [(node.right, label, when), (node.left, label, when)]
+                else:
+                    decided = self.emitter.newLabel()
+                    pending += [decided, (node.right, label, when), (node.left, decided, not when)]
             else:
-                if node.right.__class__ == Var:
-                    rightOp = BytecodeGenerator.generateVariableDereference(node.right.name)
-                elif node.right.__class__ in (Num, Logic):
-                    rightOp = BytecodeGenerator.generateConstant(node.right.value)
-
-        if node.op[0] == TokenType.NOT:
-            return BytecodeGenerator.generateUnaryExpression(rightOp, node.op[0].getOpcode())
-
-        return BytecodeGenerator.generateMathExpression(leftOp, rightOp, node.op[0].getOpcode())
+                self.generateExpresion(node)
+                self.emitter.emitJump(Opcode.JMP_IF if when else Opcode.JMP_NOT_IF, label)
 
     def generatePrint(self, node):
-        if node.value.__class__ == Var:
-            op = BytecodeGenerator.generatePrintExpression(
-                BytecodeGenerator.generateVariableDereference(node.value.name))
-        elif node.value.__class__ in (Num, Logic):
-            op = BytecodeGenerator.generatePrintConstant(node.value.value)
-        elif node.value.__class__ in (BinOp, LogicOp):
-            op = BytecodeGenerator.generatePrintExpression(
-                self.generateExpresion(node.value))
-
-        return op
+        if node.value.__class__ in (Num, Logic):
+            self.emitter.emit(Opcode.PRINTC, node.value.value)
+        else:
+            self.generateExpresion(node.value)
+            self.emitter.emit(Opcode.PRINT)
 
     def generateIf(self, node):
-        cond = self.generateExpresion(node.expression)
-        body = self.generateSubprogram(node.statements)
-
-        return BytecodeGenerator.generateIf(body, cond)
+        end = self.emitter.newLabel()
+        self.generateConditionJump(node.expression, end, False)
+        self.generateSubprogram(node.statements)
+        self.emitter.placeLabel(end)
 
     def generateWhile(self, node):
-        cond = self.generateExpresion(node.expression)
-        body = self.generateSubprogram(node.statements)
-
-        return BytecodeGenerator.generateWhile(body, cond)
-
-if __name__ == "__main__":
-    text = "bool zmienna = True && False;" \
-            "showMeYourGoods(\"slowo\");" \
-            "showMeYourGoods(4);" \
-            "showMeYourGoods(zmienna);"
-    text2 = "mrINTernational zmienna = 12 * 4 - 5;" \
-             "stringiBoi slowo = \"SloWa Ze Spacjami 1 2 +\";" \
-            "mrINTernational zmienna2 = 12 * 4 - zmienna;" \
-            "showMeYourGoods(slowo);" \
-            "showMeYourGoods(1+2*4-(90 / 10));" \
-            "showMeYourGoods(zmienna);" \
-            "showMeYourGoods(zmienna2);"
-    text3 = "bool zmienna = 1 + 3;" \
-            "showMeYourGoods(zmienna);"# !(1 + 4 < 2 *4 ) ||
-    text4 =  "doItIf(True) {" \
-            "bool zmienna = False;" \
-            "showMeYourGoods(zmienna);" \
-            "showMeYourGoods(1);" \
-            "}" \
-            "showMeYourGoods(123);;"
-    text5 = "showMeYourGoods(!(1 + 4 < 2 *4 ) || ( 0 && !(1)));" \
-            "youSpinMeRound((1 + 4 < 2 *4 ) || ( 0 && !(1))) {" \
-            "bool zmienna = !(1 + 4 < 2 *4 ) || ( False && !True);" \
-            "showMeYourGoods(zmienna);" \
-            "showMeYourGoods(1+2*4-(90 / 10) % 3);" \
-            "}"
-    text6 = """
-        # to jest komentarz
-        bool zmienna = True;
-        # Tu też jest komentarz
-        """
-    text7 = """
-        mrINTernational a = 0 - 5;
-        showMeYourGoods("start");
-        youSpinMeRound(a < 10)
-        {
-            a = a + 1;
-            showMeYourGoods(a);
-        }
-        showMeYourGoods("end");
-        a = 0;
-        youSpinMeRound(a <= 10)
-        {
-            a = a + 1;
-            showMeYourGoods(a);
-        }
-        youSpinMeRound((!(1 + 4 < 2 *4 )) || ( 0 && !(1))){showMeYourGoods("test -> False");}
-        doItIf((1 + 4 < 2 *4 ) || ( 0 && !(1)))
-        {
-        
-        
-        
-            showMeYourGoods("test -> True");
-        }
-        
-        doItIf(True)
-        {
-            showMeYourGoods("test -> True2");
-        }
-        
-        showMeYourGoods(a);
-        showMeYourGoods(a * a);
-        # to jest komentarz
-        bool zmiennaB = !True;
-        # Tu też jest komentarz
-        showMeYourGoods(zmiennaB);
-    """
-    lexer = Tokenizer(text7).tokenize()
-    type, val = lexer[0]
-    print(f'Lexer: {lexer[0]}')
-    print(f'Lexer: {lexer}')
-
-    parser = Parser(lexer)
-
-    # try:
-    #     result = parser.parse()
-    #     print(f'Parser2: {result}')
-    #     program = AstToBytecodeGenerator(result).generate()
-    #     print(program.__class__.__name__)
-    #
-    #     print("inter")
-    #     interpreter = BytecodeInterpreter(program)
-    #     interpreter.run()
-    # except:
-    #     print("Error")
-
-    result = parser.parse()
-    print(f'Parser2: {result}')
-    program = AstToBytecodeGenerator(result).generate()
-    print(program.__class__.__name__)
-
-    print("inter")
-    interpreter = BytecodeInterpreter(program)
-    interpreter.run()
\ No newline at end of file
+        start = self.emitter.newLabel()
+        end = self.emitter.newLabel()
+        self.emitter.placeLabel(start)
+        self.generateConditionJump(node.expression, end, False)
+        self.generateSubprogram(node.statements)
+        self.emitter.emitJump(Opcode.JMP, start)
+        self.emitter.placeLabel(end)
@@ -0,0 +1,135 @@
+import math
+from types import CodeType
+from typing import List
+
+from sgm_lang.Opcode import Opcode, PYTHON_OPERATORS
+from sgm_lang.Parser import Assign, Var, Num, Print, NoOp, If, While, Logic, postorder
+from sgm_lang.TypeChecker import AssignedScopes, isShortCircuit, variableSlot
+
+# Used instead of PYTHON_OPERATORS for && and || of two bools, which skip the right operand once the left one decides the result
+SHORT_CIRCUIT_OPERATORS = {
+    Opcode.BINARY_AND: "and",
+    Opcode.BINARY_OR: "or",
+}
+
+FILENAME = "<sgm>"
+INDENT = "    "
+
+
+class PythonProgram:
+    """
+    Python source of a compiled SGM program.
+    The source defines 'program(write, UNDEFINED, undefined, constants)', variables are its locals.
+    'lines[n]' is the SGM line of the n-th (1-based) line of the source.
+    """
+
+    def __init__(self, source: str, lines: List[int], constants: list):
+        self.source = source
+        self.lines = lines
+        self.constants = constants
+
+    def compile(self) -> CodeType:
+        """Raises SyntaxError, RecursionError or MemoryError when CPython cannot compile the source"""
+        return compile(self.source, FILENAME, "exec")
+
+
+class AstToPythonGenerator():
+    """
+    Translates the AST into Python source, so that SGM loops run as CPython loops.
+    Every statement is one line of source and remembers its SGM line for runtime errors.
+    """
+    def __init__(self, ast):
+        self.ast = ast
+        self.variables = {}  # variable name -> slot number, the Python local is 'v<slot>'
+        self.constants = []  # values that have no literal in Python (inf, nan)
+        self.code = []
+        self.lines = [None]
+        self.line = None
+        self.depth = 1
+        self.assignedScopes = AssignedScopes()
+
+    def generate(self) -> PythonProgram:
+        for node in self.ast.children:
+            if node.__class__ == NoOp:
+                continue
+            self.generateStatement(node)
+
+        header = ["def program(write, UNDEFINED, undefined, constants):"]
+        if self.variables:
+            # A variable declared in a skipped block still has to exist to be reported as undefined
+            header.append(INDENT + " = ".join(self.local(slot) for slot in range(len(self.variables))) + " = UNDEFINED")
+        body = self.code or [INDENT + "pass"]
+        lines = [None] * (len(header) + 1) + self.lines[1:]
+        return PythonProgram("\n".join(header + body) + "\n", lines, self.constants)
+
+    def emit(self, text: str):
+        self.code.append(INDENT * self.depth + text)
+        self.lines.append(self.line)
+
+    @staticmethod
+    def local(slot: int) -> str:
+        return f"v{slot}"
+
+    def generateSubprogram(self, nodes):
+        self.assignedScopes.enter()
+        self.depth += 1
+        start = len(self.code)
+        for node in nodes.children:
+            if node.__class__ == NoOp:
+                break
+            self.generateStatement(node)
+        if len(self.code) == start:
+            self.emit("pass")
+        self.depth -= 1
+        self.assignedScopes.leave()
+
+    def generateStatement(self, node):
+        outerLine = self.line
+        self.line = node.token.line
+        if node.__class__ == Assign:
+            self.generateAssign(node)
+        elif node.__class__ == Print:
+            self.emit(f"write({self.generateExpression(node.value)})")
+        elif node.__class__ == If:
+            self.emit(f"if {self.generateExpression(node.expression)}:")
+            self.generateSubprogram(node.statements)
+        elif node.__class__ == While:
+            self.emit(f"while {self.generateExpression(node.expression)}:")
+            self.generateSubprogram(node.statements)
+        self.line = outerLine
+
+    def generateAssign(self, node):
+        value = self.generateExpression(node.right)
+        if node.toFloat:
+            value = f"float({value})"
+        self.emit(f"{self.local(variableSlot(self.variables, node.left))} = {value}")
+        self.assignedScopes.assign(node.left.name)
+
+    def generateVariable(self, name: str) -> str:
+        local = self.local(self.variables[name])
+        if self.assignedScopes.mayBeUndefined(name):
+            return f"({local} if {local} is not UNDEFINED else undefined({name!r}))"
+        return local
+
+    def generateConstant(self, value) -> str:
+        if isinstance(value, float) and not math.isfinite(value):
+            self.constants.append(value)
+            return f"constants[{len(self.constants) - 1}]"
+        return repr(value)
+
+    def generateExpression(self, expression) -> str:
+        # Bottom-up without recursion, deeply nested expressions are left for CPython to accept or refuse
+        sources = {}  # id of a node -> its source
+        for node in postorder(expression):
+            if node.__class__ == Var:
+                source = self.generateVariable(node.name)
+            elif node.__class__ in (Num, Logic):
+                source = self.generateConstant(node.value)
+            elif node.left is None:
+                source = f"(not {sources.pop(id(node.right))})"
+            else:
+                opcode = node.op.type.getOpcode()
+                operator = SHORT_CIRCUIT_OPERATORS[opcode] if isShortCircuit(node) else PYTHON_OPERATORS[opcode]
+                source = f"({sources.pop(id(node.left))} {operator} {sources.pop(id(node.right))})"
+            sources[id(node)] = source
+        return sources[id(expression)]
@@ -0,0 +1,183 @@
+from sgm_lang.PackedBytecode import constantKey
+from sgm_lang.Parser import Assign, Var, Num, Print, NoOp, If, While, Logic
+from sgm_lang.RegisterBytecode import RegisterOpcode, RegisterOperation, RegisterProgram, REGISTER_OPCODES
+from sgm_lang.TokenType import TokenType
+from sgm_lang.TypeChecker import AssignedScopes, isShortCircuit, variableSlot
+
+# Register kinds used while generating, register numbers are known only once all variables and constants are
+SLOT, CONSTANT, TEMPORARY = range(3)
+
+# Steps of generateExpression: evaluate a node, emit an operation once its operands are evaluated,
+# emit the jump of && or || after the left operand and place its target after the right one
+EXPRESSION, OPERATION, SHORT_CIRCUIT_JUMP, SHORT_CIRCUIT_END = range(4)
+
+
+class AstToRegisterGenerator():
+    """
+    Generates register code for RegisterInterpreter from the same AST as AstToBytecodeGenerator.
+    Variables live in fixed registers, so 'a = a + 1' is a single ADD r(a), r(a), r(1).
+    Temporaries are allocated like a stack and reused as soon as the expression using them is done.
+    && and || of bools jump over their right operand once the left one decides the result.
+    """
+    def __init__(self, ast):
+        self.ast = ast
+        self.variables = {}  # variable name -> slot number
+        self.constants = {}  # constantKey of a value -> constant number
+        self.operations = []
+        self.line = None
+        self.temporaries = 0  # temporaries in use
+        self.temporaryCount = 0  # temporaries needed by the whole program
+        self.assignedScopes = AssignedScopes()
+
+    def generate(self) -> RegisterProgram:
+        for node in self.ast.children:
+            if node.__class__ == NoOp:
+                continue
+            self.generateStatement(node)
+        return self.resolve()
+
+    def resolve(self) -> RegisterProgram:
+        """Replaces (kind, number) operands with register numbers"""
+        slotNames = [None] * len(self.variables)
+        for name, slot in self.variables.items():
+            slotNames[slot] = name
+        constants = [key[1] for key in self.constants]
+        bases = {SLOT: 0, CONSTANT: len(slotNames), TEMPORARY: len(slotNames) + len(constants)}
+        for operation in self.operations:
+            operation.operands = [bases[operand[0]] + operand[1] if isinstance(operand, tuple) else operand
+                                  for operand in operation.operands]
+        return RegisterProgram(self.operations, constants, slotNames, self.temporaryCount)
+
+    def emit(self, opcode: RegisterOpcode, *operands) -> RegisterOperation:
+        operation = RegisterOperation(opcode, list(operands), self.line)
+        self.operations.append(operation)
+        return operation
+
+    def generateSubprogram(self, nodes):
+        self.assignedScopes.enter()
+        for node in nodes.children:
+            if node.__class__ == NoOp:
+                break
+            self.generateStatement(node)
+        self.assignedScopes.leave()
+
+    def generateStatement(self, node):
+        outerLine = self.line
+        self.line = node.token.line
+        if node.__class__ == Assign:
+            self.generateAssign(node)
+        elif node.__class__ == Print:
+            self.generatePrint(node)
+        elif node.__class__ == If:
+            self.generateIf(node)
+        elif node.__class__ == While:
+            self.generateWhile(node)
+        self.temporaries = 0
+        self.line = outerLine
+
+    def newTemporary(self):
+        register = (TEMPORARY, self.temporaries)
+        self.temporaries += 1
+        self.temporaryCount = max(self.temporaryCount, self.temporaries)
+        return register
+
+    def constantRegister(self, value):
+        key = constantKey(value)
+        if key not in self.constants:
+            self.constants[key] = len(self.constants)
+        return CONSTANT, self.constants[key]
+
+    def variableRegister(self, name: str):
+        register = (SLOT, self.variables[name])
+        if self.assignedScopes.mayBeUndefined(name):
+            self.emit(RegisterOpcode.CHECK, register)
+        return register
+
+    def generateAssign(self, node):
+        # The last operation of the right side, or the conversion of an int to float, writes straight into the variable
+        target = (SLOT, variableSlot(self.variables, node.left))
+        if node.toFloat:
+            self.emit(RegisterOpcode.TO_FLOAT, target, self.generateExpression(node.right))
+        else:
+            self.generateExpression(node.right, target)
+        self.assignedScopes.assign(node.left.name)
+
+    def generateExpression(self, expression, target=None):
+        """Emits code evaluating the expression, returns the register holding its value (target if given)"""
+        # A work list of (step, node, target, result, temporaries) instead of recursion, so deeply nested
+        # expressions are fine. 'values' holds registers of evaluated operands and jumps of && and ||
+        # waiting for the end of their right operand
+        pending = [(EXPRESSION, expression, target, None, None)]
+        values = []
+        while pending:
+            step, node, target, result, temporaries = pending.pop()
+            if step == EXPRESSION:
+                if node.__class__ == Var:
+                    register = self.variableRegister(node.name)
+                elif node.__class__ in (Num, Logic):
+                    register = self.constantRegister(node.value)
+                elif isShortCircuit(node):
+                    # && and || of bools: the right operand is skipped when the left one decides the result.
+                    # Not computed straight into target, the right operand may still read the variable
+                    result = self.newTemporary()
+                    temporaries = self.temporaries
+                    pending += [(SHORT_CIRCUIT_END, node, target, result, temporaries),
+                                (EXPRESSION, node.right, result, None, None),
+                                (SHORT_CIRCUIT_JUMP, node, None, result, temporaries),
+                                (EXPRESSION, node.left, result, None, None)]
+                    continue
+                else:
+                    pending += [(OPERATION, node, target, None, self.temporaries),
+                                (EXPRESSION, node.right, None, None, None)]
+                    if node.left is not None:
+                        pending.append((EXPRESSION, node.left, None, None, None))
+                    continue
+                if target is not None and target != register:
+                    self.emit(RegisterOpcode.MOVE, target, register)
+                    register = target
+                values.append(register)
+            elif step == OPERATION:
+                right = values.pop()
+                left = values.pop() if node.left is not None else None
+                # Operands are read before the result is written, so their temporaries can hold it
+                self.temporaries = temporaries
+                if target is None:
+                    target = self.newTemporary()
+                opcode = REGISTER_OPCODES[node.op.type.getOpcode()]
+                if left is None:
+                    self.emit(opcode, target, right)
+                else:
+                    self.emit(opcode, target, left, right)
+                values.append(target)
+            elif step == SHORT_CIRCUIT_JUMP:
+                values.pop()
+                self.temporaries = temporaries
+                jumpOpcode = RegisterOpcode.JMP_NOT_IF if node.op.type == TokenType.AND else RegisterOpcode.JMP_IF
+                values.append(self.emit(jumpOpcode, result, None))
+            else:
+                values.pop()
+                jump = values.pop()
+                self.temporaries = temporaries
+                jump.operands[-1] = len(self.operations)
+                if target is not None:
+                    self.emit(RegisterOpcode.MOVE, target, result)
+                    result = target
+                values.append(result)
+        return values.pop()
+
+    def generatePrint(self, node):
+        self.emit(RegisterOpcode.PRINT, self.generateExpression(node.value))
+
+    def generateIf(self, node):
+        jump = self.emit(RegisterOpcode.JMP_NOT_IF, self.generateExpression(node.expression), None)
+        self.temporaries = 0
+        self.generateSubprogram(node.statements)
+        jump.operands[-1] = len(self.operations)
+
+    def generateWhile(self, node):
+        start = len(self.operations)
+        jump = self.emit(RegisterOpcode.JMP_NOT_IF, self.generateExpression(node.expression), None)
+        self.temporaries = 0
+        self.generateSubprogram(node.statements)
+        self.emit(RegisterOpcode.JMP, start)
+        jump.operands[-1] = len(self.operations)
@@ -0,0 +1,126 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+from sgm_lang.BytecodeCache import BytecodeCache, CACHE_DIRECTORY
+from sgm_lang.OutputBuffer import OutputBuffer
+from sgm_lang.Program import ExecutionContext, loadProgram
+
+SCRIPT_EXTENSION = ".sgm"
+OUTPUT_EXTENSION = ".out"
+
+# Exit statuses of a script
+OK = 0
+COMPILE_ERROR = 1
+RUNTIME_ERROR = 2
+OUTPUT_ERROR = 3
+
+STATUS_NAMES = {
+    OK: "ok",
+    COMPILE_ERROR: "compile error",
+    RUNTIME_ERROR: "runtime error",
+    OUTPUT_ERROR: "output error",
+}
+
+# Scripts sent to a worker at once is about (number of scripts) / (jobs * CHUNKS_PER_JOB)
+CHUNKS_PER_JOB = 4
+
+
+class ScriptResult:
+    """
+    Outcome of one script of a batch.
+    status  : OK, COMPILE_ERROR, RUNTIME_ERROR or OUTPUT_ERROR if the output file could not be written
+    seconds : time the script ran in its worker
+    output  : printed values, None when they were written to an output file
+    """
+
+    def __init__(self, path: str, status: int, seconds: float = 0.0, output: str = None, error: str = None):
+        self.path = path
+        self.status = status
+        self.seconds = seconds
+        self.output = output
+        self.error = error
+
+
+def findScripts(directory: str) -> List[str]:
+    """.sgm files in the directory and its subdirectories, in sorted order"""
+    if not os.path.isdir(directory):
+        raise NotADirectoryError(f"{directory} is not a directory")
+    scripts = []
+    for root, directories, files in os.walk(directory):
+        directories[:] = sorted(name for name in directories if name != CACHE_DIRECTORY)
+        scripts.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(SCRIPT_EXTENSION))
+    return scripts
+
+
+def runScript(task: tuple) -> ScriptResult:
+    """
+    Runs one script in a worker process.
+    task : (path, Program or None if it did not compile, compile error message, output file or None, jitThreshold)
+    """
+    path, program, error, outputPath, jitThreshold = task
+    if program is None:
+        return ScriptResult(path, COMPILE_ERROR, error=error)
+    stream = context = None
+    start = time.perf_counter()
+    try:
+        if outputPath is not None:
+            os.makedirs(os.path.dirname(outputPath), exist_ok=True)
+            stream = open(outputPath, 'w')
+    except OSError as e:
+        return ScriptResult(path, OUTPUT_ERROR, error=str(e))
+    try:
+        context = ExecutionContext(program, OutputBuffer(stream) if stream is not None else None, jitThreshold)
+        context.run()
+    except Exception as e:
+        # Values printed before the error are kept, as the sgm command does
+        output = context.printed() if context is not None and stream is None else None
+        return ScriptResult(path, RUNTIME_ERROR, time.perf_counter() - start, output, str(e))
+    finally:
+        if stream is not None:
+            stream.close()
+    return ScriptResult(path, OK, time.perf_counter() - start, context.printed() if stream is None else None)
+
+
+class BatchRunner:
+    """
+    Runs many independent scripts on a pool of worker processes, which pay Python startup once.
+    Scripts are compiled, or read from the bytecode cache, in this process while the workers already run
+    earlier ones. A Program is pickled as its compact toBytes form on the way to a worker.
+    With 'outputDir' the output of every script goes to its own file, otherwise it comes back with its result.
+    """
+
+    def __init__(self, jobs: int = None, level: int = 0, jitThreshold: int = None, cache: BytecodeCache = None,
+                 outputDir: str = None):
+        """jobs : number of worker processes, by default the number of CPUs"""
+        self.jobs = jobs or os.cpu_count() or 1
+        self.level = level
+        self.jitThreshold = jitThreshold
+        self.cache = cache
+        self.outputDir = outputDir
+
+    def run(self, directory: str) -> Iterator[ScriptResult]:
+        """Results of all scripts in the directory, yielded in the order of findScripts as they finish"""
+        scripts = findScripts(directory)
+        if not scripts:
+            return
+        chunkSize = max(1, len(scripts) // (self.jobs * CHUNKS_PER_JOB))
+        with ProcessPoolExecutor(self.jobs) as executor:
+            yield from executor.map(runScript, self.tasks(directory, scripts), chunksize=chunkSize)
+
+    def tasks(self, directory: str, scripts: List[str]):
+        """Tasks of runScript, every script is compiled as its task is submitted to the pool"""
+        for path in scripts:
+            try:
+                program, error = loadProgram(path, self.level, self.cache), None
+            except Exception as e:
+                program, error = None, str(e)
+            yield path, program, error, self.outputPath(directory, path), self.jitThreshold
+
+    def outputPath(self, directory: str, path: str) -> Optional[str]:
+        """File the output of a script goes to, the directory structure of the scripts is kept"""
+        if self.outputDir is None:
+            return None
+        relative = os.path.splitext(os.path.relpath(path, directory))[0] + OUTPUT_EXTENSION
+        return os.path.join(self.outputDir, relative)
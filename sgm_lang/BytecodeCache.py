@@ -0,0 +1,75 @@
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+from sgm_lang.PackedBytecode import PackedProgram
+
+# Has to be bumped whenever generated bytecode changes, so old cache files are not reused
+COMPILER_VERSION = "7"
+
+CACHE_DIRECTORY = "__sgmcache__"
+CACHE_EXTENSION = ".sgmc"
+MAGIC = b"SGMC"
+
+
+class BytecodeCache:
+    """
+    Cache of compiled programs, similar to __pycache__.
+    Entries are keyed by a hash of the source content and the compiler version, so a changed
+    script or a newer compiler never gets stale bytecode.
+    By default entries are stored in __sgmcache__/<script name>.<variant>.sgmc next to the script, so a script
+    compiled with different options has an entry for each of them.
+    With 'cacheDir' all entries go to that directory and are named after their key.
+    File layout: MAGIC, key (hex, ASCII), newline, PackedProgram.toBytes()
+    """
+
+    def __init__(self, cacheDir: str = None):
+        self.cacheDir = cacheDir
+
+    @staticmethod
+    def sourceKey(source: bytes, variant: str = "") -> str:
+        """
+        source  : content of the script, the same bytes that are compiled
+        variant : compiler options that change the generated bytecode
+        """
+        return hashlib.sha256(f"{COMPILER_VERSION}:{variant}:".encode() + source).hexdigest()
+
+    def pathFor(self, sourcePath: str, key: str, variant: str = "") -> str:
+        if self.cacheDir is not None:
+            return os.path.join(self.cacheDir, key + CACHE_EXTENSION)
+        directory, name = os.path.split(os.path.abspath(sourcePath))
+        name = os.path.splitext(name)[0] + (f".{variant}" if variant else "")
+        return os.path.join(directory, CACHE_DIRECTORY, name + CACHE_EXTENSION)
+
+    def load(self, sourcePath: str, key: str, variant: str = "") -> Optional[PackedProgram]:
+        try:
+            with open(self.pathFor(sourcePath, key, variant), 'rb') as cached:
+                data = cached.read()
+        except OSError:
+            return None
+        header = MAGIC + key.encode() + b"\n"
+        if not data.startswith(header):
+            return None
+        try:
+            return PackedProgram.fromBytes(data[len(header):])
+        except (ValueError, EOFError, TypeError):
+            return None
+
+    def store(self, sourcePath: str, key: str, program: PackedProgram, variant: str = ""):
+        """Writes the entry atomically, a cache that cannot be written to is silently skipped"""
+        path = self.pathFor(sourcePath, key, variant)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=CACHE_EXTENSION)
+        except OSError:
+            return
+        try:
+            with os.fdopen(descriptor, 'wb') as cached:
+                cached.write(MAGIC + key.encode() + b"\n" + program.toBytes())
+            os.replace(temporary, path)
+        except OSError:
+            try:
+                os.unlink(temporary)
+            except OSError:
+                pass
@@ -0,0 +1,65 @@
+from sgm_lang.Opcode import Opcode, Operation, ParameterType, Parameter
+from typing import List, Union
+
+
+class Label:
+    """
+    Position in the emitted code that jumps can refer to before it is known
+    """
+    def __init__(self):
+        self.position = None
+        self.pendingJumps = []  # indices of jumps emitted before the label was placed
+
+    def __repr__(self):
+        return f'Label({self.position})'
+
+
+class BytecodeEmitter:
+    """
+    Appends operations to a single growing buffer.
+    Jumps refer to labels, forward jumps are patched once their label is placed, so no code is ever copied.
+    Emitted operations are tagged with the current 'line'.
+    """
+
+    def __init__(self):
+        self.operations: List[Operation] = []
+        self.line = None
+        self.labels: List[Label] = []
+
+    def emit(self, opcode: Opcode, *values) -> Operation:
+        operation = Operation(opcode, [Parameter(ParameterType.IMMEDIATE, value) for value in values], self.line)
+        self.operations.append(operation)
+        return operation
+
+    def emitJump(self, opcode: Opcode, label: Label) -> Operation:
+        operation = self.emit(opcode)
+        index = len(self.operations) - 1
+        if label.position is None:
+            operation.params.append(Parameter(ParameterType.RELATIVE))
+            label.pendingJumps.append(index)
+        else:
+            operation.params.append(Parameter(ParameterType.RELATIVE, label.position - index - 1))
+        return operation
+
+    def emitConstant(self, value: Union[str, bool, int, float]) -> Operation:
+        return self.emit(Opcode.PUSH, value)
+
+    def newLabel(self) -> Label:
+        label = Label()
+        self.labels.append(label)
+        return label
+
+    def placeLabel(self, label: Label):
+        """Binds the label to the next emitted operation and patches jumps waiting for it"""
+        if label.position is not None:
+            raise ValueError(f"{label} placed twice")
+        label.position = len(self.operations)
+        for index in label.pendingJumps:
+            self.operations[index].params[-1].value = label.position - index - 1
+        label.pendingJumps = []
+
+    def finish(self) -> List[Operation]:
+        for label in self.labels:
+            if label.pendingJumps:
+                raise ValueError(f"Jump to {label} that was never placed")
+        return self.operations
@@ -1,149 +1,517 @@
-from typing import List
-from sgm_lang.Opcode import Opcode, Operation, ParameterType, Parameter
+import operator
+from itertools import repeat
+from typing import List, Union
+from sgm_lang.Opcode import Opcode, Operation, ParameterType, Parameter, GENERIC_OPCODES, PYTHON_OPERATORS
+from sgm_lang.OutputBuffer import OutputBuffer
+from sgm_lang.PackedBytecode import PackedProgram, OPCODES, INSTRUCTION_SIZES, pack
+from sgm_lang.TraceCompiler import TraceCompiler, TraceTree
 
 
 class InterpreterException(Exception):
-    pass
+    printed = None  # values printed before the error, set by Program.run when it collects them
+
+
+# Value of a slot whose variable was not assigned yet
+UNDEFINED = object()
+
+
+def undefinedVariable(name: str) -> InterpreterException:
+    return InterpreterException(f"Variable {name} is not defined")
+
+
+def runtimeError(error: Exception, line) -> InterpreterException:
+    """Error a program failed with, reported with the SGM line of the statement if it is known. Used by every engine"""
+    if not line:
+        if isinstance(error, InterpreterException):
+            return error
+        return InterpreterException(error)
+    exception = InterpreterException(f"line {line}: {error}")
+    exception.__cause__ = error
+    return exception
+
+# Longest loop iteration, in instructions, the JIT tier records
+MAX_TRACE_LENGTH = 1000
+
+
+# Binary operations: push stack.pop(1) <op> stack.pop(0)
+BINARY_OPERATORS = {
+    Opcode.ADD: operator.add,
+    Opcode.SUB: operator.sub,
+    Opcode.MUL: operator.mul,
+    Opcode.DIV: operator.truediv,
+    Opcode.MOD: operator.mod,
+    Opcode.EQ: operator.eq,
+    Opcode.NEQ: operator.ne,
+    Opcode.GE: operator.ge,
+    Opcode.GRT: operator.gt,
+    Opcode.LE: operator.le,
+    Opcode.LESS: operator.lt,
+    Opcode.BINARY_AND: operator.and_,
+    Opcode.BINARY_OR: operator.or_,
+}
+BINARY_OPERATORS.update({typed: BINARY_OPERATORS[generic] for typed, generic in GENERIC_OPCODES.items()})
+
+# Typed binary operations have the operator written inline, so every typed opcode gets its own code object,
+# which CPython specializes for the operand types it always sees
+TYPED_BINARY_TEMPLATE = """
+def bind(stack, nextIp):
+    pop = stack.pop
+
+    def instruction():
+        a = pop()
+        stack[-1] = stack[-1] {} a
+        return nextIp
+    return instruction
+"""
+
+
+def typedBinder(symbol: str):
+    namespace = {}
+    exec(TYPED_BINARY_TEMPLATE.format(symbol), namespace)
+    return namespace["bind"]
+
+
+TYPED_BINDERS = {opcode: typedBinder(PYTHON_OPERATORS[opcode]) for opcode in GENERIC_OPCODES}
 
 
 class BytecodeInterpreter:
-    def __init__(self, operations: List[Operation]):
-        self.operations = operations
+    """
+    Executes packed bytecode.
+    On load every instruction is turned into a closure with its operands already resolved,
+    which executes the instruction and returns the offset of the next one.
+    Dispatch is then a single list index and call per instruction.
+    With jitThreshold set, backward jumps count how often their loop runs. A hot loop has one iteration
+    recorded, compiled by TraceCompiler and the resulting closure replaces the loop header instruction.
+    Paths from side exits of the trace that turn out to be hot as well are recorded and compiled in later.
+    """
+
+    def __init__(self, operations: Union[List[Operation], PackedProgram], output: OutputBuffer = None,
+                 jitThreshold: int = None):
+        """
+        output       : sink for printed values, by default buffered stdout
+        jitThreshold : number of times a loop has to jump back before it is traced and compiled,
+                       None leaves every loop interpreted
+        """
+        try:
+            self.program = pack(operations)
+        except ValueError as e:
+            raise InterpreterException(e)
+        self.code = self.program.code
+        self.constants = self.program.constants
+        self.names = self.program.names
         self.ip = 0
-        self.sp = 0
         self.stack = []
         self.variables = {}
+        self.output = output if output is not None else OutputBuffer()
+        self.slots = [UNDEFINED] * len(self.program.slotNames)
+        self.undefinedSlots = tuple(self.slots)
+        self.jitThreshold = jitThreshold
+        self.loopCounters = {}  # loop header offset -> times its backward jump was taken
+        self.traces = {}  # loop header offset -> CompiledTrace replacing the header instruction
+        self.traceFunctions = {}  # loop header offset -> closure of its trace
+        self.traceTrees = {}  # loop header offset -> TraceTree recorded for the loop
+        self.instructions = self._bindInstructions()
 
     def run(self):
-        while self.ip < len(self.operations):
-            try:
-                self.processInstruction()
-            except InterpreterException:
-                raise
-            except Exception as e:
-                raise InterpreterException(e)
+        instructions = self.instructions
+        end = len(instructions)
+        ip = self.ip
+        try:
+            while ip < end:
+                ip = instructions[ip]()
+        except Exception as e:
+            self.ip = self._failedIp(e, ip)
+            raise self._runtimeError(e)
+        finally:
+            self.output.flush()
+        self.ip = ip
+
+    def runSlice(self, count: int) -> bool:
+        """
+        Executes at most 'count' instructions, returns whether the program has finished.
+        A compiled loop trace executes as a single instruction.
+        """
+        instructions = self.instructions
+        end = len(instructions)
+        ip = self.ip
+        try:
+            for _ in repeat(None, count):
+                if ip >= end:
+                    break
+                ip = instructions[ip]()
+        except Exception as e:
+            self.output.flush()
+            self.ip = self._failedIp(e, ip)
+            raise self._runtimeError(e)
+        self.ip = ip
+        if ip < end:
+            return False
+        self.output.flush()
+        return True
+
+    def reset(self):
+        """
+        Prepares the interpreter to run the program again from the start.
+        Bound instructions and compiled traces refer to the stack and slots, so they are cleared in place.
+        """
+        self.ip = 0
+        self.stack.clear()
+        self.variables.clear()
+        self.slots[:] = self.undefinedSlots
 
     def processInstruction(self):
-        current_op = self.operations[self.ip]
-        parameters = current_op.params
-        if current_op.opcode == Opcode.ADD:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b + a)
-        elif current_op.opcode == Opcode.SUB:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b - a)
-        elif current_op.opcode == Opcode.MUL:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b * a)
-        elif current_op.opcode == Opcode.DIV:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b / a)
-        elif current_op.opcode == Opcode.MOD:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b % a)
-        elif current_op.opcode == Opcode.LOAD:
-            self._validateParametersLength(current_op, parameters, 1)
-            if parameters[0].value not in self.variables:
-                raise InterpreterException(
-                    f"Variable {parameters[0].value} is not defined")
-            self.stack.append(self.variables[parameters[0].value])
-        elif current_op.opcode == Opcode.STORE:
-            self._validateParametersLength(current_op, parameters, 1)
-            self.variables[parameters[0].value] = self.stack.pop()
-        elif current_op.opcode == Opcode.PRINT:
-            self._validateParametersLength(current_op, parameters, 0)
-            print(self.stack.pop(), end='')
-        elif current_op.opcode == Opcode.PRINTC:
-            self._validateParametersLength(current_op, parameters, 1)
-            print(parameters[0].value, end='')
-        elif current_op.opcode == Opcode.PUSH:
-            self._validateParametersLength(current_op, parameters, 1)
-            self.stack.append(parameters[0].value)
-        elif current_op.opcode == Opcode.POP:
-            self._validateParametersLength(current_op, parameters, 1)
-            self.variables[parameters[0].value] = self.stack.pop()
-        elif current_op.opcode == Opcode.JMP:
-            self._validateParametersLength(current_op, parameters, 1)
-            if parameters[0].paramType == ParameterType.IMMEDIATE:
-                self.ip = parameters[0].value
-            elif parameters[0].paramType == ParameterType.RELATIVE:
-                self.ip += parameters[0].value
-        elif current_op.opcode == Opcode.JMP_IF:
-            self._validateParametersLength(current_op, parameters, 1)
-            if self.stack.pop():
-                if parameters[0].paramType == ParameterType.IMMEDIATE:
-                    self.ip = parameters[0].value
-                elif parameters[0].paramType == ParameterType.RELATIVE:
-                    self.ip += parameters[0].value
-        elif current_op.opcode == Opcode.JMP_NOT_IF:
-            self._validateParametersLength(current_op, parameters, 1)
-            if not self.stack.pop():
-                if parameters[0].paramType == ParameterType.IMMEDIATE:
-                    self.ip = parameters[0].value
-                elif parameters[0].paramType == ParameterType.RELATIVE:
-                    self.ip += parameters[0].value
-        elif current_op.opcode == Opcode.EQ:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b == a)
-        elif current_op.opcode == Opcode.NEQ:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b != a)
-        elif current_op.opcode == Opcode.GE:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b >= a)
-        elif current_op.opcode == Opcode.GRT:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b > a)
-        elif current_op.opcode == Opcode.LE:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b <= a)
-        elif current_op.opcode == Opcode.LESS:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b < a)
-        elif current_op.opcode == Opcode.BINARY_AND:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b & a)
-        elif current_op.opcode == Opcode.BINARY_OR:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            b = self.stack.pop()
-            self.stack.append(b | a)
-        elif current_op.opcode == Opcode.NOT:
-            self._validateParametersLength(current_op, parameters, 0)
-            a = self.stack.pop()
-            self.stack.append(not a)
-        else:
-            raise InterpreterException("Invalid operation")
-        self.ip += 1
-
-    def _validateParametersLength(self, operation, parameters, length):
-        if len(parameters) != length:
-            raise InterpreterException(
-                f"Invalid number of parameters for operation {operation}: Expected {length}, got {len(parameters)}")
+        try:
+            self.ip = self.instructions[self.ip]()
+        except Exception as e:
+            self.output.flush()
+            self.ip = self._failedIp(e, self.ip)
+            raise self._runtimeError(e)
+
+    def _failedIp(self, error: Exception, ip: int) -> int:
+        """Offset of the instruction that failed, which may be inside a compiled trace or a loop being recorded"""
+        if not self.loopCounters:
+            return ip
+        traceback = error.__traceback__
+        while traceback is not None:
+            code = traceback.tb_frame.f_code
+            if code is BytecodeInterpreter._recordTrace.__code__:
+                ip = traceback.tb_frame.f_locals["ip"]
+            elif code.co_filename in self.traces:
+                ip = self.traces[code.co_filename].offsets.get(traceback.tb_lineno, ip)
+            traceback = traceback.tb_next
+        return ip
+
+    def _runtimeError(self, error: Exception) -> InterpreterException:
+        return runtimeError(error, self.program.lines[self.ip])
+
+    def _bindInstructions(self) -> list:
+        """Resolves operands and binds a closure for every instruction, indexed by its code offset"""
+        code = self.code
+        instructions = [None] * len(code)
+        ip = 0
+        while ip < len(code):
+            opcode = OPCODES[code[ip]] if 0 < code[ip] < len(OPCODES) else None
+            if opcode not in self.binders:
+                raise InterpreterException(f"Invalid operation {code[ip]} at offset {ip}")
+            size = INSTRUCTION_SIZES[opcode]
+            instructions[ip] = self.binders[opcode](self, opcode, ip + size, *code[ip + 1:ip + size])
+            ip += size
+        return instructions
+
+    def _bindBinary(self, opcode, nextIp):
+        apply = BINARY_OPERATORS[opcode]
+        stack = self.stack
+        pop = stack.pop
+
+        def instruction():
+            a = pop()
+            stack[-1] = apply(stack[-1], a)
+            return nextIp
+        return instruction
+
+    def _bindTypedBinary(self, opcode, nextIp):
+        return TYPED_BINDERS[opcode](self.stack, nextIp)
+
+    def _bindNot(self, opcode, nextIp):
+        stack = self.stack
+
+        def instruction():
+            stack[-1] = not stack[-1]
+            return nextIp
+        return instruction
+
+    def _bindToFloat(self, opcode, nextIp):
+        stack = self.stack
+
+        def instruction():
+            stack[-1] = float(stack[-1])
+            return nextIp
+        return instruction
+
+    def _bindLoad(self, opcode, nextIp, nameIndex):
+        name = self.names[nameIndex]
+        variables = self.variables
+        push = self.stack.append
+
+        def instruction():
+            if name not in variables:
+                raise undefinedVariable(name)
+            push(variables[name])
+            return nextIp
+        return instruction
+
+    def _bindStore(self, opcode, nextIp, nameIndex):
+        # POP behaves the same as STORE
+        name = self.names[nameIndex]
+        variables = self.variables
+        pop = self.stack.pop
+
+        def instruction():
+            variables[name] = pop()
+            return nextIp
+        return instruction
+
+    def _bindLoadSlot(self, opcode, nextIp, slot):
+        name = self.program.slotNames[slot]
+        slots = self.slots
+        push = self.stack.append
+
+        def instruction():
+            value = slots[slot]
+            if value is UNDEFINED:
+                raise undefinedVariable(name)
+            push(value)
+            return nextIp
+        return instruction
+
+    def _bindStoreSlot(self, opcode, nextIp, slot):
+        slots = self.slots
+        pop = self.stack.pop
+
+        def instruction():
+            slots[slot] = pop()
+            return nextIp
+        return instruction
+
+    def _bindDupStoreSlot(self, opcode, nextIp, slot):
+        slots = self.slots
+        stack = self.stack
+
+        def instruction():
+            slots[slot] = stack[-1]
+            return nextIp
+        return instruction
+
+    def _undefinedSlot(self, *slots) -> InterpreterException:
+        name = next(self.program.slotNames[slot] for slot in slots if self.slots[slot] is UNDEFINED)
+        return undefinedVariable(name)
+
+    def _bindLoadLoadBinary(self, opcode, nextIp, leftSlot, rightSlot, operation):
+        apply = BINARY_OPERATORS[OPCODES[operation]]
+        slots = self.slots
+        push = self.stack.append
+
+        def instruction():
+            left, right = slots[leftSlot], slots[rightSlot]
+            if left is UNDEFINED or right is UNDEFINED:
+                raise self._undefinedSlot(leftSlot, rightSlot)
+            push(apply(left, right))
+            return nextIp
+        return instruction
+
+    def _bindLoadPushBinary(self, opcode, nextIp, slot, constantIndex, operation):
+        apply = BINARY_OPERATORS[OPCODES[operation]]
+        value = self.constants[constantIndex]
+        slots = self.slots
+        push = self.stack.append
+
+        def instruction():
+            left = slots[slot]
+            if left is UNDEFINED:
+                raise self._undefinedSlot(slot)
+            push(apply(left, value))
+            return nextIp
+        return instruction
+
+    def _bindLoadPushBinaryJumpNotIf(self, opcode, nextIp, slot, constantIndex, operation, target):
+        apply = BINARY_OPERATORS[OPCODES[operation]]
+        value = self.constants[constantIndex]
+        slots = self.slots
+
+        def instruction():
+            left = slots[slot]
+            if left is UNDEFINED:
+                raise self._undefinedSlot(slot)
+            return nextIp if apply(left, value) else target
+        return instruction
+
+    def _bindPush(self, opcode, nextIp, constantIndex):
+        value = self.constants[constantIndex]
+        push = self.stack.append
+
+        def instruction():
+            push(value)
+            return nextIp
+        return instruction
+
+    def _bindPrint(self, opcode, nextIp):
+        pop = self.stack.pop
+        write = self.output.write
+
+        def instruction():
+            write(pop())
+            return nextIp
+        return instruction
+
+    def _bindPrintConstant(self, opcode, nextIp, constantIndex):
+        value = self.constants[constantIndex]
+        write = self.output.write
+
+        def instruction():
+            write(value)
+            return nextIp
+        return instruction
+
+    def _bindJump(self, opcode, nextIp, target):
+        jumpIp = nextIp - INSTRUCTION_SIZES[opcode]
+        if self.jitThreshold is not None and target <= jumpIp:
+            return self._bindCountedJump(target, jumpIp)
+
+        def instruction():
+            return target
+        return instruction
+
+    def _bindCountedJump(self, target, jumpIp):
+        """Backward jump of a loop, once taken jitThreshold times the loop gets compiled"""
+        counters = self.loopCounters
+        counters[target] = 0
+        threshold = self.jitThreshold
+
+        def instruction():
+            count = counters[target] + 1
+            counters[target] = count
+            if count == threshold:
+                return self._compileLoop(target, jumpIp)
+            return target
+        return instruction
+
+    def _compileLoop(self, header: int, end: int) -> int:
+        """
+        Runs one iteration of the loop between 'header' and 'end' recording its trace,
+        then replaces the header instruction with the compiled trace. Returns the offset to continue from.
+        """
+        trace, ip = self._recordTrace(header, end)
+        if trace is None:
+            # Left the loop or went through a nested loop that is not compiled yet, tried again later
+            self.loopCounters[header] = 0
+            return ip
+        self.traceTrees[header] = TraceTree(trace, self.instructions[header])
+        self._installTrace(header)
+        return ip
+
+    def _installTrace(self, header: int):
+        tree = self.traceTrees[header]
+        compiler = TraceCompiler(self.program, self.slots, self.stack.append, self.output.write, UNDEFINED)
+        try:
+            compiled = compiler.compile(tree.trace, tree.sideTraces, self.traceFunctions, tree.original,
+                                        self._bindSideExit(header))
+        except Exception:
+            # TraceAbort, or any other failure to compile the trace, leaves the loop interpreted
+            return
+        self.traces[compiled.filename] = compiled
+        # Loops this one is nested in call it through traceFunctions
+        self.traceFunctions[header] = compiled.function
+        self.instructions[header] = compiled.function
+
+    def _bindSideExit(self, header: int):
+        """
+        Counts side exits of the trace of a loop. Once one is taken jitThreshold times, the path from it back
+        to the loop header is recorded the next time the interpreter gets there, and the trace is recompiled
+        to continue on that path instead of leaving
+        """
+        tree = self.traceTrees[header]
+        instructions = self.instructions
+
+        def sideExit(jumpIp, target):
+            if jumpIp is None:
+                # A nested loop left its trace
+                return target
+            key = (jumpIp, target)
+            count = tree.sideExits.get(key, 0) + 1
+            tree.sideExits[key] = count
+            if count == self.jitThreshold:
+                replaced = instructions[target]
+
+                def recordSideTrace():
+                    instructions[target] = replaced
+                    path, ip = self._recordTrace(header, tree.trace[-1], target)
+                    if path is not None:
+                        tree.sideTraces[key] = path
+                        self._installTrace(header)
+                    return ip
+                instructions[target] = recordSideTrace
+            return target
+        return sideExit
+
+    def _recordTrace(self, header: int, end: int, start: int = None):
+        """
+        Offsets of the instructions one loop iteration goes through from 'start' (the header by default),
+        None if it did not get back to 'header'
+        """
+        instructions = self.instructions
+        trace = []
+        seen = set()
+        ip = header if start is None else start
+        while len(trace) < MAX_TRACE_LENGTH:
+            trace.append(ip)
+            seen.add(ip)
+            ip = instructions[ip]()
+            if ip == header:
+                return trace, ip
+            if not header <= ip <= end or ip in seen:
+                break
+        return None, ip
+
+    def _bindJumpIf(self, opcode, nextIp, target):
+        pop = self.stack.pop
+
+        def instruction():
+            return target if pop() else nextIp
+        return instruction
+
+    def _bindJumpNotIf(self, opcode, nextIp, target):
+        pop = self.stack.pop
+
+        def instruction():
+            return nextIp if pop() else target
+        return instruction
+
+    def _bindJumpIfFalseOrPop(self, opcode, nextIp, target):
+        stack = self.stack
+        pop = stack.pop
+
+        def instruction():
+            if stack[-1]:
+                pop()
+                return nextIp
+            return target
+        return instruction
+
+    def _bindJumpIfTrueOrPop(self, opcode, nextIp, target):
+        stack = self.stack
+        pop = stack.pop
+
+        def instruction():
+            if stack[-1]:
+                return target
+            pop()
+            return nextIp
+        return instruction
+
+    # Handler table: opcode -> function binding a closure for one instruction
+    binders = dict.fromkeys(BINARY_OPERATORS, _bindBinary)
+    binders.update(dict.fromkeys(GENERIC_OPCODES, _bindTypedBinary))
+    binders.update({
+        Opcode.NOT: _bindNot,
+        Opcode.TO_FLOAT: _bindToFloat,
+        Opcode.LOAD: _bindLoad,
+        Opcode.STORE: _bindStore,
+        Opcode.POP: _bindStore,
+        Opcode.LOAD_SLOT: _bindLoadSlot,
+        Opcode.STORE_SLOT: _bindStoreSlot,
+        Opcode.DUP_STORE_SLOT: _bindDupStoreSlot,
+        Opcode.LOAD_LOAD_BINARY: _bindLoadLoadBinary,
+        Opcode.LOAD_PUSH_BINARY: _bindLoadPushBinary,
+        Opcode.LOAD_PUSH_BINARY_JMP_NOT_IF: _bindLoadPushBinaryJumpNotIf,
+        Opcode.PUSH: _bindPush,
+        Opcode.PRINT: _bindPrint,
+        Opcode.PRINTC: _bindPrintConstant,
+        Opcode.JMP: _bindJump,
+        Opcode.JMP_IF: _bindJumpIf,
+        Opcode.JMP_NOT_IF: _bindJumpNotIf,
+        Opcode.JMP_IF_FALSE_OR_POP: _bindJumpIfFalseOrPop,
+        Opcode.JMP_IF_TRUE_OR_POP: _bindJumpIfTrueOrPop,
+    })
 
 
 if __name__ == "__main__":
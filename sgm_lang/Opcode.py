@@ -26,7 +26,74 @@ class Opcode(Enum):
     BINARY_OR = auto()  # pushes stack.pop(1) || stack.pop(0)
     BINARY_AND = auto()  # pushes stack.pop(1) && stack.pop(0)
     NOT = auto()  # pushes !stack.pop(0)
+    LOAD_SLOT = auto()  # push variable from slot specified as parameter
+    STORE_SLOT = auto()  # pops and sets variable in slot specified as parameter
 
+    # Superinstructions produced by the peephole optimizer
+    DUP_STORE_SLOT = auto()  # sets variable in slot to stack[0] without popping it (STORE_SLOT x, LOAD_SLOT x)
+    LOAD_LOAD_BINARY = auto()  # push slot(0) <opcode(2)> slot(1) (LOAD_SLOT, LOAD_SLOT, binary operation)
+    LOAD_PUSH_BINARY = auto()  # push slot(0) <opcode(2)> constant(1) (LOAD_SLOT, PUSH, binary operation)
+    LOAD_PUSH_BINARY_JMP_NOT_IF = auto()  # jump to (3) if not slot(0) <opcode(2)> constant(1)
+
+    # Binary operations specialized for operand types known from the type checker
+    IADD = auto()  # ADD of two ints
+    ISUB = auto()  # SUB of two ints
+    IMUL = auto()  # MUL of two ints
+    IMOD = auto()  # MOD of two ints
+    IEQ = auto()  # EQ of two ints
+    ILESS = auto()  # LESS of two ints
+    ILE = auto()  # LE of two ints
+    IGRT = auto()  # GRT of two ints
+    IGE = auto()  # GE of two ints
+    FADD = auto()  # ADD of numbers, at least one a float
+    FSUB = auto()  # SUB of numbers, at least one a float
+    FMUL = auto()  # MUL of numbers, at least one a float
+    FDIV = auto()  # DIV of numbers
+    SCONCAT = auto()  # ADD of two strings
+
+    # Short-circuit && and || of bools: the left operand stays on the stack as the result if it decides it
+    JMP_IF_FALSE_OR_POP = auto()  # jump if not stack[0], otherwise pop it
+    JMP_IF_TRUE_OR_POP = auto()  # jump if stack[0], otherwise pop it
+
+    TO_FLOAT = auto()  # stack[0] = float(stack[0]), an int assigned to a boatWhichFloat variable
+
+
+# Generic operation every typed opcode specializes
+GENERIC_OPCODES = {
+    Opcode.IADD: Opcode.ADD,
+    Opcode.ISUB: Opcode.SUB,
+    Opcode.IMUL: Opcode.MUL,
+    Opcode.IMOD: Opcode.MOD,
+    Opcode.IEQ: Opcode.EQ,
+    Opcode.ILESS: Opcode.LESS,
+    Opcode.ILE: Opcode.LE,
+    Opcode.IGRT: Opcode.GRT,
+    Opcode.IGE: Opcode.GE,
+    Opcode.FADD: Opcode.ADD,
+    Opcode.FSUB: Opcode.SUB,
+    Opcode.FMUL: Opcode.MUL,
+    Opcode.FDIV: Opcode.DIV,
+    Opcode.SCONCAT: Opcode.ADD,
+}
+
+
+# Python operator with the same semantics as BINARY_OPERATORS entry of the opcode in Interpreter
+PYTHON_OPERATORS = {
+    Opcode.ADD: "+",
+    Opcode.SUB: "-",
+    Opcode.MUL: "*",
+    Opcode.DIV: "/",
+    Opcode.MOD: "%",
+    Opcode.EQ: "==",
+    Opcode.NEQ: "!=",
+    Opcode.GE: ">=",
+    Opcode.GRT: ">",
+    Opcode.LE: "<=",
+    Opcode.LESS: "<",
+    Opcode.BINARY_AND: "&",
+    Opcode.BINARY_OR: "|",
+}
+PYTHON_OPERATORS.update({typed: PYTHON_OPERATORS[generic] for typed, generic in GENERIC_OPCODES.items()})
 
 
 class ParameterType(Enum):
@@ -46,12 +113,13 @@ class Parameter:
         return self.__repr__()
 
 class Operation:
-    def __init__(self, opcode: Opcode, params: List[Parameter]):
+    def __init__(self, opcode: Opcode, params: List[Parameter], line: int = None):
         self.opcode = opcode
         self.params = params
+        self.line = line  # source line of the statement this operation comes from
 
     def __repr__(self):
         return f"{self.opcode.name}: {', '.join(map(str, self.params))}"
 
     def __str__(self):
-        return self.__repr__()
\ No newline at end of file
+        return self.__repr__()
@@ -0,0 +1,42 @@
+import sys
+from enum import Enum
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+class FlushPolicy(Enum):
+    EXIT = "exit"  # write out only when the program finishes (or fails)
+    NEWLINE = "newline"  # write out after every printed newline, like a line-buffered terminal
+    SIZE = "size"  # write out every time 'bufferSize' bytes of UTF-8 were collected
+
+
+class OutputBuffer:
+    """
+    Output sink for PRINT/PRINTC.
+    Collects printed values and writes them to 'stream' in one call according to the flush policy,
+    instead of one write per printed value.
+    """
+
+    def __init__(self, stream=None, bufferSize: int = DEFAULT_BUFFER_SIZE, flushPolicy: FlushPolicy = FlushPolicy.SIZE):
+        self.stream = stream if stream is not None else sys.stdout
+        self.bufferSize = bufferSize
+        self.flushPolicy = flushPolicy
+        self.parts = []
+        self.size = 0
+
+    def write(self, value):
+        text = str(value)
+        self.parts.append(text)
+        # Bytes rather than characters, so non-ASCII output does not overshoot the buffer size
+        self.size += len(text) if text.isascii() else len(text.encode('utf-8', 'surrogatepass'))
+        if self.flushPolicy is FlushPolicy.EXIT:
+            return
+        if self.size >= self.bufferSize or (self.flushPolicy is FlushPolicy.NEWLINE and '\n' in text):
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.stream.write(''.join(self.parts))
+            self.parts.clear()
+            self.size = 0
+        self.stream.flush()
@@ -0,0 +1,156 @@
+import marshal
+import math
+from array import array
+from typing import List, Union
+
+from sgm_lang.Opcode import Opcode, Operation, ParameterType, GENERIC_OPCODES
+
+# What each operand of an instruction refers to in the packed form
+CONSTANT = "constant"  # index into PackedProgram.constants
+NAME = "name"  # index into PackedProgram.names
+TARGET = "target"  # absolute offset in PackedProgram.code
+SLOT = "slot"  # variable slot number, stored as is
+OPERATOR = "operator"  # Opcode of a binary operation, stored as its value
+
+OPERAND_KINDS = {
+    Opcode.LOAD: (NAME,),
+    Opcode.STORE: (NAME,),
+    Opcode.ADD: (),
+    Opcode.SUB: (),
+    Opcode.MUL: (),
+    Opcode.DIV: (),
+    Opcode.MOD: (),
+    Opcode.PRINT: (),
+    Opcode.PRINTC: (CONSTANT,),
+    Opcode.JMP: (TARGET,),
+    Opcode.JMP_IF: (TARGET,),
+    Opcode.JMP_NOT_IF: (TARGET,),
+    Opcode.PUSH: (CONSTANT,),
+    Opcode.POP: (NAME,),
+    Opcode.EQ: (),
+    Opcode.NEQ: (),
+    Opcode.GE: (),
+    Opcode.GRT: (),
+    Opcode.LE: (),
+    Opcode.LESS: (),
+    Opcode.BINARY_OR: (),
+    Opcode.BINARY_AND: (),
+    Opcode.NOT: (),
+    Opcode.TO_FLOAT: (),
+    Opcode.JMP_IF_FALSE_OR_POP: (TARGET,),
+    Opcode.JMP_IF_TRUE_OR_POP: (TARGET,),
+    Opcode.LOAD_SLOT: (SLOT,),
+    Opcode.STORE_SLOT: (SLOT,),
+    Opcode.DUP_STORE_SLOT: (SLOT,),
+    Opcode.LOAD_LOAD_BINARY: (SLOT, SLOT, OPERATOR),
+    Opcode.LOAD_PUSH_BINARY: (SLOT, CONSTANT, OPERATOR),
+    Opcode.LOAD_PUSH_BINARY_JMP_NOT_IF: (SLOT, CONSTANT, OPERATOR, TARGET),
+}
+OPERAND_KINDS.update(dict.fromkeys(GENERIC_OPCODES, ()))
+
+INSTRUCTION_SIZES = {opcode: 1 + len(kinds) for opcode, kinds in OPERAND_KINDS.items()}
+
+
+def constantKey(value) -> tuple:
+    """Key of a value in a constant pool, bool and int compare equal, as do 0.0 and -0.0, so the type
+    and the sign of floats are part of it"""
+    if isinstance(value, float):
+        return float, value, math.copysign(1.0, value)
+    return type(value), value
+
+
+# Opcode enum member by its value, so decoding an instruction is a single tuple index
+OPCODES = (None,) + tuple(Opcode)
+
+
+class PackedProgram:
+    """
+    Flat encoding of a List[Operation]:
+    code      - array('i') of instructions laid out as opcode followed by its operands (see OPERAND_KINDS)
+    constants - constant pool, PUSH/PRINTC operands index into it
+    names     - name pool, LOAD/STORE/POP operands index into it
+    lines     - array('i') with the source line of the instruction starting at given offset (0 if unknown)
+    slotNames - variable name of every slot used by LOAD_SLOT/STORE_SLOT, its length is the number of slots
+    Jump operands are absolute offsets in 'code'.
+    """
+
+    def __init__(self, code: array, constants: list, names: List[str], lines: array, slotNames: List[str] = ()):
+        self.code = code
+        self.constants = constants
+        self.names = names
+        self.lines = lines
+        self.slotNames = list(slotNames)
+
+    @classmethod
+    def fromOperations(cls, operations: List[Operation], slotNames: List[str] = ()) -> "PackedProgram":
+        offsets = []
+        offset = 0
+        for operation in operations:
+            offsets.append(offset)
+            offset += INSTRUCTION_SIZES[operation.opcode]
+        offsets.append(offset)
+
+        code = array('i')
+        lines = array('i', [0]) * offset
+        constants, constantIndex = [], {}
+        names, nameIndex = [], {}
+        slotNames = list(slotNames)
+        for index, operation in enumerate(operations):
+            kinds = OPERAND_KINDS[operation.opcode]
+            if len(operation.params) != len(kinds):
+                raise ValueError(
+                    f"Invalid number of parameters for operation {operation}: Expected {len(kinds)}, got {len(operation.params)}")
+            lines[offsets[index]] = operation.line or 0
+            code.append(operation.opcode.value)
+            for kind, parameter in zip(kinds, operation.params):
+                if kind == CONSTANT:
+                    key = constantKey(parameter.value)
+                    if key not in constantIndex:
+                        constantIndex[key] = len(constants)
+                        constants.append(parameter.value)
+                    code.append(constantIndex[key])
+                elif kind == SLOT:
+                    if parameter.value < 0:
+                        raise ValueError(f"Invalid slot in operation {operation}")
+                    while parameter.value >= len(slotNames):
+                        slotNames.append(f"slot {len(slotNames)}")
+                    code.append(parameter.value)
+                elif kind == OPERATOR:
+                    code.append(parameter.value.value)
+                elif kind == NAME:
+                    if parameter.value not in nameIndex:
+                        nameIndex[parameter.value] = len(names)
+                        names.append(parameter.value)
+                    code.append(nameIndex[parameter.value])
+                else:
+                    target = cls._jumpTarget(index, parameter)
+                    if not 0 <= target < len(offsets):
+                        raise ValueError(f"Jump target out of range in operation {operation}")
+                    code.append(offsets[target])
+        return cls(code, constants, names, lines, slotNames)
+
+    @staticmethod
+    def _jumpTarget(index: int, parameter) -> int:
+        if parameter.paramType == ParameterType.RELATIVE:
+            # Relative jumps are counted from the instruction after the jump
+            return index + parameter.value + 1
+        return parameter.value
+
+    def toBytes(self) -> bytes:
+        """Compact binary form, used by the bytecode cache"""
+        return marshal.dumps((self.code.tobytes(), tuple(self.constants), tuple(self.names),
+                              self.lines.tobytes(), tuple(self.slotNames)))
+
+    @classmethod
+    def fromBytes(cls, data: bytes) -> "PackedProgram":
+        code, constants, names, lines, slotNames = marshal.loads(data)
+        return cls(array('i', code), list(constants), list(names), array('i', lines), slotNames)
+
+    def __len__(self):
+        return len(self.code)
+
+
+def pack(program: Union[List[Operation], PackedProgram], slotNames: List[str] = ()) -> PackedProgram:
+    if isinstance(program, PackedProgram):
+        return program
+    return PackedProgram.fromOperations(program, slotNames)
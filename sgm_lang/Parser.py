@@ -1,8 +1,36 @@
 from sgm_lang.tokenizer import Tokenizer
 from sgm_lang.CompoundToken import CompoundToken
 from sgm_lang.TokenType import TokenType
+from sgm_lang.Token import Token
+
+# Binding strength of binary operators, all of them are left associative
+BINARY_PRECEDENCE = {
+    TokenType.OR: 1,
+    TokenType.AND: 2,
+    TokenType.EQUAL: 3,
+    TokenType.LESS: 4,
+    TokenType.GREATER: 4,
+    TokenType.LESS_EQUAL: 4,
+    TokenType.GREATER_EQUAL: 4,
+    TokenType.ADD: 5,
+    TokenType.SUB: 5,
+    TokenType.MUL: 6,
+    TokenType.DIV: 6,
+    TokenType.MOD: 6,
+}
+UNARY_PRECEDENCE = 7  # NOT
+
+# Opening parenthesis -> the token closing it, both kinds can group an expression
+OPENING_PARENTHESES = {
+    TokenType.L_PAREN: TokenType.R_PAREN,
+    TokenType.L_BRACE: TokenType.R_BRACE,
+}
+CLOSING_PARENTHESES = tuple(OPENING_PARENTHESES.values())
+
 
 class AST(object):
+    valueType = None  # DataType of an expression, set by TypeChecker
+
     def __repr__(self):
         return str(self)
 
@@ -31,7 +59,7 @@ class LogicOp(AST):
 class Num(AST):
     def __init__(self, token):
         self.token = token
-        self.value = token[1]
+        self.value = token.value
 
     def __str__(self):
         return str(self.value)
@@ -39,7 +67,7 @@ class Num(AST):
 class Logic(AST):
     def __init__(self, token):
         self.token = token
-        self.value = token[0] == TokenType.TRUE
+        self.value = token.type == TokenType.TRUE
 
     def __str__(self):
         return str(self.value)
@@ -53,6 +81,8 @@ class Compound(AST):
 
 
 class Assign(AST):
+    toFloat = False  # the int value is converted for a boatWhichFloat variable, set by TypeChecker
+
     def __init__(self, left, op, right):
         self.left = left
         self.token = self.op = op
@@ -111,129 +141,117 @@ class While(AST):
         return f'[while {self.token} exp({self.expression.__str__()}) <{self.statements.__str__()}>]'
 
 
+def postorder(expression) -> list:
+    """Nodes of an expression, every one after its operands, collected without recursion"""
+    nodes = []
+    pending = [expression]
+    while pending:
+        node = pending.pop()
+        nodes.append(node)
+        if node.__class__ in (BinOp, LogicOp):
+            if node.left is not None:
+                pending.append(node.left)
+            pending.append(node.right)
+    nodes.reverse()
+    return nodes
+
+
 class Parser(object):
     def __init__(self, lexer):
-        self.lexer = lexer
-        self.index = 0
+        """lexer : any iterable of tokens - a list or a Tokenizer.generateTokens() generator"""
+        self.lexer = iter(lexer)
+        self.current_token = Token(None, None, 1, 1)
         self.current_token = self.getNextToken()
 
     def error(self):
-        raise Exception('Invalid syntax')
+        token = self.current_token
+        raise Exception(f'Invalid syntax at {token.position()}: unexpected {token.type!r}')
 
     def eat(self, token_type):
         # compare the current token type with the passed token
         # type and if they match then "eat" the current token
         # and assign the next token to the self.current_token,
         # otherwise raise an exception.
-        if self.current_token[0] == token_type:
+        if self.current_token.type == token_type:
             self.current_token = self.getNextToken()
         else:
             self.error()
 
-    def factor(self):
-        """factor : INTEGER | BOOL | FLOAT | STRING
-        | LPAREN expr RPAREN | LBRACE expr RBRACE
-        | NOT expr
-        | TRUE | FALSE
-        | variable"""
+    def primary(self):
+        """primary : INTEGER | BOOL | FLOAT | STRING | TRUE | FALSE | variable"""
         token = self.current_token
-        if token[0] == CompoundToken.INT:
-            self.eat(CompoundToken.INT)
-            return Num(token)
-        elif token[0] == CompoundToken.BOOL:
-            self.eat(CompoundToken.BOOL)
+        if token.type in (CompoundToken.INT, CompoundToken.BOOL, CompoundToken.FLOAT, CompoundToken.STRING):
+            self.eat(token.type)
             return Num(token)
-        elif token[0] == CompoundToken.FLOAT:
-            self.eat(CompoundToken.FLOAT)
-            return Num(token)
-        elif token[0] == CompoundToken.STRING:
-            self.eat(CompoundToken.STRING)
-            return Num(token)
-        elif token[0] == TokenType.L_PAREN:
-            self.eat(TokenType.L_PAREN)
-            node = self.expr()
-            self.eat(TokenType.R_PAREN)
-            return node
-        elif token[0] == TokenType.L_BRACE:
-            self.eat(TokenType.L_BRACE)
-            node = self.expr()
-            self.eat(TokenType.R_BRACE)
-            return node
-        elif token[0] == TokenType.NOT:
-            self.eat(TokenType.NOT)
-            node = LogicOp(None, token, self.expr())
-            return node
-        elif token[0] == TokenType.TRUE:
-            node = Logic(token)
-            self.eat(TokenType.TRUE)
-            return node
-        elif token[0] == TokenType.FALSE:
+        elif token.type in (TokenType.TRUE, TokenType.FALSE):
             node = Logic(token)
-            self.eat(TokenType.FALSE)
-            return node
-        elif token[0] == CompoundToken.DATA_TYPE:
-            node = self.variableDefinition()
+            self.eat(token.type)
             return node
-        elif token[0] == CompoundToken.ID:
-            node = self.variable()
-            return node
-
-    def term(self):
-        """term : factor ((MUL | DIV | OR | AND) factor)*"""
-        node = self.factor()
-
-        while self.current_token[0] in (TokenType.MUL, TokenType.DIV, TokenType.OR, TokenType.AND):
-            token = self.current_token
-            if token[0] == TokenType.MUL:
-                self.eat(TokenType.MUL)
-            elif token[0] == TokenType.DIV:
-                self.eat(TokenType.DIV)
-            elif token[0] == TokenType.OR:
-                self.eat(TokenType.OR)
-            elif token[0] == TokenType.AND:
-                self.eat(TokenType.AND)
-
-            node = BinOp(left=node, op=token, right=self.factor())
-            # print(f'Node: {node}')
-
-        return node
+        elif token.type == CompoundToken.DATA_TYPE:
+            return self.variableDefinition()
+        elif token.type == CompoundToken.ID:
+            return self.variable()
+        self.error()
 
     def expr(self):
         """
-        expr   : term ((PLUS | MINUS | MOD | EQUAL | LESS | GREATER | LESS_EQUAL | GREATER_EQUAL) term)*
-        term   : factor ((MUL | DIV | OR | AND) factor)*
-        factor : factor : INTEGER | BOOL | FLOAT | STRING
-                | LPAREN expr RPAREN | LBRACE expr RBRACE
-                | NOT expr
-                | variable
+        expr    : operand (BINARY_OPERATOR operand)*
+        operand : NOT operand | LPAREN expr RPAREN | LBRACE expr RBRACE | primary
+        Binary operators bind according to BINARY_PRECEDENCE and are left associative, NOT binds tighter than all of them.
+        Precedence climbing with explicit stacks, so neither long nor deeply nested expressions recurse.
         """
-        node = self.term()
+        operands = []
+        operators = []  # pending operator and opening parenthesis tokens
+        while True:
+            while self.current_token.type in (TokenType.NOT, TokenType.L_PAREN, TokenType.L_BRACE):
+                operators.append(self.current_token)
+                self.eat(self.current_token.type)
+            operands.append(self.primary())
+
+            # Closing parentheses of this expression, then either a binary operator or the end of the expression
+            while self.closes(operators):
+                closing = self.current_token
+                while operators[-1].type not in OPENING_PARENTHESES:
+                    self.reduce(operands, operators)
+                if OPENING_PARENTHESES[operators.pop().type] != closing.type:
+                    self.error()
+                self.eat(closing.type)
 
-        while self.current_token[0] in \
-                (TokenType.ADD, TokenType.SUB, TokenType.MOD, TokenType.EQUAL, TokenType.LESS, TokenType.GREATER, TokenType.LESS_EQUAL,
-                 TokenType.GREATER_EQUAL):
             token = self.current_token
-            if token[0] == TokenType.ADD:
-                self.eat(TokenType.ADD)
-            elif token[0] == TokenType.SUB:
-                self.eat(TokenType.SUB)
-            elif token[0] == TokenType.MOD:
-                self.eat(TokenType.MOD)
-            elif token[0] == TokenType.EQUAL:
-                self.eat(TokenType.EQUAL)
-            elif token[0] == TokenType.LESS:
-                self.eat(TokenType.LESS)
-            elif token[0] == TokenType.GREATER:
-                self.eat(TokenType.GREATER)
-            elif token[0] == TokenType.LESS_EQUAL:
-                self.eat(TokenType.LESS_EQUAL)
-            elif token[0] == TokenType.GREATER_EQUAL:
-                self.eat(TokenType.GREATER_EQUAL)
-
-            node = BinOp(left=node, op=token, right=self.term())
-            # print(f'Node: {node}')
-
-        return node
+            if token.type not in BINARY_PRECEDENCE:
+                break
+            precedence = BINARY_PRECEDENCE[token.type]
+            while operators and operators[-1].type not in OPENING_PARENTHESES \
+                    and self.precedence(operators[-1]) >= precedence:
+                self.reduce(operands, operators)
+            operators.append(token)
+            self.eat(token.type)
+
+        while operators:
+            if operators[-1].type in OPENING_PARENTHESES:
+                # Not closed
+                self.error()
+            self.reduce(operands, operators)
+        return operands.pop()
+
+    def closes(self, operators) -> bool:
+        """The current token closes a parenthesis opened in the expression being parsed"""
+        return self.current_token.type in CLOSING_PARENTHESES \
+            and any(operator.type in OPENING_PARENTHESES for operator in operators)
+
+    @staticmethod
+    def precedence(operator) -> int:
+        return UNARY_PRECEDENCE if operator.type == TokenType.NOT else BINARY_PRECEDENCE[operator.type]
+
+    @staticmethod
+    def reduce(operands, operators):
+        """Replaces the operands of the last pending operator with its node"""
+        operator = operators.pop()
+        right = operands.pop()
+        if operator.type == TokenType.NOT:
+            operands.append(LogicOp(None, operator, right))
+        else:
+            operands.append(BinOp(left=operands.pop(), op=operator, right=right))
 
     def compound_statement(self):
         nodes = self.statement_list()
@@ -253,18 +271,18 @@ class Parser(object):
         results = []
         while not isFinished:
             node = self.statement()
-            if self.current_token[0] == TokenType.R_BRACE:
+            if self.current_token.type == TokenType.R_BRACE:
                 self.eat(TokenType.R_BRACE)
                 isFinished = True
 
-            if self.current_token[0] == None or\
-                self.current_token[0] not in (CompoundToken.DATA_TYPE, CompoundToken.ID, TokenType.PRINT, TokenType.IF, TokenType.WHILE):
-                if self.current_token[0] == None:
+            if self.current_token.type == None or\
+                self.current_token.type not in (CompoundToken.DATA_TYPE, CompoundToken.ID, TokenType.PRINT, TokenType.IF, TokenType.WHILE):
+                if self.current_token.type == None:
                     isFinished = True
                 else:
                     self.error()
 
-            if self.current_token[0] == None:
+            if self.current_token.type == None:
                 isFinished = True
 
             results.append(node)
@@ -280,18 +298,18 @@ class Parser(object):
                   | while(expr) { statement_list }
                   | empty
         """
-        if self.current_token[0] == CompoundToken.DATA_TYPE:
+        if self.current_token.type == CompoundToken.DATA_TYPE:
             node = self.assignment_statement()
             self.eat(TokenType.SEMICOLON)
-        elif self.current_token[0] == CompoundToken.ID:
+        elif self.current_token.type == CompoundToken.ID:
             node = self.assignment_statement()
             self.eat(TokenType.SEMICOLON)
-        elif self.current_token[0] == TokenType.PRINT:
+        elif self.current_token.type == TokenType.PRINT:
             node = self.print_statement()
             self.eat(TokenType.SEMICOLON)
-        elif self.current_token[0] == TokenType.IF:
+        elif self.current_token.type == TokenType.IF:
             node = self.if_statement()
-        elif self.current_token[0] == TokenType.WHILE:
+        elif self.current_token.type == TokenType.WHILE:
             node = self.while_statement()
         else:
             node = self.empty()
@@ -302,9 +320,9 @@ class Parser(object):
         assignment_statement : DataType variable ASSIGN expr
             | variable ASSIGN expr
         """
-        if self.current_token[0] == CompoundToken.DATA_TYPE:
+        if self.current_token.type == CompoundToken.DATA_TYPE:
             left = self.variableDefinition()
-        elif self.current_token[0] == CompoundToken.ID:
+        elif self.current_token.type == CompoundToken.ID:
             left = self.variable()
 
         token = self.current_token
@@ -317,9 +335,9 @@ class Parser(object):
         """
         DataType variable
         """
-        node = Var(self.current_token[0], self.current_token[1], None)
+        node = Var(self.current_token.type, self.current_token.value, None)
         self.eat(CompoundToken.DATA_TYPE)
-        node.name = self.current_token[1]
+        node.name = self.current_token.value
         self.eat(CompoundToken.ID)
         return node
 
@@ -327,7 +345,7 @@ class Parser(object):
         """
         variable
         """
-        node = Var(None, None, self.current_token[1])
+        node = Var(None, None, self.current_token.value)
         self.eat(CompoundToken.ID)
         return node
 
@@ -374,11 +392,10 @@ class Parser(object):
         return prog
 
     def getNextToken(self):
-        if (self.index >= len(self.lexer)):
-            return (None, None)
-        token = self.lexer[self.index]
-        self.index += 1
-
+        token = next(self.lexer, None)
+        if token is None:
+            # End of input keeps the position of the last token for error messages
+            return Token(None, None, self.current_token.line, self.current_token.column)
         return token
 
 
@@ -422,7 +439,6 @@ if __name__ == "__main__":
         }
     """
     lexer = Tokenizer(text7).tokenize()
-    type, val = lexer[0]
     print(f'Lexer: {lexer[0]}')
     print(f'Lexer: {lexer}')
 
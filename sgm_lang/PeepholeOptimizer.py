@@ -0,0 +1,124 @@
+from typing import List
+
+from sgm_lang.Interpreter import BINARY_OPERATORS
+from sgm_lang.Opcode import Opcode, Operation, Parameter, ParameterType
+
+JUMPS = (Opcode.JMP, Opcode.JMP_IF, Opcode.JMP_NOT_IF, Opcode.LOAD_PUSH_BINARY_JMP_NOT_IF,
+         Opcode.JMP_IF_FALSE_OR_POP, Opcode.JMP_IF_TRUE_OR_POP)
+
+# Jumps that leave the value they tested on the stack, landing on the same jump means it is taken as well
+OR_POP_JUMPS = (Opcode.JMP_IF_FALSE_OR_POP, Opcode.JMP_IF_TRUE_OR_POP)
+
+INVERTED_JUMPS = {
+    Opcode.JMP_IF: Opcode.JMP_NOT_IF,
+    Opcode.JMP_NOT_IF: Opcode.JMP_IF,
+}
+
+
+class PeepholeOptimizer:
+    """
+    Rewrites short instruction sequences of generated bytecode:
+    - jumps landing on an unconditional JMP go straight to its destination, jumps to the next instruction are dropped
+    - JMP_IF_FALSE_OR_POP landing on JMP_IF_FALSE_OR_POP goes straight to its destination (same for JMP_IF_TRUE_OR_POP),
+      so a && b && c decided by a skips the remaining tests
+    - NOT, JMP_NOT_IF -> JMP_IF (and NOT, JMP_IF -> JMP_NOT_IF)
+    - STORE_SLOT x, LOAD_SLOT x -> DUP_STORE_SLOT x
+    - LOAD_SLOT a, LOAD_SLOT b, <binary> -> LOAD_LOAD_BINARY a, b, <binary>
+    - LOAD_SLOT a, PUSH k, <binary> -> LOAD_PUSH_BINARY a, k, <binary>
+    - LOAD_SLOT a, PUSH k, <binary>, JMP_NOT_IF t -> LOAD_PUSH_BINARY_JMP_NOT_IF a, k, <binary>, t
+    A sequence is only fused if no jump lands inside it. Jump offsets are recomputed afterwards.
+    """
+
+    def __init__(self):
+        self.removed = 0
+
+    def optimize(self, operations: List[Operation]) -> List[Operation]:
+        targets = self.threadJumps(operations, self.jumpTargets(operations))
+        labels = set(targets.values())
+
+        result = []
+        newIndex = [0] * (len(operations) + 1)
+        jumpSources = {}  # index in result -> old target index
+        index = 0
+        while index < len(operations):
+            newIndex[index] = len(result)
+            operation = operations[index]
+            if operation.opcode == Opcode.JMP and targets[index] == index + 1:
+                index += 1
+                continue
+            fused, length = self.fuse(operations, index, labels)
+            for skipped in range(index + 1, index + length):
+                newIndex[skipped] = len(result)
+            last = index + length - 1
+            if fused.opcode in JUMPS:
+                jumpSources[len(result)] = targets[last]
+            result.append(fused)
+            index += length
+        newIndex[len(operations)] = len(result)
+
+        for position, target in jumpSources.items():
+            operation = result[position]
+            offset = Parameter(ParameterType.RELATIVE, newIndex[target] - position - 1)
+            result[position] = Operation(operation.opcode, operation.params[:-1] + [offset], operation.line)
+
+        self.removed += len(operations) - len(result)
+        return result
+
+    @staticmethod
+    def jumpTargets(operations: List[Operation]) -> dict:
+        """Absolute target index of every jump"""
+        targets = {}
+        for index, operation in enumerate(operations):
+            if operation.opcode in JUMPS:
+                parameter = operation.params[-1]
+                if parameter.paramType == ParameterType.RELATIVE:
+                    targets[index] = index + parameter.value + 1
+                else:
+                    targets[index] = parameter.value
+        return targets
+
+    @staticmethod
+    def threadJumps(operations: List[Operation], targets: dict) -> dict:
+        for index, target in targets.items():
+            visited = {index}
+            opcode = operations[index].opcode
+            while target < len(operations) and target not in visited and (operations[target].opcode == Opcode.JMP or (
+                    opcode in OR_POP_JUMPS and operations[target].opcode == opcode)):
+                visited.add(target)
+                target = targets[target]
+            targets[index] = target
+        return targets
+
+    def fuse(self, operations: List[Operation], index: int, labels: set):
+        """Superinstruction starting at 'index' and the number of operations it replaces"""
+        def opcodes(length):
+            if index + length > len(operations) or any(i in labels for i in range(index + 1, index + length)):
+                return ()
+            return tuple(operation.opcode for operation in operations[index:index + length])
+
+        window = operations[index:index + 4]
+        first = window[0]
+        sequence = opcodes(4)
+        if sequence and sequence[:2] == (Opcode.LOAD_SLOT, Opcode.PUSH) and sequence[2] in BINARY_OPERATORS \
+                and sequence[3] == Opcode.JMP_NOT_IF:
+            return Operation(Opcode.LOAD_PUSH_BINARY_JMP_NOT_IF,
+                             [first.params[0], window[1].params[0], self.operator(sequence[2]), window[3].params[0]],
+                             first.line), 4
+        sequence = opcodes(3)
+        if sequence and sequence[0] == Opcode.LOAD_SLOT and sequence[2] in BINARY_OPERATORS:
+            if sequence[1] == Opcode.LOAD_SLOT:
+                return Operation(Opcode.LOAD_LOAD_BINARY,
+                                 [first.params[0], window[1].params[0], self.operator(sequence[2])], first.line), 3
+            if sequence[1] == Opcode.PUSH:
+                return Operation(Opcode.LOAD_PUSH_BINARY,
+                                 [first.params[0], window[1].params[0], self.operator(sequence[2])], first.line), 3
+        sequence = opcodes(2)
+        if sequence == (Opcode.STORE_SLOT, Opcode.LOAD_SLOT) and first.params[0].value == window[1].params[0].value:
+            return Operation(Opcode.DUP_STORE_SLOT, first.params, first.line), 2
+        if sequence and sequence[0] == Opcode.NOT and sequence[1] in INVERTED_JUMPS:
+            return Operation(INVERTED_JUMPS[sequence[1]], window[1].params, first.line), 2
+        return first, 1
+
+    @staticmethod
+    def operator(opcode: Opcode) -> Parameter:
+        return Parameter(ParameterType.IMMEDIATE, opcode)
@@ -0,0 +1,300 @@
+import asyncio
+import io
+import marshal
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, TextIO, Tuple, Union
+
+from sgm_lang.AstOptimizer import AstOptimizer
+from sgm_lang.AstToBytecodeGenerator import AstToBytecodeGenerator
+from sgm_lang.BytecodeCache import BytecodeCache
+from sgm_lang.DataType import DataType
+from sgm_lang.Interpreter import BytecodeInterpreter, InterpreterException, UNDEFINED
+from sgm_lang.OutputBuffer import OutputBuffer, FlushPolicy
+from sgm_lang.PackedBytecode import PackedProgram
+from sgm_lang.Opcode import Operation
+from sgm_lang.Parser import Parser, Compound
+from sgm_lang.PeepholeOptimizer import PeepholeOptimizer
+from sgm_lang.TypeChecker import TypeChecker, DATA_TYPES
+from sgm_lang.tokenizer import Tokenizer
+
+# Instructions an asynchronous run executes before it lets other tasks of the event loop run
+DEFAULT_SLICE_SIZE = 10000
+
+
+class BudgetExceeded(InterpreterException):
+    """A run executed more instructions or took longer than it was allowed to"""
+
+
+class Program:
+    """
+    Compiled SGM program, made by compileProgram.
+    It cannot be modified, so one Program can be shared between threads and run any number of times,
+    every run gets its own interpreter with fresh variables.
+    Inputs are variables the program uses without declaring them, run is given their values.
+    """
+    __slots__ = ("_packed", "_inputs")
+
+    def __init__(self, packed: PackedProgram, inputs: Dict[str, DataType] = None):
+        """inputs : input name -> DataType, in the order of their slots"""
+        object.__setattr__(self, "_packed", packed)
+        object.__setattr__(self, "_inputs", tuple((inputs or {}).items()))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Program cannot be modified")
+
+    def __reduce__(self):
+        return Program.fromBytes, (self.toBytes(),)
+
+    @property
+    def inputs(self) -> Dict[str, DataType]:
+        """input name -> DataType"""
+        return dict(self._inputs)
+
+    @property
+    def variables(self) -> tuple:
+        """Names of all variables of the program, inputs first"""
+        return tuple(self._packed.slotNames)
+
+    def run(self, inputs: dict = None, output: OutputBuffer = None, jitThreshold: int = None) -> Optional[str]:
+        """
+        Runs the program with fresh variables, 'inputs' maps every input of the program to its value.
+        Printed values go to output, without one they are collected and returned.
+        If the program fails, values collected before the error are in the 'printed' attribute of the exception.
+        """
+        context = ExecutionContext(self, output, jitThreshold)
+        try:
+            context.run(inputs)
+        except InterpreterException as e:
+            if output is None:
+                e.printed = context.printed()
+            raise
+        return context.printed() if output is None else None
+
+    async def runAsync(self, inputs: dict = None, output: OutputBuffer = None, **limits) -> Optional[str]:
+        """
+        Like run, in slices that let other tasks run, limits are those of ExecutionContext.runAsync.
+        Values printed before the run is cancelled or exceeds its budget are written to output,
+        or are in the 'printed' attribute of the exception when they are collected.
+        """
+        context = ExecutionContext(self, output)
+        try:
+            await context.runAsync(inputs, **limits)
+        except InterpreterException as e:
+            if output is None:
+                e.printed = context.printed()
+            raise
+        return context.printed() if output is None else None
+
+    def bindInputs(self, slots: list, values: dict):
+        """Stores values of the inputs into their slots, checking they are all given and of the right type"""
+        inputs = dict(self._inputs)
+        for name in values:
+            if name not in inputs:
+                raise InterpreterException(f"Program has no input {name}")
+        for slot, (name, dataType) in enumerate(inputs.items()):
+            if name not in values:
+                raise InterpreterException(f"Input {name} was not given")
+            value = values[name]
+            valueType = DATA_TYPES.get(type(value))
+            if valueType == DataType.INT and dataType == DataType.FLOAT:
+                value = float(value)
+            elif valueType != dataType:
+                raise InterpreterException(f"Input {name} has to be {dataType.value}, got {type(value).__name__}")
+            slots[slot] = value
+
+    def toBytes(self) -> bytes:
+        """Compact binary form, Program.fromBytes reads it back"""
+        return marshal.dumps((self._packed.toBytes(), tuple((name, dataType.value) for name, dataType in self._inputs)))
+
+    @classmethod
+    def fromBytes(cls, data: bytes) -> "Program":
+        packed, inputs = marshal.loads(data)
+        return cls(PackedProgram.fromBytes(packed), {name: DataType(dataType) for name, dataType in inputs})
+
+
+class ExecutionContext:
+    """
+    Interpreter of a Program that can run it any number of times.
+    Instructions are bound once, every run clears the stack and variables in place and binds the inputs,
+    so running again allocates nothing but the returned variables. Compiled loops are kept between runs.
+    A context runs one evaluation at a time, ContextPool keeps contexts for concurrent runs.
+    """
+
+    def __init__(self, program: Program, output: OutputBuffer = None, jitThreshold: int = None):
+        """output : sink for printed values, by default they are collected and read with printed()"""
+        self.program = program
+        self.collected = None
+        if output is None:
+            self.collected = io.StringIO()
+            output = OutputBuffer(self.collected, flushPolicy=FlushPolicy.EXIT)
+        self.interpreter = BytecodeInterpreter(program._packed, output, jitThreshold)
+        # (slot, name) of variables returned by run, temporaries of the optimizer are not valid names
+        self.results = [(slot, name) for slot, name in enumerate(program.variables) if name.isidentifier()]
+
+    def run(self, inputs: dict = None, maxInstructions: int = None, timeout: float = None) -> dict:
+        """
+        Runs the program from the start with the given inputs, returns final values of assigned variables.
+        maxInstructions and timeout limit the run as they do for runAsync.
+        """
+        if maxInstructions is None and timeout is None:
+            self.start(inputs)
+            self.interpreter.run()
+        else:
+            try:
+                for _ in self.slices(inputs, DEFAULT_SLICE_SIZE, maxInstructions, timeout):
+                    pass
+            finally:
+                self.interpreter.output.flush()
+        return self.variables()
+
+    async def runAsync(self, inputs: dict = None, sliceSize: int = DEFAULT_SLICE_SIZE,
+                       maxInstructions: int = None, timeout: float = None) -> dict:
+        """
+        Like run, but executes 'sliceSize' instructions at a time and lets other tasks run in between,
+        so an endless loop does not block the event loop and the run can be cancelled.
+        maxInstructions : number of instructions the run may execute, BudgetExceeded is raised past it
+        timeout         : seconds the run may take, checked between slices, BudgetExceeded is raised past it
+        Compiled loops would run whole within one slice, so the context must not have jitThreshold set.
+        """
+        try:
+            for _ in self.slices(inputs, sliceSize, maxInstructions, timeout):
+                await asyncio.sleep(0)
+        finally:
+            # Also when the task is cancelled or the budget is exceeded, output printed so far is not lost
+            self.interpreter.output.flush()
+        return self.variables()
+
+    def slices(self, inputs: dict, sliceSize: int, maxInstructions: Optional[int], timeout: Optional[float]):
+        """Runs the program from the start, yielding after every slice of instructions until it finishes"""
+        interpreter = self.interpreter
+        if interpreter.jitThreshold is not None:
+            raise InterpreterException("Runs with a budget need a context without jitThreshold")
+        self.start(inputs)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        remaining = maxInstructions
+        while True:
+            count = sliceSize if remaining is None else min(sliceSize, remaining)
+            if interpreter.runSlice(count):
+                return
+            if remaining is not None:
+                remaining -= count
+                if remaining <= 0:
+                    raise self.budgetExceeded(f"Instruction budget of {maxInstructions} exceeded")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise self.budgetExceeded(f"Time budget of {timeout} seconds exceeded")
+            yield
+
+    def budgetExceeded(self, message: str) -> BudgetExceeded:
+        interpreter = self.interpreter
+        line = interpreter.program.lines[interpreter.ip]
+        return BudgetExceeded(f"line {line}: {message}" if line else message)
+
+    def start(self, inputs: dict):
+        """Prepares the interpreter for a run from the start"""
+        interpreter = self.interpreter
+        interpreter.reset()
+        if self.collected is not None:
+            self.collected.seek(0)
+            self.collected.truncate()
+        self.program.bindInputs(interpreter.slots, inputs or {})
+
+    def variables(self) -> dict:
+        """Final values of assigned variables"""
+        slots = self.interpreter.slots
+        return {name: slots[slot] for slot, name in self.results if slots[slot] is not UNDEFINED}
+
+    def printed(self) -> str:
+        """Values printed by the last run, when the context collects them"""
+        return self.collected.getvalue() if self.collected is not None else ""
+
+
+class ContextPool:
+    """
+    Execution contexts of one Program shared by concurrent callers.
+    A run borrows an idle context, or makes a new one when all are busy, and gives it back when done.
+    """
+
+    def __init__(self, program: Program, jitThreshold: int = None):
+        self.program = program
+        self.jitThreshold = jitThreshold
+        self.idle = []  # list.pop and list.append are atomic, so no lock is needed
+
+    @contextmanager
+    def context(self):
+        try:
+            context = self.idle.pop()
+        except IndexError:
+            context = ExecutionContext(self.program, jitThreshold=self.jitThreshold)
+        try:
+            yield context
+        finally:
+            self.idle.append(context)
+
+    def run(self, inputs: dict = None, **limits) -> dict:
+        """limits : maxInstructions and timeout of ExecutionContext.run"""
+        with self.context() as context:
+            return context.run(inputs, **limits)
+
+    async def runAsync(self, inputs: dict = None, **limits) -> dict:
+        """limits : sliceSize, maxInstructions and timeout of ExecutionContext.runAsync"""
+        with self.context() as context:
+            return await context.runAsync(inputs, **limits)
+
+
+def tokenize(source: Union[str, TextIO]):
+    """Tokens of SGM source code, given as a string or a text stream"""
+    tokenizer = Tokenizer(source) if isinstance(source, str) else Tokenizer.fromStream(source)
+    return tokenizer.generateTokens()
+
+
+def buildAst(tokens, level: int = 0, inputs: Dict[str, DataType] = None) -> Compound:
+    """Parses, type checks and optimizes a program"""
+    ast = TypeChecker(inputs).check(Parser(tokens).parse())
+    return AstOptimizer(level, inputs).optimize(ast)
+
+
+def generateBytecode(ast: Compound, level: int = 0, inputs=(),
+                     peephole: PeepholeOptimizer = None) -> Tuple[List[Operation], List[str]]:
+    """
+    Bytecode of a program and the variable name of every slot.
+    From level 1 on the bytecode goes through 'peephole', a new PeepholeOptimizer by default.
+    """
+    generator = AstToBytecodeGenerator(ast, inputs)
+    operations = generator.generate()
+    if level > 0:
+        operations = (peephole or PeepholeOptimizer()).optimize(operations)
+    return operations, generator.slotNames()
+
+
+def compileProgram(source: Union[str, TextIO], level: int = 0, inputs: dict = None) -> Program:
+    """
+    Compiles SGM source code, given as a string or a text stream, into a Program.
+    level  : optimization level, like -O of the sgm command
+    inputs : input name -> DataType (or python type) of variables the program reads without declaring them
+    """
+    types = {}
+    for name, dataType in (inputs or {}).items():
+        types[name] = DATA_TYPES.get(dataType, dataType)
+        if not isinstance(types[name], DataType):
+            raise Exception(f"Unknown type {dataType} of input {name}")
+    operations, slotNames = generateBytecode(buildAst(tokenize(source), level, types), level, types)
+    return Program(PackedProgram.fromOperations(operations, slotNames), types)
+
+
+def loadProgram(path: str, level: int = 0, cache: BytecodeCache = None) -> Program:
+    """Compiles a script file, with a cache the program is read from it or compiled and stored to it"""
+    if cache is None:
+        with open(path, 'r') as source:
+            return compileProgram(source, level)
+    # The file is read once, so the key is always the hash of the source that was compiled
+    with open(path, 'rb') as source:
+        data = source.read()
+    variant = f"O{level}"
+    key = cache.sourceKey(data, variant)
+    packed = cache.load(path, key, variant)
+    if packed is not None:
+        return Program(packed)
+    program = compileProgram(io.TextIOWrapper(io.BytesIO(data)), level)
+    cache.store(path, key, program._packed, variant)
+    return program
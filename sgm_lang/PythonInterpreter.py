@@ -0,0 +1,39 @@
+from sgm_lang.AstToPythonGenerator import PythonProgram, FILENAME
+from sgm_lang.Interpreter import InterpreterException, UNDEFINED, runtimeError, undefinedVariable
+from sgm_lang.OutputBuffer import OutputBuffer
+
+
+def undefined(name: str):
+    raise undefinedVariable(name)
+
+
+class PythonInterpreter:
+    """
+    Runs a program translated to Python source by AstToPythonGenerator.
+    Errors are reported with the SGM line of the statement, like BytecodeInterpreter does.
+    """
+
+    def __init__(self, program: PythonProgram, output: OutputBuffer = None):
+        """output : sink for printed values, by default buffered stdout"""
+        self.program = program
+        self.output = output if output is not None else OutputBuffer()
+        namespace = {}
+        exec(program.compile(), namespace)
+        self.function = namespace["program"]
+
+    def run(self):
+        try:
+            self.function(self.output.write, UNDEFINED, undefined, self.program.constants)
+        except Exception as e:
+            raise self._runtimeError(e)
+        finally:
+            self.output.flush()
+
+    def _runtimeError(self, error: Exception) -> InterpreterException:
+        line = None
+        traceback = error.__traceback__
+        while traceback is not None:
+            if traceback.tb_frame.f_code.co_filename == FILENAME:
+                line = self.program.lines[traceback.tb_lineno]
+            traceback = traceback.tb_next
+        return runtimeError(error, line)
@@ -0,0 +1,101 @@
+from enum import Enum, auto
+from typing import List
+
+from sgm_lang.Opcode import Opcode
+
+
+class RegisterOpcode(Enum):
+    MOVE = auto()  # r(0) = r(1)
+    ADD = auto()  # r(0) = r(1) + r(2)
+    SUB = auto()  # r(0) = r(1) - r(2)
+    MUL = auto()  # r(0) = r(1) * r(2)
+    DIV = auto()  # r(0) = r(1) / r(2)
+    MOD = auto()  # r(0) = r(1) % r(2)
+    EQ = auto()  # r(0) = r(1) == r(2)
+    NEQ = auto()  # r(0) = r(1) != r(2)
+    GE = auto()  # r(0) = r(1) >= r(2)
+    GRT = auto()  # r(0) = r(1) > r(2)
+    LE = auto()  # r(0) = r(1) <= r(2)
+    LESS = auto()  # r(0) = r(1) < r(2)
+    BINARY_OR = auto()  # r(0) = r(1) || r(2)
+    BINARY_AND = auto()  # r(0) = r(1) && r(2)
+    NOT = auto()  # r(0) = !r(1)
+    PRINT = auto()  # prints r(0)
+    JMP = auto()  # jump to (0)
+    JMP_IF = auto()  # jump to (1) if r(0)
+    JMP_NOT_IF = auto()  # jump to (1) if not r(0)
+    CHECK = auto()  # fails if variable in r(0) was not assigned yet
+    TO_FLOAT = auto()  # r(0) = float(r(1))
+
+
+# Register opcode -> stack machine opcode of the same binary operation
+BINARY_OPCODES = {
+    RegisterOpcode.ADD: Opcode.ADD,
+    RegisterOpcode.SUB: Opcode.SUB,
+    RegisterOpcode.MUL: Opcode.MUL,
+    RegisterOpcode.DIV: Opcode.DIV,
+    RegisterOpcode.MOD: Opcode.MOD,
+    RegisterOpcode.EQ: Opcode.EQ,
+    RegisterOpcode.NEQ: Opcode.NEQ,
+    RegisterOpcode.GE: Opcode.GE,
+    RegisterOpcode.GRT: Opcode.GRT,
+    RegisterOpcode.LE: Opcode.LE,
+    RegisterOpcode.LESS: Opcode.LESS,
+    RegisterOpcode.BINARY_OR: Opcode.BINARY_OR,
+    RegisterOpcode.BINARY_AND: Opcode.BINARY_AND,
+}
+
+REGISTER_OPCODES = {opcode: registerOpcode for registerOpcode, opcode in BINARY_OPCODES.items()}
+REGISTER_OPCODES[Opcode.NOT] = RegisterOpcode.NOT
+
+# Jumps have an absolute target as their last operand, every other operand is a register
+JUMPS = (RegisterOpcode.JMP, RegisterOpcode.JMP_IF, RegisterOpcode.JMP_NOT_IF)
+
+
+class RegisterOperation:
+    def __init__(self, opcode: RegisterOpcode, operands: List[int], line: int = None):
+        self.opcode = opcode
+        self.operands = operands
+        self.line = line  # source line of the statement this operation comes from
+
+    def __repr__(self):
+        operands = [f"r{operand}" for operand in self.operands]
+        if self.opcode in JUMPS:
+            operands[-1] = f"@{self.operands[-1]}"
+        return f"{self.opcode.name} {', '.join(operands)}"
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class RegisterProgram:
+    """
+    Register code with the layout of its register file:
+    variable slots first, then one register per constant, then temporaries
+    """
+
+    def __init__(self, operations: List[RegisterOperation], constants: list, slotNames: List[str],
+                 temporaryCount: int):
+        self.operations = operations
+        self.constants = constants
+        self.slotNames = slotNames
+        self.temporaryCount = temporaryCount
+        self.constantBase = len(slotNames)
+        self.temporaryBase = self.constantBase + len(constants)
+        self.registerCount = self.temporaryBase + temporaryCount
+
+    def registerName(self, register: int) -> str:
+        if register < self.constantBase:
+            return self.slotNames[register]
+        if register < self.temporaryBase:
+            return repr(self.constants[register - self.constantBase])
+        return f"${register - self.temporaryBase}"
+
+    def listing(self) -> List[str]:
+        """Human readable code, registers annotated with the variable, constant or temporary they hold"""
+        lines = [f"r{register} = {self.registerName(register)}" for register in range(self.temporaryBase)]
+        for offset, operation in enumerate(self.operations):
+            registers = operation.operands[:-1] if operation.opcode in JUMPS else operation.operands
+            comment = ", ".join(self.registerName(register) for register in registers)
+            lines.append(f"{offset:>5}  {str(operation):<24}{'  # ' + comment if comment else ''}")
+        return lines
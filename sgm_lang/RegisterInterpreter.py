@@ -0,0 +1,130 @@
+from sgm_lang.Interpreter import InterpreterException, UNDEFINED, BINARY_OPERATORS, runtimeError, undefinedVariable
+from sgm_lang.OutputBuffer import OutputBuffer
+from sgm_lang.RegisterBytecode import RegisterOpcode, RegisterProgram, BINARY_OPCODES
+
+
+class RegisterInterpreter:
+    """
+    Executes register code generated by AstToRegisterGenerator.
+    Like BytecodeInterpreter every instruction is bound to a closure returning the index of the next one,
+    but operands are read from and results written to a flat list of registers instead of a stack.
+    """
+
+    def __init__(self, program: RegisterProgram, output: OutputBuffer = None):
+        """output : sink for printed values, by default buffered stdout"""
+        self.program = program
+        self.ip = 0
+        self.registers = [UNDEFINED] * program.constantBase + list(program.constants) \
+            + [None] * program.temporaryCount
+        self.output = output if output is not None else OutputBuffer()
+        self.instructions = self._bindInstructions()
+
+    def run(self):
+        instructions = self.instructions
+        end = len(instructions)
+        ip = self.ip
+        try:
+            while ip < end:
+                ip = instructions[ip]()
+        except Exception as e:
+            self.ip = ip
+            raise self._runtimeError(e)
+        finally:
+            self.output.flush()
+        self.ip = ip
+
+    def _runtimeError(self, error: Exception) -> InterpreterException:
+        return runtimeError(error, self.program.operations[self.ip].line)
+
+    def _bindInstructions(self) -> list:
+        instructions = []
+        for ip, operation in enumerate(self.program.operations):
+            for operand in operation.operands:
+                if not isinstance(operand, int) or operand < 0:
+                    raise InterpreterException(f"Invalid operand {operand} of {operation} at offset {ip}")
+            instructions.append(self.binders[operation.opcode](self, operation.opcode, ip + 1, *operation.operands))
+        return instructions
+
+    def _bindBinary(self, opcode, nextIp, target, left, right):
+        apply = BINARY_OPERATORS[BINARY_OPCODES[opcode]]
+        registers = self.registers
+
+        def instruction():
+            registers[target] = apply(registers[left], registers[right])
+            return nextIp
+        return instruction
+
+    def _bindNot(self, opcode, nextIp, target, source):
+        registers = self.registers
+
+        def instruction():
+            registers[target] = not registers[source]
+            return nextIp
+        return instruction
+
+    def _bindToFloat(self, opcode, nextIp, target, source):
+        registers = self.registers
+
+        def instruction():
+            registers[target] = float(registers[source])
+            return nextIp
+        return instruction
+
+    def _bindMove(self, opcode, nextIp, target, source):
+        registers = self.registers
+
+        def instruction():
+            registers[target] = registers[source]
+            return nextIp
+        return instruction
+
+    def _bindCheck(self, opcode, nextIp, register):
+        name = self.program.slotNames[register]
+        registers = self.registers
+
+        def instruction():
+            if registers[register] is UNDEFINED:
+                raise undefinedVariable(name)
+            return nextIp
+        return instruction
+
+    def _bindPrint(self, opcode, nextIp, source):
+        registers = self.registers
+        write = self.output.write
+
+        def instruction():
+            write(registers[source])
+            return nextIp
+        return instruction
+
+    def _bindJump(self, opcode, nextIp, target):
+        def instruction():
+            return target
+        return instruction
+
+    def _bindJumpIf(self, opcode, nextIp, condition, target):
+        registers = self.registers
+
+        def instruction():
+            return target if registers[condition] else nextIp
+        return instruction
+
+    def _bindJumpNotIf(self, opcode, nextIp, condition, target):
+        registers = self.registers
+
+        def instruction():
+            return nextIp if registers[condition] else target
+        return instruction
+
+    # Handler table: opcode -> function binding a closure for one instruction
+    binders = dict.fromkeys(BINARY_OPCODES, _bindBinary)
+    binders.update({
+        RegisterOpcode.NOT: _bindNot,
+        RegisterOpcode.MOVE: _bindMove,
+        RegisterOpcode.TO_FLOAT: _bindToFloat,
+        RegisterOpcode.CHECK: _bindCheck,
+        RegisterOpcode.PRINT: _bindPrint,
+        RegisterOpcode.JMP: _bindJump,
+        RegisterOpcode.JMP_IF: _bindJumpIf,
+        RegisterOpcode.JMP_NOT_IF: _bindJumpNotIf,
+    })
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import os
+import socket
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable
+
+from sgm_lang.BytecodeCache import COMPILER_VERSION
+from sgm_lang.Program import ExecutionContext, compileProgram
+from sgm_lang.TypeChecker import DATA_TYPES
+
+# Compiled programs kept by every worker process, and sources kept by the server for requests by key
+MAX_CACHED_PROGRAMS = 256
+
+# Longest request line, a request carries the whole source of a program
+MAX_REQUEST_SIZE = 64 * 1024 * 1024
+
+# Seconds a request may run by default, so an endless loop does not keep a worker forever
+DEFAULT_TIMEOUT = 10.0
+
+# State of a worker process
+workerContexts = OrderedDict()  # program key -> ExecutionContext, least recently used first
+workerJitThreshold = None
+workerLimits = {}  # maxInstructions and timeout of every run
+
+
+def programKey(source: str, level: int, inputTypes: dict) -> str:
+    """Key of a compiled program, it changes with anything that changes the generated bytecode"""
+    types = ",".join(f"{name}:{dataType.value}" for name, dataType in inputTypes.items())
+    return hashlib.sha256(f"{COMPILER_VERSION}:O{level}:{types}:{source}".encode()).hexdigest()
+
+
+def inputTypes(inputs: dict) -> dict:
+    types = {}
+    for name, value in inputs.items():
+        if type(value) not in DATA_TYPES:
+            raise ValueError(f"Input {name} has a value of unsupported type {type(value).__name__}")
+        types[name] = DATA_TYPES[type(value)]
+    return types
+
+
+def initWorker(jitThreshold: int, maxInstructions: int = None, timeout: float = None):
+    global workerJitThreshold, workerLimits
+    workerJitThreshold = jitThreshold
+    workerLimits = {"maxInstructions": maxInstructions, "timeout": timeout}
+
+
+def runRequest(key: str, source: str, level: int, types: dict, inputs: dict) -> dict:
+    """Runs a program in a worker process, compiling it unless the worker has it cached already"""
+    context = workerContexts.get(key)
+    if context is None:
+        try:
+            program = compileProgram(source, level, types)
+        except Exception as e:
+            return {"error": str(e)}
+        context = ExecutionContext(program, jitThreshold=workerJitThreshold)
+        workerContexts[key] = context
+        if len(workerContexts) > MAX_CACHED_PROGRAMS:
+            workerContexts.popitem(last=False)
+    else:
+        workerContexts.move_to_end(key)
+    try:
+        variables = context.run(inputs, **workerLimits)
+    except Exception as e:
+        return {"error": str(e), "output": context.printed()}
+    return {"output": context.printed(), "variables": variables}
+
+
+class Server:
+    """
+    Runs programs for clients connected to a Unix domain socket, on a pool of worker processes
+    started up front with the compiler already imported.
+    Requests and responses are JSON objects, one per line, a connection can send any number of requests.
+    Request  : {"source": program source, "level": optimization level (0 by default),
+                "inputs": {name: value} for variables the program reads without declaring them}
+               instead of "source" a request can give the "key" of a program sent before.
+    Response : {"key": key of the program, "output": printed values, "variables": final values of variables}
+               or {"key": ..., "error": message, "output": values printed before the error}
+    Input types are taken from the given values. Every worker keeps its compiled programs, with
+    an ExecutionContext ready for each, so a repeated request runs without compiling or binding anything.
+    A run that goes over maxInstructions or timeout stops with an error response. If a worker dies,
+    the requests it ran get an error response and the workers are started again.
+    """
+
+    def __init__(self, socketPath: str, jobs: int = None, jitThreshold: int = None, maxInstructions: int = None,
+                 timeout: float = DEFAULT_TIMEOUT):
+        """
+        jobs            : number of worker processes, by default the number of CPUs
+        maxInstructions : number of instructions a request may execute, unlimited if None
+        timeout         : seconds a request may run, unlimited if None
+        Compiled loops cannot be stopped, so jitThreshold can be set only without the limits.
+        """
+        if jitThreshold is not None and (maxInstructions is not None or timeout is not None):
+            raise ValueError("jitThreshold needs a server without maxInstructions and timeout")
+        self.socketPath = socketPath
+        self.jobs = jobs or os.cpu_count() or 1
+        self.jitThreshold = jitThreshold
+        self.maxInstructions = maxInstructions
+        self.timeout = timeout
+        self.sources = OrderedDict()  # program key -> (source, level, input types), least recently used first
+        self.executor = None
+
+    def serve(self, ready: Callable[[], None] = None):
+        """
+        Serves until interrupted.
+        ready : called once the socket accepts connections
+        """
+        self.removeStaleSocket()
+        started = self.startWorkers()
+        try:
+            started.result()
+            asyncio.run(self.listen(ready))
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+            if os.path.exists(self.socketPath):
+                os.unlink(self.socketPath)
+
+    def startWorkers(self) -> Future:
+        """Starts a new pool of workers, the returned future is done once they run"""
+        arguments = (self.jitThreshold, self.maxInstructions, self.timeout)
+        self.executor = ProcessPoolExecutor(self.jobs, initializer=initWorker, initargs=arguments)
+        # Workers start with the first task, one now keeps the first request from waiting for them
+        return self.executor.submit(initWorker, *arguments)
+
+    def removeStaleSocket(self):
+        """Removes the socket file left by a server that is not running anymore"""
+        if not os.path.exists(self.socketPath):
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.socketPath)
+            except ConnectionRefusedError:
+                os.unlink(self.socketPath)
+                return
+        raise OSError(f"A server is already listening on {self.socketPath}")
+
+    async def listen(self, ready: Callable[[], None] = None):
+        server = await asyncio.start_unix_server(self.handle, self.socketPath, limit=MAX_REQUEST_SIZE)
+        if ready is not None:
+            ready()
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.respond(json.loads(line))
+                except (ValueError, TypeError, AttributeError) as e:
+                    response = {"error": f"Invalid request: {e}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # Lost connection or a request over MAX_REQUEST_SIZE
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, request: dict) -> dict:
+        inputs = request.get("inputs") or {}
+        if "source" in request:
+            source, level, types = request["source"], int(request.get("level", 0)), inputTypes(inputs)
+            key = programKey(source, level, types)
+            self.sources[key] = (source, level, types)
+            if len(self.sources) > MAX_CACHED_PROGRAMS:
+                self.sources.popitem(last=False)
+        elif request.get("key") in self.sources:
+            key = request["key"]
+            source, level, types = self.sources[key]
+        else:
+            return {"error": f"Unknown program {request.get('key')}, send its source"}
+        self.sources.move_to_end(key)
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            response = await loop.run_in_executor(executor, runRequest, key, source, level, types, inputs)
+        except BrokenProcessPool:
+            # All requests running on the broken pool fail at once, the first of them starts new workers
+            if executor is self.executor:
+                executor.shutdown(wait=False)
+                self.startWorkers()
+            response = {"error": "The worker process running the program died"}
+        response["key"] = key
+        return response
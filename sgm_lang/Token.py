@@ -0,0 +1,24 @@
+class Token:
+    """
+    Single token produced by the Tokenizer.
+    __slots__ keeps it as small as a tuple while carrying the source position for error messages.
+    """
+    __slots__ = ("type", "value", "line", "column")
+
+    def __init__(self, type, value=None, line=0, column=0):
+        self.type = type
+        self.value = value
+        self.line = line
+        self.column = column
+
+    def __eq__(self, other):
+        return isinstance(other, Token) and self.type == other.type and self.value == other.value
+
+    def __hash__(self):
+        return hash((self.type, self.value))
+
+    def position(self) -> str:
+        return f"line {self.line}, column {self.column}"
+
+    def __repr__(self):
+        return repr((self.type, self.value))
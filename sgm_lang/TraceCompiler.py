@@ -0,0 +1,300 @@
+import math
+from typing import List, Dict, Tuple
+
+from sgm_lang.Opcode import Opcode, PYTHON_OPERATORS
+from sgm_lang.PackedBytecode import PackedProgram, OPCODES, INSTRUCTION_SIZES
+
+TRACE_FILENAME = "<sgm-trace {}>"
+
+# Replaced by the assignments writing Python locals back to slots once all assigned variables are known
+WRITE_BACK = "{WRITE_BACK}"
+
+
+class TraceAbort(Exception):
+    """The recorded trace uses something the compiler does not handle, the loop stays interpreted"""
+    pass
+
+
+class StackValue:
+    """Python expression standing for a value on the stack, 'slots' are the variables it reads"""
+    def __init__(self, expression: str, slots=frozenset()):
+        self.expression = expression
+        self.slots = slots
+
+
+class TraceTree:
+    """Recorded paths through a loop: the main trace and side traces taken from its frequent side exits"""
+    def __init__(self, trace: List[int], original):
+        self.trace = trace
+        self.original = original  # closure of the loop header instruction the trace replaces
+        self.sideTraces: Dict[Tuple[int, int], List[int]] = {}
+        self.sideExits: Dict[Tuple[int, int], int] = {}  # times each side exit was taken
+
+
+class CompiledTrace:
+    def __init__(self, function, filename: str, offsets: Dict[int, int]):
+        self.function = function
+        self.filename = filename
+        self.offsets = offsets  # line of the generated source -> code offset of the instruction it executes
+
+
+class TraceCompiler:
+    """
+    Compiles recorded traces of a loop of packed bytecode into a Python closure.
+    A trace is the list of code offsets one iteration went through, from the loop header to the backward JMP.
+    Variables of the loop are kept in Python locals and the stack is tracked at compile time,
+    so an iteration runs without any dispatch. The closure is specialized on:
+    - variables read before being assigned in the trace holding a value - checked once on entry,
+      otherwise the original header instruction runs instead,
+    - every conditional jump going the recorded way - when it does not, the closure writes variables back
+      and returns the offset the interpreter continues from.
+    Leaving to an offset inside the loop is a side exit and is reported to 'sideExit'. The interpreter records
+    the path from a frequent side exit back to the header as a side trace, which is then compiled in place
+    of the exit.
+    """
+
+    def __init__(self, program: PackedProgram, slots: list, push, write, undefined):
+        """
+        slots, push, write : interpreter state the compiled closures work on
+        undefined          : value of slots that were not assigned yet
+        """
+        self.program = program
+        self.undefined = undefined
+        self.slots = slots
+        self.push = push
+        self.write = write
+
+    def compile(self, trace: List[int], sideTraces: Dict[Tuple[int, int], List[int]], innerTraces: dict,
+                original, sideExit) -> CompiledTrace:
+        """
+        sideTraces  : (offset of a conditional jump, offset it left the trace to) -> path from there to the header
+        innerTraces : offset -> closure of already compiled loops nested in this one
+        original    : closure of the loop header instruction, run when the trace cannot be entered
+        sideExit    : called with the offsets of the jump and of the instruction a trace leaves to inside the loop
+        """
+        self.header = trace[0]
+        self.loop = range(self.header, trace[-1] + 1)
+        self.sideTraces = sideTraces
+        self.innerTraces = innerTraces
+        self.code = []
+        self.offsets = {}
+        self.stack: List[StackValue] = []
+        self.temporaries = 0
+        self.depth = 4
+        self.used = set()  # slots used in the trace
+        self.readFirst = set()  # slots read before being assigned, they have to be defined on entry
+        self.written = set()  # slots assigned anywhere in the trace
+        # Along the path being compiled: slots assigned so far and slots reloaded after a nested loop,
+        # which are not known to be defined
+        self.assigned = set()
+        self.unchecked = set()
+
+        self.compilePath(trace)
+        return self.build(original, sideExit)
+
+    def build(self, original, sideExit) -> CompiledTrace:
+        slots = sorted(self.used)
+        writeBack = "".join(f"slots[{slot}] = {self.local(slot)}; " for slot in sorted(self.written))
+        lines = ["def make(slots, push, write, UNDEFINED, constants, original, inner, sideExit):",
+                 "    def trace():"]
+        if slots:
+            lines.append("        " + ", ".join(self.local(slot) for slot in slots) + " = "
+                         + ", ".join(f"slots[{slot}]" for slot in slots))
+        if self.readFirst:
+            checks = " or ".join(f"{self.local(slot)} is UNDEFINED" for slot in sorted(self.readFirst))
+            lines.append(f"        if {checks}:")
+            lines.append("            return original()")
+        lines.append("        try:")
+        lines.append("            while True:")
+        first = len(lines) + 1
+        lines.extend(line.replace(WRITE_BACK, writeBack) for line in self.code)
+        lines.append("        except BaseException:")
+        lines.append("            " + (writeBack or "pass"))
+        lines.append("            raise")
+        lines.append("    return trace")
+
+        filename = TRACE_FILENAME.format(self.header)
+        try:
+            code = compile("\n".join(lines) + "\n", filename, "exec")
+        except (SyntaxError, RecursionError, MemoryError) as e:
+            # e.g. expressions nested deeper than CPython accepts
+            raise TraceAbort(f"Trace of loop {self.header} does not compile: {e}")
+        namespace = {}
+        exec(code, namespace)
+        function = namespace["make"](self.slots, self.push, self.write, self.undefined, self.program.constants,
+                                     original, self.innerTraces, sideExit)
+        offsets = {first + line: ip for line, ip in self.offsets.items()}
+        return CompiledTrace(function, filename, offsets)
+
+    @staticmethod
+    def local(slot: int) -> str:
+        return f"v{slot}"
+
+    def emit(self, ip: int, text: str):
+        self.offsets[len(self.code)] = ip
+        self.code.append("    " * self.depth + text)
+
+    def compilePath(self, path: List[int]):
+        """Compiles instructions of one path through the loop, which ends back at the header"""
+        for index, ip in enumerate(path):
+            following = path[index + 1] if index + 1 < len(path) else self.header
+            # A nested loop is called through its trace only where the path went from its header somewhere
+            # else than the next instruction. When the loop was compiled after the path was recorded,
+            # the path has its instructions run by the interpreter, and they are compiled inline
+            nextIp = ip + INSTRUCTION_SIZES[OPCODES[self.program.code[ip]]]
+            if ip in self.innerTraces and ip != self.header and following != nextIp:
+                self.compileInnerTrace(ip, following)
+            else:
+                self.compileInstruction(ip, following)
+        if self.stack:
+            raise TraceAbort(f"Stack not empty at the end of loop {self.header}")
+
+    def constant(self, index: int) -> StackValue:
+        value = self.program.constants[index]
+        if isinstance(value, float) and not math.isfinite(value):
+            return StackValue(f"constants[{index}]")
+        return StackValue(repr(value))
+
+    def load(self, ip: int, slot: int) -> StackValue:
+        self.used.add(slot)
+        if slot not in self.assigned:
+            self.readFirst.add(slot)
+        elif slot in self.unchecked:
+            self.unchecked.discard(slot)
+            # Left to the interpreter, which reports the variable as not defined
+            self.emit(ip, f"if {self.local(slot)} is UNDEFINED:")
+            self.depth += 1
+            self.exit(ip, ip)
+            self.depth -= 1
+        return StackValue(self.local(slot), frozenset((slot,)))
+
+    def store(self, ip: int, slot: int, value: StackValue):
+        # Values still on the stack that read the old value are computed before it is overwritten
+        for index, pending in enumerate(self.stack):
+            if slot in pending.slots:
+                self.stack[index] = self.materialize(ip, pending)
+        self.used.add(slot)
+        self.written.add(slot)
+        self.assigned.add(slot)
+        self.unchecked.discard(slot)
+        self.emit(ip, f"{self.local(slot)} = {value.expression}")
+
+    def materialize(self, ip: int, value: StackValue) -> StackValue:
+        name = f"t{self.temporaries}"
+        self.temporaries += 1
+        self.emit(ip, f"{name} = {value.expression}")
+        return StackValue(name)
+
+    @staticmethod
+    def binary(operation: Opcode, left: StackValue, right: StackValue) -> StackValue:
+        return StackValue(f"({left.expression} {PYTHON_OPERATORS[operation]} {right.expression})",
+                          left.slots | right.slots)
+
+    def exit(self, ip: int, target: int):
+        """Leaves the trace from the instruction at 'ip', continuing in the interpreter at 'target'"""
+        for value in self.stack:
+            self.emit(ip, f"push({value.expression})")
+        if target in self.loop and target != ip:
+            self.emit(ip, f"{WRITE_BACK}return sideExit({ip}, {target})")
+        else:
+            self.emit(ip, f"{WRITE_BACK}return {target}")
+
+    def compileInstruction(self, ip: int, following: int):
+        code = self.program.code
+        opcode = OPCODES[code[ip]]
+        size = INSTRUCTION_SIZES[opcode]
+        operands = code[ip + 1:ip + size]
+        nextIp = ip + size
+        stack = self.stack
+
+        if opcode in PYTHON_OPERATORS:
+            right = stack.pop()
+            stack.append(self.binary(opcode, stack.pop(), right))
+        elif opcode == Opcode.NOT:
+            value = stack.pop()
+            stack.append(StackValue(f"(not {value.expression})", value.slots))
+        elif opcode == Opcode.TO_FLOAT:
+            value = stack.pop()
+            stack.append(StackValue(f"float({value.expression})", value.slots))
+        elif opcode == Opcode.LOAD_SLOT:
+            stack.append(self.load(ip, operands[0]))
+        elif opcode == Opcode.STORE_SLOT:
+            self.store(ip, operands[0], stack.pop())
+        elif opcode == Opcode.DUP_STORE_SLOT:
+            self.store(ip, operands[0], stack.pop())
+            stack.append(StackValue(self.local(operands[0]), frozenset((operands[0],))))
+        elif opcode == Opcode.LOAD_LOAD_BINARY:
+            stack.append(self.binary(OPCODES[operands[2]], self.load(ip, operands[0]), self.load(ip, operands[1])))
+        elif opcode == Opcode.LOAD_PUSH_BINARY:
+            stack.append(self.binary(OPCODES[operands[2]], self.load(ip, operands[0]), self.constant(operands[1])))
+        elif opcode == Opcode.LOAD_PUSH_BINARY_JMP_NOT_IF:
+            condition = self.binary(OPCODES[operands[2]], self.load(ip, operands[0]), self.constant(operands[1]))
+            self.compileBranch(ip, condition, following, nextIp, operands[3])
+        elif opcode == Opcode.PUSH:
+            stack.append(self.constant(operands[0]))
+        elif opcode == Opcode.PRINT:
+            self.emit(ip, f"write({stack.pop().expression})")
+        elif opcode == Opcode.PRINTC:
+            self.emit(ip, f"write({self.constant(operands[0]).expression})")
+        elif opcode == Opcode.JMP:
+            if operands[0] != following:
+                raise TraceAbort(f"Jump at {ip} does not go where the trace does")
+        elif opcode == Opcode.JMP_IF:
+            self.compileBranch(ip, StackValue(f"(not {stack.pop().expression})"), following, nextIp, operands[0])
+        elif opcode == Opcode.JMP_NOT_IF:
+            self.compileBranch(ip, stack.pop(), following, nextIp, operands[0])
+        elif opcode in (Opcode.JMP_IF_FALSE_OR_POP, Opcode.JMP_IF_TRUE_OR_POP):
+            # Computed once, it is both tested and possibly left on the stack
+            value = self.materialize(ip, stack.pop())
+            condition = value if opcode == Opcode.JMP_IF_FALSE_OR_POP else StackValue(f"(not {value.expression})")
+            self.compileBranch(ip, condition, following, nextIp, operands[0], value)
+            if following == operands[0]:
+                stack.append(value)
+        else:
+            raise TraceAbort(f"{opcode.name} at {ip} is not supported in traces")
+
+    def compileBranch(self, ip: int, condition: StackValue, following: int, nextIp: int, target: int,
+                      jumpValue: StackValue = None):
+        """Jumps to 'target' when condition is falsy. The way the trace went continues inline, the other one
+        continues with its side trace if there is one, otherwise leaves the trace.
+        jumpValue is pushed on the stack when the jump to 'target' is taken"""
+        if following == nextIp:
+            self.emit(ip, f"if not {condition.expression}:")
+            other = target
+        elif following == target:
+            self.emit(ip, f"if {condition.expression}:")
+            other = nextIp
+        else:
+            raise TraceAbort(f"Branch at {ip} does not go where the trace does")
+
+        self.depth += 1
+        stack, assigned, unchecked = self.stack, self.assigned, self.unchecked
+        self.stack, self.assigned, self.unchecked = list(stack), set(assigned), set(unchecked)
+        if jumpValue is not None and other == target:
+            self.stack.append(jumpValue)
+        side = self.sideTraces.get((ip, other))
+        if side is None:
+            self.exit(ip, other)
+        else:
+            self.compilePath(side)
+            self.emit(ip, "continue")
+        self.stack, self.assigned, self.unchecked = stack, assigned, unchecked
+        self.depth -= 1
+
+    def compileInnerTrace(self, ip: int, following: int):
+        """Runs a nested loop through its own compiled trace, with variables written back around the call"""
+        if self.stack:
+            raise TraceAbort(f"Stack not empty at nested loop {ip}")
+        self.emit(ip, f"{WRITE_BACK}ip = inner[{ip}]()")
+        # The nested loop may read and assign any variable, those not seen defined yet are checked when read
+        for slot in range(len(self.program.slotNames)):
+            if slot not in self.assigned and slot not in self.readFirst:
+                self.unchecked.add(slot)
+            self.used.add(slot)
+            self.written.add(slot)
+            self.assigned.add(slot)
+            self.emit(ip, f"{self.local(slot)} = slots[{slot}]")
+        self.emit(ip, f"if ip != {following}:")
+        self.depth += 1
+        self.emit(ip, "return sideExit(None, ip)")
+        self.depth -= 1
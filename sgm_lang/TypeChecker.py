@@ -0,0 +1,177 @@
+from sgm_lang.DataType import DataType
+from sgm_lang.Interpreter import BINARY_OPERATORS
+from sgm_lang.Opcode import Opcode, GENERIC_OPCODES
+from sgm_lang.Parser import Compound, Assign, Var, Num, BinOp, Print, NoOp, If, While, Logic, postorder
+from sgm_lang.TokenType import TokenType
+
+DATA_TYPES = {
+    bool: DataType.BOOL,
+    int: DataType.INT,
+    float: DataType.FLOAT,
+    str: DataType.STRING,
+}
+
+# A value of every type, operations are tried on them to find out which types the runtime accepts
+SAMPLE_VALUES = {
+    DataType.BOOL: True,
+    DataType.INT: 1,
+    DataType.FLOAT: 1.0,
+    DataType.STRING: "s",
+}
+
+
+def resultTypes() -> dict:
+    types = {}
+    for opcode, apply in BINARY_OPERATORS.items():
+        if opcode in GENERIC_OPCODES:
+            continue
+        for left, leftValue in SAMPLE_VALUES.items():
+            for right, rightValue in SAMPLE_VALUES.items():
+                try:
+                    types[opcode, left, right] = DATA_TYPES[type(apply(leftValue, rightValue))]
+                except TypeError:
+                    pass
+    return types
+
+
+# (opcode, left operand type, right operand type) -> type of the result, missing when the runtime raises TypeError
+RESULT_TYPES = resultTypes()
+
+NUMBER_PAIRS = ((DataType.INT, DataType.FLOAT), (DataType.FLOAT, DataType.INT), (DataType.FLOAT, DataType.FLOAT))
+
+# (opcode, left operand type, right operand type) -> typed opcode generated instead
+TYPED_OPCODES = {(GENERIC_OPCODES[typed], DataType.INT, DataType.INT): typed for typed in (
+    Opcode.IADD, Opcode.ISUB, Opcode.IMUL, Opcode.IMOD,
+    Opcode.IEQ, Opcode.ILESS, Opcode.ILE, Opcode.IGRT, Opcode.IGE)}
+TYPED_OPCODES.update({(GENERIC_OPCODES[typed], left, right): typed for typed in (Opcode.FADD, Opcode.FSUB, Opcode.FMUL)
+                      for left, right in NUMBER_PAIRS})
+TYPED_OPCODES.update({(Opcode.DIV, left, right): Opcode.FDIV for left, right in NUMBER_PAIRS})
+TYPED_OPCODES[Opcode.DIV, DataType.INT, DataType.INT] = Opcode.FDIV
+TYPED_OPCODES[Opcode.ADD, DataType.STRING, DataType.STRING] = Opcode.SCONCAT
+
+
+def valueType(node):
+    """DataType of a checked expression, None if it was not checked"""
+    if node.__class__ in (Num, Logic):
+        return DATA_TYPES[type(node.value)]
+    return node.valueType
+
+
+def typedOpcode(node) -> Opcode:
+    """Opcode of a BinOp or LogicOp node, specialized when the types of its operands are known"""
+    opcode = node.op.type.getOpcode()
+    if node.left is None:
+        return opcode
+    return TYPED_OPCODES.get((opcode, valueType(node.left), valueType(node.right)), opcode)
+
+
+def isShortCircuit(node) -> bool:
+    """&& or || of two bools, which skips the right operand once the left one decides the result.
+    Of other types they are bitwise operations and need both operands"""
+    return node.__class__ == BinOp and node.op.type in (TokenType.AND, TokenType.OR) \
+        and valueType(node.left) == DataType.BOOL and valueType(node.right) == DataType.BOOL
+
+
+def variableSlot(variables: dict, var) -> int:
+    """
+    Slot number of an assigned variable, a declaration takes the next free one.
+    Generators run on checked programs, TypeChecker has already rejected undefined and redefined variables.
+    """
+    if var.ID:
+        variables[var.name] = len(variables)
+    return variables[var.name]
+
+
+class AssignedScopes:
+    """
+    Variables assigned in the blocks a generator is in, one set per block.
+    Reading them needs no runtime check. A variable declared in a block that has ended may have been skipped,
+    so engines check that it has a value before reading it.
+    """
+
+    def __init__(self):
+        self.scopes = [set()]
+
+    def enter(self):
+        self.scopes.append(set())
+
+    def leave(self):
+        self.scopes.pop()
+
+    def assign(self, name: str):
+        self.scopes[-1].add(name)
+
+    def mayBeUndefined(self, name: str) -> bool:
+        return not any(name in scope for scope in self.scopes)
+
+
+class TypeChecker:
+    """
+    Infers the DataType of every expression from the declared types of variables, before the program runs.
+    Values assigned to a variable have to be of its declared type, except that an int can be assigned to
+    a boatWhichFloat variable, such an assignment is marked 'toFloat' and the value is converted, so variables
+    always hold values of their declared types. Operations have to be defined for the types of their operands.
+    Expressions are annotated with 'valueType', which lets the bytecode generator emit typed opcodes.
+    """
+
+    def __init__(self, inputs: dict = None):
+        """inputs : variable name -> DataType of variables given to the program instead of declared in it"""
+        self.variables = dict(inputs or {})  # variable name -> declared DataType
+
+    def check(self, ast: Compound) -> Compound:
+        for node in ast.children:
+            self.checkStatement(node)
+        return ast
+
+    def checkSubprogram(self, nodes):
+        for node in nodes.children:
+            if node.__class__ == NoOp:
+                return
+            self.checkStatement(node)
+
+    def checkStatement(self, node):
+        if node.__class__ == Assign:
+            self.checkAssign(node)
+        elif node.__class__ == Print:
+            self.infer(node.value)
+        elif node.__class__ in (If, While):
+            self.infer(node.expression)
+            self.checkSubprogram(node.statements)
+
+    def checkAssign(self, node):
+        # Right side first, so that 'mrINTernational a = a;' does not see 'a' as defined
+        value = self.infer(node.right)
+        var = node.left
+        if not var.ID:
+            if var.name not in self.variables:
+                raise Exception(f"Variable {var.name} was not defined")
+        else:
+            if var.name in self.variables:
+                raise Exception(f"Variable {var.name} redefinition")
+            self.variables[var.name] = var.ID
+        declared = self.variables[var.name]
+        var.valueType = declared
+        if declared == DataType.FLOAT and value == DataType.INT:
+            node.toFloat = True
+        elif value != declared:
+            raise Exception(f"Type error at {node.token.position()}: "
+                            f"cannot assign {value.value} to {declared.value} variable {var.name}")
+
+    def infer(self, expression) -> DataType:
+        for node in postorder(expression):
+            if node.__class__ == Var:
+                if node.name not in self.variables:
+                    raise Exception(f"Variable {node.name} was not defined")
+                node.valueType = self.variables[node.name]
+            elif node.__class__ in (Num, Logic):
+                node.valueType = DATA_TYPES[type(node.value)]
+            elif node.left is None:
+                # Negation works on any value
+                node.valueType = DataType.BOOL
+            else:
+                left, right = node.left.valueType, node.right.valueType
+                node.valueType = RESULT_TYPES.get((node.op.type.getOpcode(), left, right))
+                if node.valueType is None:
+                    raise Exception(f"Type error at {node.op.position()}: "
+                                    f"{node.op.type.value} cannot be applied to {left.value} and {right.value}")
+        return expression.valueType
@@ -0,0 +1,2 @@
+from sgm_lang.Interpreter import InterpreterException
+from sgm_lang.Program import Program, ExecutionContext, ContextPool, BudgetExceeded, compileProgram
@@ -1,157 +1,183 @@
+import re
+
 from sgm_lang.DataType import DataType
 from sgm_lang.TokenType import TokenType
 from sgm_lang.CompoundToken import CompoundToken
+from sgm_lang.Token import Token
 
 
 class TokenizerError(Exception):
     pass
 
 
+# Ile znaków na raz czytamy ze strumienia w trybie strumieniowym
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# jak wystąpi {()} to możesz powstawiać między spacje i semantycznie bez zmiany: {()} == { ( ) }
+SPLITTABLE = "(){}![]+/-*;"
+# Tych nie można rozdzielać bez zmiany znaczenia: == [to nie to samo co ] = =
+UNSPLITTABLE = "<>=|&"
+
+# Tablice budowane raz przy imporcie - słowo klasyfikujemy jednym wyszukaniem w słowniku
+KEY_WORDS = {x.value: x for x in TokenType}
+DATA_TYPES = {x.value: x for x in DataType}
+BOOLS = {"true": True, "false": False}
+
+_WORD_END = re.escape(SPLITTABLE + UNSPLITTABLE) + r'\s"#'
+_WORD_CHAR = f'[^{_WORD_END}]'
+# Liczba/identyfikator musi kończyć się na granicy słowa, inaczej np. 3abc byłoby INT + ID
+_BOUNDARY = f'(?!{_WORD_CHAR})'
+_DIGITS = r'\d(?:_?\d)*'
+
+# Jeden wzorzec dzielący i klasyfikujący słowa naraz - nazwa grupy (lastgroup) mówi czym jest słowo.
+# Białe znaki przed słowem są zjadane w tym samym dopasowaniu. String kończy się na pierwszym " nie poprzedzonym \
+MASTER_PATTERN = re.compile(
+    rf'\s*(?:(?P<END>\Z)'
+    rf'|(?P<COMMENT>#[^\n]*)'
+    rf'|(?P<STRING>"[^"]*(?:(?<=\\)"[^"]*)*(?<!\\)")'
+    rf'|(?P<FLOAT>(?:{_DIGITS}\.(?:{_DIGITS})?|\.{_DIGITS})(?:[eE]{_DIGITS})?{_BOUNDARY}|{_DIGITS}[eE]{_DIGITS}{_BOUNDARY})'
+    rf'|(?P<INT>{_DIGITS}{_BOUNDARY})'
+    rf'|(?P<ID>[^\W\d]\w*{_BOUNDARY})'
+    rf'|(?P<SYMBOL>[{re.escape(SPLITTABLE)}]|[{re.escape(UNSPLITTABLE)}]+)'
+    rf'|(?P<WORD>{_WORD_CHAR}+))'
+)
+
+
+# Indeks pierwszego " w kawałku nie poprzedzonego \ (previous to znak przed kawałkiem) albo -1, gdy go nie ma
+def findClosingQuote(chunk, previous):
+    index = chunk.find('"')
+    while index >= 0 and (chunk[index - 1] if index else previous) == '\\':
+        index = chunk.find('"', index + 1)
+    return index
+
+
 class Tokenizer:
 
-    def __init__(self, code):
-        self.position = 0
+    def __init__(self, code="", stream=None, chunkSize=DEFAULT_CHUNK_SIZE):
         self.code = code
-        self.splitCode = []
+        self.stream = stream
+        self.chunkSize = chunkSize
         self.tokensList = []
-
-        # jak wystąpi {()} to możesz powstawiać między spacje i semantycznie bez zmiany: {()} == { ( ) }
-        self.splittable = "(){}![]+/-*;"
-        # Tych nie można rozdzielać bez zmiany znaczenia: == [to nie to samo co ] = =
-        self.unSplittable = "<>=|&"
-
-        self.keyWords = [x.value for x in TokenType]
-        self.dataTypes = [x.value for x in DataType]
-
-    def isParsableToInt(self, string):
-        try:
-            int(string)
-        except ValueError:
-            return False
-        return True
-
-    def isParsableToFloat(self, string):
-        try:
-            float(string)
-        except ValueError:
-            return False
-        return True
-
-    def isSplittable(self, char):
-        return char in self.splittable
-
-    def isUnSplittable(self, char):
-        return char in self.unSplittable
-
-    def isSymbol(self, char):
-        return self.isUnSplittable(char) or self.isSplittable(char)
-
-    # czy dane dwa znaki występujące po sobię można rozdzielić?
-    # == -> nie
-    # a= -> tak (a= [to to samo co ] a = )
-    def canBeSplit(self, char1, char2):
-        return char1.isalnum() and self.isSymbol(char2) or \
-               char2.isalnum() and self.isSymbol(char1) or \
-               self.isSplittable(char1) and self.isSymbol(char2) or \
-               self.isSplittable(char2) and self.isSymbol(char1)
-
-    # Działa jak split(), ale dodatkowo uwzględnia Stringi w ciągu-> nie rozdzieli spacjami słów wewnątrz "...".
-    # Powinno skipowac wyeskejpowane " -> \"
-    def splitWithStrings(self):
-        result = []
-        accumulator = ""
-        position = 0
-        while position < len(self.code):
-            if self.code[position] == "\"":
-                if accumulator != "":
-                    result.append(accumulator)
-                    accumulator = ""
-                accumulator += self.code[position]
-                position += 1
-                hasSecondDelimiter = False
-                while position < len(self.code):
-                    accumulator += self.code[position]
-                    if self.code[position] == "\"":
-                        if self.code[position - 1] != "\\":
-                            result.append(accumulator)
-                            accumulator = ""
-                            hasSecondDelimiter = True
-                            break
-                    position += 1
-                if not hasSecondDelimiter:
-                    raise TokenizerError("Unfinished String")
-            elif self.code[position].isspace():
-                if accumulator != "":
-                    result.append(accumulator)
-                    accumulator = ""
+        # Pozycja w źródle: numer bieżącej linii, offset jej początku i offset początku bufora
+        self.line = 1
+        self.lineStart = 0
+        self.bufferStart = 0
+
+    # Tokenizer czytający kod kawałkami z dowolnego strumienia tekstowego (plik, stdin, StringIO).
+    # Pamięć nie zależy od rozmiaru wejścia - trzymamy tylko bieżący kawałek i niedokończone słowo.
+    @classmethod
+    def fromStream(cls, stream, chunkSize=DEFAULT_CHUNK_SIZE):
+        return cls(stream=stream, chunkSize=chunkSize)
+
+    def readChunks(self):
+        if self.stream is None:
+            yield self.code
+            return
+        while True:
+            chunk = self.stream.read(self.chunkSize)
+            if not chunk:
+                return
+            yield chunk
+
+    # Jednoprzebiegowy skaner: dzieli kod na tokeny w jednym przejściu od lewej do prawej,
+    # bez przebudowywania kodu. Słowo, które może być ucięte na końcu kawałka
+    # (identyfikator, <=, string bez zamykającego "), jest doklejane do następnego kawałka.
+    # Niedokończony string zbieramy w liście kawałków i w każdym nowym kawałku szukamy tylko zamykającego ",
+    # zamiast skanować cały string od nowa z każdym kawałkiem. Skanujemy go raz, gdy już jest zamknięty.
+    def generateTokens(self):
+        tail = ""
+        openString = []
+        for chunk in self.readChunks():
+            if openString:
+                closed = findClosingQuote(chunk, openString[-1][-1]) >= 0
+                openString.append(chunk)
+                if not closed:
+                    continue
+                code = "".join(openString)
+                openString = []
             else:
-                accumulator += self.code[position]
-            position += 1
-        if accumulator != "":
-            result.append(accumulator)
-        return result
-
-    def insertSpacesAndSplit(self):
-        index = 1
-        inString = True if self.code[0] == '"' else False
-        while index < len(self.code):
-            if self.code[index] == '"':
-                inString = not inString
-                index += 1
-            if not inString and self.canBeSplit(self.code[index - 1], self.code[index]):
-                self.code = self.code[:index] + ' ' + self.code[index:]
-                index += 1
-            if self.code[index] == '"':
-                inString = not inString
-            index += 1
-        self.splitCode = self.splitWithStrings()
+                code = tail + chunk
+            tail = yield from self.scanBuffer(code, False)
+            self.bufferStart += len(code) - len(tail)
+            if tail.lstrip().startswith('"'):
+                openString = [tail]
+        yield from self.scanBuffer("".join(openString) if openString else tail, True)
+
+    # Stringi "..." są jednym słowem, znaki z SPLITTABLE są zawsze osobnymi słowami,
+    # a ciągi znaków z UNSPLITTABLE (==, <=, &&, ...) są sklejane w jedno słowo.
+    # Komentarze (# poza stringiem) są pomijane w trakcie skanowania.
+    # Zwraca niedokończoną końcówkę bufora, jeśli isLast == False.
+    def scanBuffer(self, code, isLast):
+        match = MASTER_PATTERN.match
+        length = len(code)
+        position = 0
+        line, lineStart, bufferStart = self.line, self.lineStart, self.bufferStart
+        while position < length:
+            found = match(code, position)
+            if found is None:
+                # Jedyne, co może nie pasować, to string bez zamykającego "
+                if not isLast:
+                    self.line, self.lineStart = line, lineStart
+                    return code[position:]
+                quote = code.index('"', position)
+                if code.count('\n', position, quote):
+                    line += code.count('\n', position, quote)
+                    lineStart = bufferStart + code.rindex('\n', position, quote) + 1
+                column = bufferStart + quote - lineStart + 1
+                raise TokenizerError(f"Unfinished String at line {line}, column {column}")
+            kind = found.lastgroup
+            start = found.start(kind)
+            if code.count('\n', position, start):
+                line += code.count('\n', position, start)
+                lineStart = bufferStart + code.rindex('\n', position, start) + 1
+            end = found.end()
+            # Zamknięty string nie może się przedłużyć w następnym kawałku, więc go nie odkładamy
+            if end == length and not isLast and kind != "STRING":
+                self.line, self.lineStart = line, lineStart
+                if kind == "END":
+                    return ""
+                # Z komentarza uciętego na końcu kawałka wystarczy zapamiętać samo #
+                return "#" if kind == "COMMENT" else code[start:]
+            if kind != "COMMENT" and kind != "END":
+                word = found.group(kind)
+                column = bufferStart + start - lineStart + 1
+                token = self.classifyWord(kind, word, line, column)
+                if token is None:
+                    raise TokenizerError(f"Something is wrong in Tokenizer: {word} at line {line}, column {column}")
+                yield token
+                if kind == "STRING" and '\n' in word:
+                    line += word.count('\n')
+                    lineStart = bufferStart + code.rindex('\n', start, end) + 1
+            position = end
+        self.line, self.lineStart = line, lineStart
+        return ""
 
     def parseNewLines(self, string: str) -> str:
         return string.replace('\\n', '\n')
 
+    def classifyWord(self, kind, word, line, column):
+        if kind == "ID":
+            if word in KEY_WORDS:
+                return Token(KEY_WORDS[word], None, line, column)
+            elif word in DATA_TYPES:
+                return Token(CompoundToken.DATA_TYPE, DATA_TYPES[word], line, column)
+            elif word in BOOLS:
+                return Token(CompoundToken.BOOL, BOOLS[word], line, column)
+            return Token(CompoundToken.ID, word, line, column)
+        elif kind == "INT":
+            return Token(CompoundToken.INT, int(word), line, column)
+        elif kind == "FLOAT":
+            return Token(CompoundToken.FLOAT, float(word), line, column)
+        elif kind == "STRING":
+            return Token(CompoundToken.STRING, self.parseNewLines(word[1:-1]), line, column)
+        elif word in KEY_WORDS:
+            return Token(KEY_WORDS[word], None, line, column)
+        return None
+
     def tokenize(self):
-        self.deleteComments()
-        if len(self.code) != 0:
-            self.insertSpacesAndSplit()
-            while self.position < len(self.splitCode):
-                word = self.splitCode[self.position]
-
-                if word in self.keyWords:
-                    self.tokensList.append((TokenType(word), None))
-                elif word in self.dataTypes:
-                    self.tokensList.append((CompoundToken.DATA_TYPE, DataType(word)))
-
-                elif word == "true" or word == "false":
-                    self.tokensList.append((CompoundToken.BOOL, bool(word)))
-                elif self.isParsableToInt(word):
-                    self.tokensList.append((CompoundToken.INT, int(word)))
-                elif self.isParsableToFloat(word):
-                    self.tokensList.append((CompoundToken.FLOAT, float(word)))
-                elif "\"" in word:
-                    self.tokensList.append((CompoundToken.STRING, self.parseNewLines(word[1:-1])))
-
-                elif word.isidentifier():
-                    self.tokensList.append((CompoundToken.ID, word))
-                else:
-                    raise TokenizerError("Something is wrong in Tokenizer: "+ word)
-                self.position += 1
+        self.tokensList = list(self.generateTokens())
         return self.tokensList
 
-    def deleteComments(self):
-        commentStart = self.position
-        while commentStart < len(self.code):
-            if self.code[commentStart] == TokenType.COMMENT.value:
-                commentEnd = commentStart
-                while commentEnd < len(self.code) and self.code[commentEnd] != '\n':
-                    commentEnd += 1
-
-                if commentEnd == len(self.code):
-                    # Ends with a comment
-                    self.code = self.code[:commentStart]
-                else:
-                    self.code = self.code[:commentStart] + self.code[commentEnd:]
-            commentStart += 1
-
 
 # if __name__ == "__main__":
 #     tests = [
@@ -0,0 +1,152 @@
+"""Runners shared by the tests: every engine at every optimization level, random programs and the sgm script"""
+import io
+import os
+import random
+import unittest
+
+from sgm_lang.AstOptimizer import AstOptimizer
+from sgm_lang.AstToPythonGenerator import AstToPythonGenerator
+from sgm_lang.AstToRegisterGenerator import AstToRegisterGenerator
+from sgm_lang.Interpreter import InterpreterException
+from sgm_lang.OutputBuffer import OutputBuffer, FlushPolicy
+from sgm_lang.Parser import Parser
+from sgm_lang.Program import ExecutionContext, compileProgram
+from sgm_lang.PythonInterpreter import PythonInterpreter
+from sgm_lang.RegisterInterpreter import RegisterInterpreter
+from sgm_lang.TypeChecker import TypeChecker
+from sgm_lang.tokenizer import Tokenizer
+
+SGM = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sgm")
+
+LEVELS = (0, 1, 2)
+
+# Loop iterations a generated program may run, so that every program finishes quickly
+MAX_ITERATIONS = 4
+
+
+def ast(source: str, level: int):
+    return AstOptimizer(level).optimize(TypeChecker().check(Parser(Tokenizer(source).generateTokens()).parse()))
+
+
+def runStack(source: str, level: int) -> str:
+    return compileProgram(source, level).run()
+
+
+def runRegisters(source: str, level: int) -> str:
+    stream = io.StringIO()
+    RegisterInterpreter(AstToRegisterGenerator(ast(source, level)).generate(), OutputBuffer(stream)).run()
+    return stream.getvalue()
+
+
+def runPython(source: str, level: int) -> str:
+    stream = io.StringIO()
+    PythonInterpreter(AstToPythonGenerator(ast(source, level)).generate(), OutputBuffer(stream)).run()
+    return stream.getvalue()
+
+
+ENGINES = (runStack, runRegisters, runPython)
+
+
+def run(source: str, level: int, jitThreshold: int = None):
+    """Output of the program and the message of the error it stopped with, if any"""
+    stream = io.StringIO()
+    try:
+        output = OutputBuffer(stream, flushPolicy=FlushPolicy.EXIT)
+        ExecutionContext(compileProgram(source, level), output, jitThreshold).run()
+    except Exception as e:
+        return stream.getvalue(), str(e)
+    return stream.getvalue(), None
+
+
+class EngineTestCase(unittest.TestCase):
+    """Assertions run on every engine at every optimization level"""
+
+    def assertOutput(self, expected: str, source: str, engines=ENGINES, levels=LEVELS):
+        for engine in engines:
+            for level in levels:
+                with self.subTest(engine=engine.__name__, level=level):
+                    self.assertEqual(expected, engine(source, level))
+
+    def assertSameOutput(self, source: str, engines=ENGINES, levels=LEVELS):
+        """Output is the same as of the stack engine without optimizations"""
+        self.assertOutput(runStack(source, 0), source, engines, levels)
+
+    def assertFails(self, message: str, source: str, engines=ENGINES, levels=LEVELS):
+        for engine in engines:
+            for level in levels:
+                with self.subTest(engine=engine.__name__, level=level):
+                    with self.assertRaises(InterpreterException) as raised:
+                        engine(source, level)
+                    self.assertIn(message, str(raised.exception))
+
+
+class ProgramGenerator:
+    """Random type correct programs with nested loops, conditions and variables of every numeric and bool type"""
+
+    def __init__(self, seed: int):
+        self.random = random.Random(seed)
+        self.names = 0
+
+    def program(self) -> str:
+        return self.block([], 0)
+
+    def name(self, prefix: str) -> str:
+        self.names += 1
+        return f"{prefix}{self.names}"
+
+    def expression(self, variables, kind: str, depth: int = 0) -> str:
+        choice = self.random.random()
+        usable = [name for name, varKind in variables if varKind == kind or (kind == "float" and varKind == "int")]
+        if depth > 2 or choice < 0.3:
+            if usable and self.random.random() < 0.7:
+                return self.random.choice(usable)
+            if kind == "bool":
+                return self.random.choice(["True", "False"])
+            return str(self.random.randint(0, 9)) + (".5" if kind == "float" and self.random.random() < 0.5 else "")
+        if kind == "bool":
+            if choice < 0.55:
+                operator = self.random.choice(["<", ">", "<=", ">=", "=="])
+                return f"({self.expression(variables, 'int', depth + 1)} {operator} " \
+                       f"{self.expression(variables, 'int', depth + 1)})"
+            if choice < 0.7:
+                return f"!({self.expression(variables, 'bool', depth + 1)})"
+            operator = self.random.choice(["&&", "||"])
+            return f"({self.expression(variables, 'bool', depth + 1)} {operator} " \
+                   f"{self.expression(variables, 'bool', depth + 1)})"
+        operator = self.random.choice(["+", "-", "*", "%"] + (["/"] if kind == "float" else []))
+        if operator == "%":
+            return f"({self.expression(variables, kind, depth + 1)} % {self.random.randint(1, 5)})"
+        return f"({self.expression(variables, kind, depth + 1)} {operator} {self.expression(variables, kind, depth + 1)})"
+
+    def block(self, variables, depth: int) -> str:
+        statements = []
+        for _ in range(self.random.randint(1, 4)):
+            choice = self.random.random()
+            assignable = [(name, kind) for name, kind in variables if not name.startswith("c")]
+            if choice < 0.25:
+                kind = self.random.choice(["int", "int", "float", "bool"])
+                declared = {"int": "mrINTernational", "float": "boatWhichFloat", "bool": "bool"}[kind]
+                name = self.name(kind[0])
+                statements.append(f"{declared} {name} = {self.expression(variables, kind)};")
+                variables = variables + [(name, kind)]
+            elif choice < 0.45 and assignable:
+                name, kind = self.random.choice(assignable)
+                value = self.expression(variables, kind)
+                statements.append(f"{name} = {value}{' % 1000' if kind != 'bool' else ''};")
+            elif choice < 0.6:
+                kind = self.random.choice(["int", "float", "bool"])
+                statements.append(f"showMeYourGoods({self.expression(variables, kind)}); showMeYourGoods(\" \");")
+            elif choice < 0.75 and depth < 3:
+                statements.append(f"doItIf({self.expression(variables, 'bool')}) {{ "
+                                  f"{self.block(variables, depth + 1)} }}")
+            elif depth < 3:
+                counter = self.name("c")
+                condition = f"{counter} < {self.random.randint(0, MAX_ITERATIONS)}"
+                if self.random.random() < 0.5:
+                    condition = f"({condition}) {self.random.choice(['&&', '||'])} {self.expression(variables, 'bool')}"
+                    condition = f"({condition}) && ({counter} < {MAX_ITERATIONS})"
+                statements.append(f"mrINTernational {counter} = 0; youSpinMeRound({condition}) {{ "
+                                  f"{counter} = {counter} + 1; {self.block(variables + [(counter, 'int')], depth + 1)} }}")
+                variables = variables + [(counter, "int")]
+        statements.append("showMeYourGoods(\".\");")
+        return " ".join(statements)
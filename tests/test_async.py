@@ -0,0 +1,111 @@
+import asyncio
+import io
+import unittest
+
+from sgm_lang.Interpreter import InterpreterException
+from sgm_lang.OutputBuffer import FlushPolicy, OutputBuffer
+from sgm_lang.Program import BudgetExceeded, ContextPool, ExecutionContext, compileProgram
+
+ENDLESS = 'mrINTernational i = 0; showMeYourGoods("start"); youSpinMeRound(True) { i = i + 1; }'
+
+
+class RunAsyncTest(unittest.TestCase):
+
+    def testCompletes(self):
+        program = compileProgram('mrINTernational i = 0; youSpinMeRound(i < 1000) { i = i + 1; } showMeYourGoods(i);', 1)
+        self.assertEqual("1000", asyncio.run(program.runAsync(sliceSize=7)))
+        self.assertEqual({"i": 1000}, asyncio.run(ExecutionContext(program).runAsync(maxInstructions=100000)))
+
+    def testInstructionBudget(self):
+        context = ExecutionContext(compileProgram(ENDLESS))
+        with self.assertRaises(BudgetExceeded) as raised:
+            asyncio.run(context.runAsync(maxInstructions=5000, sliceSize=100))
+        self.assertIn("Instruction budget of 5000 exceeded", str(raised.exception))
+        self.assertTrue(str(raised.exception).startswith("line 1: "))
+        # Output printed before the budget ran out is kept
+        self.assertEqual("start", context.printed())
+
+    def testTimeout(self):
+        with self.assertRaises(BudgetExceeded) as raised:
+            asyncio.run(compileProgram(ENDLESS).runAsync(timeout=0.05))
+        self.assertIn("Time budget of 0.05 seconds exceeded", str(raised.exception))
+        self.assertIsInstance(raised.exception, InterpreterException)
+
+    def testSynchronousBudget(self):
+        context = ExecutionContext(compileProgram(ENDLESS))
+        with self.assertRaises(BudgetExceeded):
+            context.run(maxInstructions=5000)
+        with self.assertRaises(BudgetExceeded):
+            ContextPool(compileProgram(ENDLESS)).run(timeout=0.05)
+        self.assertEqual({"i": 3}, ExecutionContext(compileProgram('mrINTernational i = 3;')).run(maxInstructions=1000))
+
+    def testOutputBeforeBudgetExceeded(self):
+        with self.assertRaises(BudgetExceeded) as raised:
+            asyncio.run(compileProgram(ENDLESS).runAsync(maxInstructions=1000))
+        self.assertEqual("start", raised.exception.printed)
+        stream = io.StringIO()
+        with self.assertRaises(BudgetExceeded):
+            asyncio.run(compileProgram(ENDLESS).runAsync(output=OutputBuffer(stream, flushPolicy=FlushPolicy.EXIT),
+                                                         maxInstructions=1000))
+        self.assertEqual("start", stream.getvalue())
+
+    def testRuntimeError(self):
+        with self.assertRaises(InterpreterException) as raised:
+            asyncio.run(compileProgram('mrINTernational z = 0; showMeYourGoods(1 % z);').runAsync())
+        self.assertNotIsInstance(raised.exception, BudgetExceeded)
+
+    def testNeedsContextWithoutJit(self):
+        context = ExecutionContext(compileProgram(ENDLESS), jitThreshold=10)
+        with self.assertRaises(InterpreterException):
+            asyncio.run(context.runAsync(maxInstructions=10))
+
+    def testOtherTasksRun(self):
+        async def main():
+            ticks = []
+
+            async def ticker():
+                while True:
+                    ticks.append(None)
+                    await asyncio.sleep(0)
+
+            task = asyncio.create_task(ticker())
+            with self.assertRaises(BudgetExceeded):
+                await compileProgram(ENDLESS).runAsync(maxInstructions=10000, sliceSize=100)
+            task.cancel()
+            return len(ticks)
+
+        self.assertGreater(asyncio.run(main()), 10)
+
+    def testCancel(self):
+        async def main():
+            pool = ContextPool(compileProgram(ENDLESS))
+            task = asyncio.create_task(pool.runAsync(sliceSize=100))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return pool
+
+        pool = asyncio.run(main())
+        # The context is given back to the pool and can run again
+        self.assertEqual(1, len(pool.idle))
+        with self.assertRaises(BudgetExceeded):
+            asyncio.run(pool.runAsync(maxInstructions=1000))
+
+    def testOutputBeforeCancel(self):
+        stream = io.StringIO()
+
+        async def main():
+            output = OutputBuffer(stream, flushPolicy=FlushPolicy.EXIT)
+            task = asyncio.create_task(compileProgram(ENDLESS).runAsync(output=output, sliceSize=100))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(main())
+        self.assertEqual("start", stream.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
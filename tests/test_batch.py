@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from sgm_lang.BatchRunner import BatchRunner, COMPILE_ERROR, OK, OUTPUT_ERROR, RUNTIME_ERROR, findScripts
+from sgm_lang.BytecodeCache import BytecodeCache
+from helpers import SGM
+
+SCRIPTS = {
+    "hello.sgm": 'showMeYourGoods("hello");',
+    "broken.sgm": 'showMeYourGoods(;',
+    os.path.join("sub", "divide.sgm"): 'mrINTernational z = 0; showMeYourGoods("a"); showMeYourGoods(1 / z);',
+    os.path.join("sub", "loop.sgm"): 'mrINTernational i = 0; youSpinMeRound(i < 100) { i = i + 1; } showMeYourGoods(i);',
+    "notes.txt": 'not a script',
+}
+
+
+class BatchRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.scripts = os.path.join(self.directory.name, "scripts")
+        self.outputs = os.path.join(self.directory.name, "outputs")
+        for name, source in SCRIPTS.items():
+            path = os.path.join(self.scripts, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as script:
+                script.write(source)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def results(self, **options) -> dict:
+        """relative path -> ScriptResult"""
+        runner = BatchRunner(2, **options)
+        return {os.path.relpath(result.path, self.scripts): result for result in runner.run(self.scripts)}
+
+    def testFindsScripts(self):
+        relative = [os.path.relpath(path, self.scripts) for path in findScripts(self.scripts)]
+        self.assertEqual(["broken.sgm", "hello.sgm", os.path.join("sub", "divide.sgm"), os.path.join("sub", "loop.sgm")],
+                         relative)
+        self.assertRaises(NotADirectoryError, findScripts, os.path.join(self.scripts, "hello.sgm"))
+
+    def testStatuses(self):
+        for level in (0, 2):
+            with self.subTest(level=level):
+                results = self.results(level=level, jitThreshold=10)
+                self.assertEqual({"hello.sgm": (OK, "hello"), "broken.sgm": (COMPILE_ERROR, None),
+                                  os.path.join("sub", "divide.sgm"): (RUNTIME_ERROR, "a"),
+                                  os.path.join("sub", "loop.sgm"): (OK, "100")},
+                                 {name: (result.status, result.output) for name, result in results.items()})
+                self.assertIn("division by zero", results[os.path.join("sub", "divide.sgm")].error)
+                self.assertIn("Invalid syntax", results["broken.sgm"].error)
+
+    def testCache(self):
+        cache = BytecodeCache(os.path.join(self.directory.name, "cache"))
+        first = self.results(level=1, cache=cache)
+        self.assertEqual({name: result.output for name, result in first.items()},
+                         {name: result.output for name, result in self.results(level=1, cache=cache).items()})
+
+    def testOutputFiles(self):
+        results = self.results(outputDir=self.outputs)
+        self.assertTrue(all(result.output is None for result in results.values()))
+        files = {}
+        for root, _, names in os.walk(self.outputs):
+            for name in names:
+                with open(os.path.join(root, name)) as output:
+                    files[os.path.relpath(os.path.join(root, name), self.outputs)] = output.read()
+        self.assertEqual({"hello.out": "hello", os.path.join("sub", "divide.out"): "a",
+                          os.path.join("sub", "loop.out"): "100"}, files)
+
+    def testUnwritableOutputFile(self):
+        # A directory where the output file should be
+        os.makedirs(os.path.join(self.outputs, "hello.out"))
+        results = self.results(outputDir=self.outputs)
+        self.assertEqual(OUTPUT_ERROR, results["hello.sgm"].status)
+        self.assertIn("hello.out", results["hello.sgm"].error)
+        self.assertEqual(OK, results[os.path.join("sub", "loop.sgm")].status)
+
+    def testCommand(self):
+        os.makedirs(os.path.join(self.outputs, "hello.out"))
+        command = [sys.executable, SGM, "run-batch", self.scripts, "-j", "2", "--no-cache", "--output-dir", self.outputs]
+        finished = subprocess.run(command, capture_output=True, text=True)
+        self.assertEqual(1, finished.returncode)
+        self.assertIn("4 scripts, 1 ok, 3 failed", finished.stderr)
+        self.assertRegex(finished.stderr, r"output error +\S*hello\.sgm: ")
+
+
+if __name__ == "__main__":
+    unittest.main()
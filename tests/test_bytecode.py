@@ -0,0 +1,111 @@
+import unittest
+
+from sgm_lang.Interpreter import BytecodeInterpreter, InterpreterException
+from sgm_lang.Opcode import Opcode, Operation, Parameter, ParameterType
+from sgm_lang.PackedBytecode import INSTRUCTION_SIZES, OPCODES, PackedProgram, constantKey
+from sgm_lang.Program import Program, buildAst, generateBytecode, tokenize
+from helpers import EngineTestCase
+
+# At -O1 0.0 * (0 - 1) is folded to the constant -0.0, which must stay apart from 0.0
+CONSTANTS_AND_JUMPS = 'boatWhichFloat z = 0.0 * (0 - 1); stringiBoi s = "a"; mrINTernational i = 0; ' \
+                      'youSpinMeRound(i < 3) { s = s + "b"; i = i + 1; } ' \
+                      'showMeYourGoods(z); showMeYourGoods(0.0); showMeYourGoods(s);'
+SKIPPED_DECLARATION = 'bool b = False; doItIf(b) { mrINTernational x = 1; }\nshowMeYourGoods(x);'
+
+
+def packed(source: str, level: int = 1) -> PackedProgram:
+    return PackedProgram.fromOperations(*generateBytecode(buildAst(tokenize(source), level), level))
+
+
+def instructionOffsets(program: PackedProgram) -> list:
+    offsets = []
+    ip = 0
+    while ip < len(program.code):
+        offsets.append(ip)
+        ip += INSTRUCTION_SIZES[OPCODES[program.code[ip]]]
+    return offsets
+
+
+class PackedProgramTest(unittest.TestCase):
+
+    def testRoundTrip(self):
+        program = packed(CONSTANTS_AND_JUMPS)
+        loaded = PackedProgram.fromBytes(program.toBytes())
+        self.assertEqual(list(program.code), list(loaded.code))
+        self.assertEqual([constantKey(value) for value in program.constants],
+                         [constantKey(value) for value in loaded.constants])
+        self.assertEqual(program.names, loaded.names)
+        self.assertEqual(list(program.lines), list(loaded.lines))
+        self.assertEqual(program.slotNames, loaded.slotNames)
+        self.assertEqual("-0.00.0abbb", Program(loaded).run())
+
+    def testSignedZerosHaveTheirOwnConstants(self):
+        keys = [constantKey(value) for value in packed(CONSTANTS_AND_JUMPS).constants]
+        self.assertIn(constantKey(-0.0), keys)
+        self.assertIn(constantKey(0.0), keys)
+
+    def testJumpsAreAbsoluteOffsets(self):
+        program = PackedProgram.fromOperations([
+            Operation(Opcode.JMP, [Parameter(ParameterType.RELATIVE, 1)]),
+            Operation(Opcode.PRINTC, [Parameter(ParameterType.IMMEDIATE, "skipped")]),
+            Operation(Opcode.PRINTC, [Parameter(ParameterType.IMMEDIATE, "printed")]),
+        ])
+        self.assertEqual(INSTRUCTION_SIZES[Opcode.JMP] + INSTRUCTION_SIZES[Opcode.PRINTC], program.code[1])
+        self.assertEqual("printed", Program(program).run())
+
+    def testJumpOutOfRange(self):
+        with self.assertRaises(ValueError):
+            PackedProgram.fromOperations([Operation(Opcode.JMP, [Parameter(ParameterType.RELATIVE, 5)])])
+
+
+class DispatchTest(unittest.TestCase):
+    """Every instruction is bound to a closure returning the offset of the next one"""
+
+    def testClosureAtEveryInstruction(self):
+        program = packed(CONSTANTS_AND_JUMPS)
+        interpreter = BytecodeInterpreter(program)
+        self.assertEqual(instructionOffsets(program),
+                         [offset for offset, instruction in enumerate(interpreter.instructions) if instruction])
+
+    def testStepsOneInstruction(self):
+        program = packed('mrINTernational a = 2; showMeYourGoods(a);', 0)
+        interpreter = BytecodeInterpreter(program)
+        interpreter.processInstruction()
+        self.assertEqual(INSTRUCTION_SIZES[OPCODES[program.code[0]]], interpreter.ip)
+        self.assertEqual([2], interpreter.stack)
+
+    def testInvalidOpcode(self):
+        program = packed('showMeYourGoods(1);', 0)
+        program.code[0] = 1000
+        with self.assertRaises(InterpreterException) as raised:
+            BytecodeInterpreter(program)
+        self.assertIn("Invalid operation 1000", str(raised.exception))
+
+
+class SlotTest(EngineTestCase):
+    """Variables are resolved to numbered slots at compile time"""
+
+    def testVariablesUseSlots(self):
+        program = packed(CONSTANTS_AND_JUMPS, 0)
+        opcodes = [OPCODES[program.code[offset]] for offset in instructionOffsets(program)]
+        self.assertEqual(["z", "s", "i"], program.slotNames)
+        self.assertIn(Opcode.LOAD_SLOT, opcodes)
+        self.assertIn(Opcode.STORE_SLOT, opcodes)
+        self.assertFalse({Opcode.LOAD, Opcode.STORE} & set(opcodes))
+        self.assertEqual([], program.names)
+
+    def testDeclarationInSkippedBlock(self):
+        self.assertFails("line 2: Variable x is not defined", SKIPPED_DECLARATION)
+
+    def testDeclarationInBlockThatRan(self):
+        self.assertOutput("1", SKIPPED_DECLARATION.replace("False", "True"))
+
+    def testSlotsAfterSkippedBlock(self):
+        source = 'bool b = False; doItIf(b) { mrINTernational x = 1; } mrINTernational y = 2; ' \
+                 'doItIf(!b) { mrINTernational w = 3; showMeYourGoods(w); } showMeYourGoods(y);'
+        self.assertEqual(["b", "x", "y", "w"], packed(source, 0).slotNames)
+        self.assertOutput("32", source)
+
+
+if __name__ == "__main__":
+    unittest.main()
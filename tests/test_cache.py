@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from sgm_lang.BytecodeCache import BytecodeCache
+from sgm_lang.Program import loadProgram
+
+
+class BytecodeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "script.sgm")
+        self.cache = BytecodeCache()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, source: str):
+        with open(self.path, 'w') as script:
+            script.write(source)
+
+    def testCachedProgramIsReused(self):
+        self.write('showMeYourGoods("a");')
+        self.assertEqual("a", loadProgram(self.path, 1, self.cache).run())
+        key = self.cache.sourceKey(b'showMeYourGoods("a");', "O1")
+        self.assertIsNotNone(self.cache.load(self.path, key, "O1"))
+        self.assertEqual("a", loadProgram(self.path, 1, self.cache).run())
+
+    def testChangedSourceIsCompiledAgain(self):
+        self.write('showMeYourGoods("a");')
+        loadProgram(self.path, 0, self.cache)
+        self.write('showMeYourGoods("b");')
+        self.assertEqual("b", loadProgram(self.path, 0, self.cache).run())
+        self.assertIsNotNone(self.cache.load(self.path, self.cache.sourceKey(b'showMeYourGoods("b");', "O0"), "O0"))
+
+    def testEveryLevelHasItsOwnEntry(self):
+        self.write('showMeYourGoods(1 + 2);')
+        cache = RecordingCache()
+        for level in (0, 1, 2, 0, 1, 2):
+            self.assertEqual("3", loadProgram(self.path, level, cache).run())
+        self.assertEqual([False] * 3 + [True] * 3, cache.hits)
+
+
+class RecordingCache(BytecodeCache):
+    """Records whether every load found a cached program"""
+
+    def __init__(self):
+        super().__init__()
+        self.hits = []
+
+    def load(self, sourcePath: str, key: str, variant: str = ""):
+        program = super().load(sourcePath, key, variant)
+        self.hits.append(program is not None)
+        return program
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,20 @@
+import unittest
+
+from helpers import EngineTestCase
+
+SIGNED_ZEROS = 'boatWhichFloat x = 0.0 * (0 - 1); showMeYourGoods(x); showMeYourGoods(" "); showMeYourGoods(0.0);'
+BOOLS_AND_INTS = 'mrINTernational x = 1; bool b = True; showMeYourGoods(x); showMeYourGoods(b);'
+
+
+class ConstantPoolTest(EngineTestCase):
+    """Constants that compare equal but print differently must not share an entry of the constant pool"""
+
+    def testSignedZeros(self):
+        self.assertOutput("-0.0 0.0", SIGNED_ZEROS)
+
+    def testBoolsAndInts(self):
+        self.assertOutput("1True", BOOLS_AND_INTS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import threading
+import unittest
+
+from sgm_lang.Interpreter import InterpreterException
+from sgm_lang.Program import ContextPool, ExecutionContext, compileProgram
+
+SUM = 'mrINTernational i = 0; youSpinMeRound(i < n) { s = s + i; i = i + 1; } showMeYourGoods(s);'
+
+
+class ExecutionContextTest(unittest.TestCase):
+
+    def setUp(self):
+        self.program = compileProgram(SUM, 1, {"n": int, "s": float})
+
+    def testReuse(self):
+        context = ExecutionContext(self.program)
+        self.assertEqual({"n": 4, "s": 6.5, "i": 4}, context.run({"n": 4, "s": 0.5}))
+        self.assertEqual("6.5", context.printed())
+        # Variables and printed values of the previous run are cleared
+        self.assertEqual({"n": 0, "s": 1.0, "i": 0}, context.run({"n": 0, "s": 1.0}))
+        self.assertEqual("1.0", context.printed())
+
+    def testResetAfterError(self):
+        context = ExecutionContext(compileProgram('showMeYourGoods("a"); showMeYourGoods(1 % z);', inputs={"z": int}))
+        self.assertRaises(InterpreterException, context.run, {"z": 0})
+        self.assertEqual({"z": 2}, context.run({"z": 2}))
+        self.assertEqual("a1", context.printed())
+
+    def testUndeclaredVariablesAreNotReturned(self):
+        context = ExecutionContext(compileProgram('doItIf(False) { mrINTernational x = 1; } showMeYourGoods(1);'))
+        self.assertEqual({}, context.run())
+
+    def testIntInputOfFloat(self):
+        variables = ExecutionContext(self.program).run({"n": 1, "s": 2})
+        self.assertEqual(float, type(variables["s"]))
+
+    def testInputErrors(self):
+        context = ExecutionContext(self.program)
+        for inputs, message in (({"n": 1}, "Input s was not given"),
+                                ({"n": 1, "s": 0.0, "x": 1}, "Program has no input x"),
+                                ({"n": 1.5, "s": 0.0}, "Input n has to be mrINTernational, got float"),
+                                ({"n": 1, "s": "0"}, "Input s has to be boatWhichFloat, got str")):
+            with self.subTest(inputs=inputs):
+                with self.assertRaises(InterpreterException) as raised:
+                    context.run(inputs)
+                self.assertEqual(message, str(raised.exception))
+
+    def testJit(self):
+        context = ExecutionContext(self.program, jitThreshold=1)
+        for n in (10, 20):
+            self.assertEqual(n * (n - 1) / 2, context.run({"n": n, "s": 0.0})["s"])
+
+
+class ContextPoolTest(unittest.TestCase):
+
+    def testConcurrentRuns(self):
+        pool = ContextPool(compileProgram(SUM, 1, {"n": int, "s": float}))
+        results = {}
+
+        def run(n):
+            results[n] = pool.run({"n": n, "s": 0.0})["s"]
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual({n: n * (n - 1) / 2 for n in range(20)}, results)
+        self.assertLessEqual(len(pool.idle), 20)
+
+    def testContextIsReturned(self):
+        pool = ContextPool(compileProgram('showMeYourGoods(1 % z);', inputs={"z": int}))
+        self.assertRaises(InterpreterException, pool.run, {"z": 0})
+        self.assertEqual(1, len(pool.idle))
+        with pool.context() as context:
+            self.assertEqual([], pool.idle)
+            self.assertEqual({"z": 2}, context.run({"z": 2}))
+        self.assertEqual([context], pool.idle)
+
+
+if __name__ == "__main__":
+    unittest.main()
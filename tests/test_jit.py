@@ -0,0 +1,74 @@
+import subprocess
+import sys
+import unittest
+
+from helpers import SGM, ProgramGenerator, run
+
+NESTED_LOOPS = """
+mrINTernational n = 0;
+bool v0 = False;
+mrINTernational c1 = 0;
+youSpinMeRound(c1 < 3) {
+  mrINTernational c2 = 0;
+  youSpinMeRound(c2 < 3) {
+    mrINTernational c4 = 0;
+    youSpinMeRound((c4 < 2) && v0) {
+      n = n + 1;
+      c4 = c4 + 1;
+    }
+    c2 = c2 + 1;
+  }
+  v0 = True;
+  c1 = c1 + 1;
+}
+showMeYourGoods(n);
+"""
+
+
+class JitTest(unittest.TestCase):
+    """Programs have to behave the same interpreted and with loops compiled by the tracing JIT"""
+
+    THRESHOLDS = (1, 2, 3)
+
+    def assertSameWithJit(self, source: str, level: int = 0):
+        expected = run(source, level)
+        for threshold in self.THRESHOLDS:
+            with self.subTest(threshold=threshold, level=level):
+                self.assertEqual(expected, run(source, level, threshold))
+
+    def testNestedLoopCompiledAfterOuterTrace(self):
+        # The middle loop was recorded while the inner one was still interpreted
+        self.assertEqual(("12", None), run(NESTED_LOOPS, 0))
+        self.assertSameWithJit(NESTED_LOOPS)
+
+    def testRandomPrograms(self):
+        for seed in range(300):
+            source = ProgramGenerator(seed).program()
+            with self.subTest(seed=seed, source=source):
+                self.assertSameWithJit(source, seed % 3)
+
+
+
+class JitThresholdOptionTest(unittest.TestCase):
+    """sgm rejects --jit-threshold values and engines with which no loop would be compiled"""
+
+    def error(self, *arguments) -> str:
+        finished = subprocess.run([sys.executable, SGM, *arguments], input='showMeYourGoods(1);',
+                                  capture_output=True, text=True)
+        self.assertEqual(2, finished.returncode)
+        return finished.stderr
+
+    def testThresholdBelowOne(self):
+        for threshold in ("0", "-5"):
+            with self.subTest(threshold=threshold):
+                self.assertIn("expected a number of at least 1", self.error("--jit-threshold", threshold))
+
+    def testOtherEngines(self):
+        for engine in ("register", "pyjit"):
+            with self.subTest(engine=engine):
+                self.assertIn("--jit-threshold is not supported",
+                              self.error("--jit-threshold", "5", "--engine", engine))
+
+
+if __name__ == "__main__":
+    unittest.main()
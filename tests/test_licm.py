@@ -0,0 +1,49 @@
+import unittest
+
+from sgm_lang.Parser import Assign, While
+from helpers import EngineTestCase, ast
+
+LOOP = 'mrINTernational n = 5; mrINTernational z = 0; mrINTernational i = 0; mrINTernational s = 0; ' \
+       'youSpinMeRound(i < n + 1) { doItIf(i > 5) { s = s + n % z; } s = s + n * 2; i = i + 1; } ' \
+       'showMeYourGoods(s);'
+
+
+def hoisted(source: str, level: int = 1) -> list:
+    """Expressions of the temporaries declared right before the first loop"""
+    statements = ast(source, level).children
+    loop = next(index for index, node in enumerate(statements) if node.__class__ == While)
+    return [str(node.right) for node in statements[:loop]
+            if node.__class__ == Assign and node.left.name.startswith("$licm")]
+
+
+class LoopInvariantCodeMotionTest(EngineTestCase):
+
+    def testHoistsInvariants(self):
+        expressions = hoisted(LOOP)
+        self.assertEqual(2, len(expressions))
+        self.assertTrue(any("ADD" in expression for expression in expressions))
+        self.assertTrue(any("MUL" in expression for expression in expressions))
+        self.assertOutput("60", LOOP)
+
+    def testNotRunAtLevelZero(self):
+        self.assertEqual([], hoisted(LOOP, 0))
+
+    def testKeepsFailingExpressionsInTheLoop(self):
+        # n % z is only computed if i > 5, which never happens
+        self.assertFalse(any("MOD" in expression for expression in hoisted(LOOP)))
+
+    def testLoopThatNeverRuns(self):
+        source = 'mrINTernational n = 5; mrINTernational z = 0; mrINTernational s = 0; ' \
+                 'youSpinMeRound(s > 0) { s = s + n % z; s = s - 1; } showMeYourGoods(s);'
+        self.assertOutput("0", source)
+
+    def testNestedLoops(self):
+        source = 'mrINTernational n = 3; mrINTernational i = 0; mrINTernational s = 0; ' \
+                 'youSpinMeRound(i < n) { mrINTernational j = 0; ' \
+                 'youSpinMeRound(j < n) { s = s + n * n; j = j + 1; } i = i + 1; } showMeYourGoods(s);'
+        self.assertTrue(any("MUL" in expression for expression in hoisted(source)))
+        self.assertOutput("81", source)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from sgm_lang.Parser import Num, Var, If, While
+from helpers import EngineTestCase, ProgramGenerator, ast, run, runStack
+
+
+class AstOptimizerTest(EngineTestCase):
+
+    def printed(self, source: str, level: int):
+        """Expression of the last showMeYourGoods of the optimized program"""
+        return ast(source, level).children[-1].value
+
+    def testFoldsConstants(self):
+        folded = self.printed('showMeYourGoods(2 * 3 + 1);', 1)
+        self.assertEqual((Num, 7), (folded.__class__, folded.value))
+        folded = self.printed('showMeYourGoods("ab" + "c");', 1)
+        self.assertEqual("abc", folded.value)
+
+    def testLeavesFailingOperationsToRuntime(self):
+        self.assertNotEqual(Num, self.printed('showMeYourGoods(1 / 0);', 1).__class__)
+
+    def testRemovesConstantConditions(self):
+        statements = ast('doItIf(1 < 2) { showMeYourGoods(1); } youSpinMeRound(False) { showMeYourGoods(2); }', 1)
+        self.assertEqual([], [node for node in statements.children if node.__class__ in (If, While)])
+        self.assertEqual(1, len(statements.children))
+
+    def testRemovesIdentitiesAtLevelTwo(self):
+        source = 'mrINTernational x = 5; showMeYourGoods(x * 1 + 0);'
+        self.assertNotEqual(Var, self.printed(source, 1).__class__)
+        self.assertEqual(Var, self.printed(source, 2).__class__)
+
+    def testKeepsAddingZeroToFloats(self):
+        # x + 0 turns -0.0 into 0.0
+        source = 'boatWhichFloat x = 0.0 * (0 - 1); showMeYourGoods(x + 0);'
+        self.assertEqual("0.0", runStack(source, 2))
+
+    def testDivisionOfFloatVariableByOne(self):
+        # The int is converted when it is assigned, so x / 1 -> x keeps printing a float
+        source = 'boatWhichFloat x = 1; showMeYourGoods(x / 1);'
+        self.assertOutput("1.0", source)
+
+    def testRandomProgramsAtEveryLevel(self):
+        for seed in range(200):
+            source = ProgramGenerator(seed).program()
+            with self.subTest(seed=seed, source=source):
+                expected = run(source, 0)
+                self.assertEqual(expected, run(source, 1))
+                self.assertEqual(expected, run(source, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
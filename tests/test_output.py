@@ -0,0 +1,85 @@
+import unittest
+
+from sgm_lang.AstToPythonGenerator import AstToPythonGenerator
+from sgm_lang.AstToRegisterGenerator import AstToRegisterGenerator
+from sgm_lang.Interpreter import InterpreterException
+from sgm_lang.OutputBuffer import FlushPolicy, OutputBuffer
+from sgm_lang.Program import compileProgram
+from sgm_lang.PythonInterpreter import PythonInterpreter
+from sgm_lang.RegisterInterpreter import RegisterInterpreter
+from helpers import ast
+
+DIVISION_BY_ZERO = 'showMeYourGoods("before\\n"); mrINTernational z = 0; showMeYourGoods(1 / z);'
+
+
+class FakeStream:
+    """Records every write and flush"""
+
+    def __init__(self):
+        self.writes = []
+        self.flushes = 0
+
+    def write(self, text: str):
+        self.writes.append(text)
+
+    def flush(self):
+        self.flushes += 1
+
+
+class OutputBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = FakeStream()
+
+    def testExitWritesOnlyWhenFlushed(self):
+        output = OutputBuffer(self.stream, bufferSize=2, flushPolicy=FlushPolicy.EXIT)
+        for value in ("a\n", 1, True, "long text"):
+            output.write(value)
+        self.assertEqual([], self.stream.writes)
+        output.flush()
+        self.assertEqual(["a\n1Truelong text"], self.stream.writes)
+
+    def testNewlineFlushesEveryLine(self):
+        output = OutputBuffer(self.stream, flushPolicy=FlushPolicy.NEWLINE)
+        output.write("a")
+        output.write(1)
+        self.assertEqual([], self.stream.writes)
+        output.write("\n")
+        output.write("b\nc")
+        self.assertEqual(["a1\n", "b\nc"], self.stream.writes)
+
+    def testSizeFlushesOnceBufferIsFull(self):
+        output = OutputBuffer(self.stream, bufferSize=4, flushPolicy=FlushPolicy.SIZE)
+        output.write("ab\n")
+        self.assertEqual([], self.stream.writes)
+        output.write("c")
+        self.assertEqual(["ab\nc"], self.stream.writes)
+        output.write("d")
+        self.assertEqual(["ab\nc"], self.stream.writes)
+
+    def testSizeCountsBytes(self):
+        output = OutputBuffer(self.stream, bufferSize=4, flushPolicy=FlushPolicy.SIZE)
+        output.write("żó")
+        self.assertEqual(["żó"], self.stream.writes)
+
+    def testOutputBeforeRuntimeError(self):
+        def stack(output):
+            compileProgram(DIVISION_BY_ZERO).run(output=output)
+
+        def registers(output):
+            RegisterInterpreter(AstToRegisterGenerator(ast(DIVISION_BY_ZERO, 0)).generate(), output).run()
+
+        def python(output):
+            PythonInterpreter(AstToPythonGenerator(ast(DIVISION_BY_ZERO, 0)).generate(), output).run()
+
+        for engine in (stack, registers, python):
+            for policy in FlushPolicy:
+                with self.subTest(engine=engine.__name__, policy=policy):
+                    stream = FakeStream()
+                    with self.assertRaises(InterpreterException):
+                        engine(OutputBuffer(stream, flushPolicy=policy))
+                    self.assertEqual("before\n", "".join(stream.writes))
+
+
+if __name__ == "__main__":
+    unittest.main()
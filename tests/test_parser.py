@@ -0,0 +1,71 @@
+import unittest
+
+from sgm_lang.Parser import BinOp, LogicOp
+from helpers import EngineTestCase, ast, runRegisters, runStack
+
+BOOLS = 'bool t = True; bool f = False; '
+DEPTH = 5000  # even
+TERMS = 10000
+
+
+def shape(node) -> str:
+    """Expression with every operation in parentheses, variables by name"""
+    if node.__class__ == LogicOp:
+        return f"!{shape(node.right)}"
+    if node.__class__ == BinOp:
+        return f"({shape(node.left)} {node.op.type.value} {shape(node.right)})"
+    return getattr(node, "name", None) or str(node)
+
+
+class PrecedenceTest(EngineTestCase):
+    """Binary operators bind according to BINARY_PRECEDENCE and are left associative, ! binds tightest"""
+
+    def assertParsed(self, expected: str, declarations: str, expression: str):
+        self.assertEqual(expected, shape(ast(f"{declarations}showMeYourGoods({expression});", 0).children[-1].value))
+
+    def testModuloBindsLikeMultiplication(self):
+        self.assertParsed("(1 + (2 % 3))", "", "1 + 2 % 3")
+        self.assertOutput("3", 'showMeYourGoods(1 + 2 % 3);')
+
+    def testLeftAssociative(self):
+        self.assertParsed("((10 - 3) - 2)", "", "10 - 3 - 2")
+        self.assertOutput("5", 'showMeYourGoods(10 - 3 - 2);')
+        self.assertParsed("((16 / 4) / 2)", "", "16 / 4 / 2")
+        self.assertOutput("2.0", 'showMeYourGoods(16 / 4 / 2);')
+
+    def testAndBindsTighterThanOr(self):
+        self.assertParsed("(t || (f && f))", BOOLS, "t || f && f")
+        self.assertOutput("True", BOOLS + 'showMeYourGoods(t || f && f);')
+
+    def testNotAppliesToItsOperand(self):
+        self.assertParsed("(!t && f)", BOOLS, "!t && f")
+        self.assertOutput("False", BOOLS + 'showMeYourGoods(!t && f);')
+
+    def testComparisonBindsLooserThanArithmetic(self):
+        declarations = 'mrINTernational i = 7; mrINTernational n = 3; '
+        self.assertParsed("(i < ((n * n) - 1))", declarations, "i < n * n - 1")
+        self.assertOutput("True", declarations + 'showMeYourGoods(i < n * n - 1);')
+
+    def testEqualityBindsTighterThanAnd(self):
+        self.assertParsed("((f == f) && f)", BOOLS, "f == f && f")
+        self.assertOutput("False", BOOLS + 'showMeYourGoods(f == f && f);')
+
+
+class LongExpressionTest(EngineTestCase):
+    """Neither long nor deeply nested expressions hit the recursion limit.
+    CPython cannot compile them as pyjit source, sgm runs such programs on the stack engine instead"""
+
+    ENGINES = (runStack, runRegisters)
+
+    def testLongSum(self):
+        source = f"mrINTernational x = 1; showMeYourGoods({' + '.join(['x'] * TERMS)});"
+        self.assertOutput(str(TERMS), source, self.ENGINES)
+
+    def testNestedParentheses(self):
+        # x - (x - (x - ... x)) alternates between 0 and 1, an even number of subtractions gives 1
+        source = f"mrINTernational x = 1; showMeYourGoods({'(x - ' * DEPTH}x{')' * DEPTH});"
+        self.assertOutput("1", source, self.ENGINES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import subprocess
+import sys
+import unittest
+
+from sgm_lang.Opcode import Opcode, Operation, Parameter, ParameterType
+from sgm_lang.PackedBytecode import PackedProgram
+from sgm_lang.PeepholeOptimizer import PeepholeOptimizer
+from sgm_lang.Program import Program, buildAst, generateBytecode, tokenize
+from helpers import SGM, ProgramGenerator
+
+LOOP = 'mrINTernational a = 1; mrINTernational b = 2; a = a + b; showMeYourGoods(a); ' \
+       'youSpinMeRound(a < 10) { a = a + 1; } doItIf(!(a == b)) { showMeYourGoods(a * 3); }'
+
+
+def jump(opcode: Opcode, offset: int) -> Operation:
+    return Operation(opcode, [Parameter(ParameterType.RELATIVE, offset)])
+
+
+def printConstant(value) -> Operation:
+    return Operation(Opcode.PRINTC, [Parameter(ParameterType.IMMEDIATE, value)])
+
+
+def execute(operations, slotNames=()) -> str:
+    return Program(PackedProgram.fromOperations(operations, slotNames)).run()
+
+
+class PeepholeOptimizerTest(unittest.TestCase):
+
+    def testSuperinstructions(self):
+        operations, _ = generateBytecode(buildAst(tokenize(LOOP), 1), 1)
+        opcodes = [operation.opcode for operation in operations]
+        for opcode in (Opcode.LOAD_LOAD_BINARY, Opcode.LOAD_PUSH_BINARY, Opcode.LOAD_PUSH_BINARY_JMP_NOT_IF,
+                       Opcode.DUP_STORE_SLOT):
+            with self.subTest(opcode=opcode):
+                self.assertIn(opcode, opcodes)
+        # !(a == b) jumps with JMP_IF instead of NOT, JMP_NOT_IF
+        self.assertNotIn(Opcode.NOT, opcodes)
+        self.assertIn(Opcode.JMP_IF, opcodes)
+
+    def testThreadsJumps(self):
+        operations = [jump(Opcode.JMP, 0), jump(Opcode.JMP, 1), printConstant("x"), printConstant("y")]
+        optimized = PeepholeOptimizer().optimize(operations)
+        self.assertEqual(2, optimized[0].params[0].value)
+        self.assertEqual("y", execute(optimized))
+
+    def testDropsJumpsToNextInstruction(self):
+        optimizer = PeepholeOptimizer()
+        optimized = optimizer.optimize([jump(Opcode.JMP, 0), printConstant("x")])
+        self.assertEqual([Opcode.PRINTC], [operation.opcode for operation in optimized])
+        self.assertEqual(1, optimizer.removed)
+
+    def testDoesNotFuseAcrossJumpTargets(self):
+        # The jump lands on PUSH, so LOAD_SLOT, PUSH, ADD must stay apart
+        operations = [
+            Operation(Opcode.PUSH, [Parameter(ParameterType.IMMEDIATE, 1)]),
+            Operation(Opcode.STORE_SLOT, [Parameter(ParameterType.IMMEDIATE, 0)]),
+            Operation(Opcode.PUSH, [Parameter(ParameterType.IMMEDIATE, 2)]),
+            jump(Opcode.JMP, 1),
+            Operation(Opcode.LOAD_SLOT, [Parameter(ParameterType.IMMEDIATE, 0)]),
+            Operation(Opcode.PUSH, [Parameter(ParameterType.IMMEDIATE, 3)]),
+            Operation(Opcode.IADD, []),
+            Operation(Opcode.PRINT, []),
+        ]
+        optimized = PeepholeOptimizer().optimize(operations)
+        self.assertNotIn(Opcode.LOAD_PUSH_BINARY, [operation.opcode for operation in optimized])
+        self.assertEqual(execute(operations, ["a"]), execute(optimized, ["a"]))
+
+    def testRandomPrograms(self):
+        for seed in range(200):
+            source = ProgramGenerator(seed).program()
+            with self.subTest(seed=seed, source=source):
+                ast = buildAst(tokenize(source), 1)
+                plain, slotNames = generateBytecode(ast, 0)
+                optimized, _ = generateBytecode(ast, 1)
+                try:
+                    expected = execute(plain, slotNames)
+                except Exception as e:
+                    expected = str(e)
+                try:
+                    actual = execute(optimized, slotNames)
+                except Exception as e:
+                    actual = str(e)
+                self.assertEqual(expected, actual)
+
+
+class PeepholeStatsTest(unittest.TestCase):
+
+    def stats(self, *arguments) -> str:
+        command = [sys.executable, SGM, "--peephole-stats", *arguments]
+        return subprocess.run(command, input='showMeYourGoods(1 * 2);', capture_output=True, text=True,
+                              check=True).stderr
+
+    def testReported(self):
+        self.assertRegex(self.stats("-O1"), r"peephole: \d+ -> \d+ instructions, \d+ removed")
+
+    def testNotRunAtLevelZero(self):
+        self.assertIn("peephole: not run at -O0", self.stats())
+
+    def testRejectedWithOtherEngines(self):
+        for engine in ("register", "pyjit"):
+            with self.subTest(engine=engine):
+                with self.assertRaises(subprocess.CalledProcessError) as raised:
+                    self.stats("-O1", "--engine", engine)
+                self.assertIn("--peephole-stats is not supported", raised.exception.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
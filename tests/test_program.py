@@ -0,0 +1,74 @@
+import io
+import pickle
+import threading
+import unittest
+
+from sgm_lang.DataType import DataType
+from sgm_lang.Interpreter import InterpreterException
+from sgm_lang.OutputBuffer import FlushPolicy, OutputBuffer
+from sgm_lang.Program import Program, compileProgram
+
+SQUARES = 'mrINTernational i = 0; youSpinMeRound(i < n) { showMeYourGoods(i * i); i = i + 1; }'
+
+
+class ProgramTest(unittest.TestCase):
+
+    def testRunsManyTimes(self):
+        program = compileProgram('stringiBoi s = "a"; s = s + "b"; showMeYourGoods(s);', 1)
+        self.assertEqual(["ab"] * 3, [program.run() for _ in range(3)])
+
+    def testCompilesStreams(self):
+        self.assertEqual("3", compileProgram(io.StringIO('showMeYourGoods(1 + 2);')).run())
+
+    def testOutput(self):
+        stream = io.StringIO()
+        result = compileProgram('showMeYourGoods("x");').run(output=OutputBuffer(stream, flushPolicy=FlushPolicy.EXIT))
+        self.assertIsNone(result)
+        self.assertEqual("x", stream.getvalue())
+
+    def testInputs(self):
+        program = compileProgram(SQUARES, inputs={"n": int})
+        self.assertEqual({"n": DataType.INT}, program.inputs)
+        self.assertEqual(("n", "i"), program.variables)
+        self.assertEqual("0149", program.run({"n": 4}))
+        self.assertEqual("01", program.run({"n": 2}))
+        self.assertRaises(Exception, compileProgram, SQUARES, inputs={"n": list})
+
+    def testCannotBeModified(self):
+        program = compileProgram('showMeYourGoods(1);')
+        with self.assertRaises(AttributeError):
+            program._packed = None
+        with self.assertRaises(AttributeError):
+            program.extra = 1
+
+    def testBytes(self):
+        program = compileProgram(SQUARES, 1, {"n": DataType.INT})
+        copy = Program.fromBytes(program.toBytes())
+        self.assertEqual(program.inputs, copy.inputs)
+        self.assertEqual("0149", copy.run({"n": 4}))
+
+    def testPickle(self):
+        copy = pickle.loads(pickle.dumps(compileProgram(SQUARES, 2, {"n": int})))
+        self.assertEqual("014", copy.run({"n": 3}))
+
+    def testSharedBetweenThreads(self):
+        program = compileProgram(SQUARES, 1, {"n": int})
+        results = [None] * 8
+
+        def run(index):
+            results[index] = program.run({"n": index})
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(len(results))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(["".join(str(i * i) for i in range(n)) for n in range(len(results))], results)
+
+    def testRuntimeError(self):
+        with self.assertRaises(InterpreterException):
+            compileProgram('mrINTernational z = 0; showMeYourGoods(1 / z);').run()
+
+
+if __name__ == "__main__":
+    unittest.main()
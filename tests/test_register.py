@@ -0,0 +1,29 @@
+import unittest
+
+from helpers import EngineTestCase, runRegisters
+
+DEPTH = 3000
+REGISTERS = (runRegisters,)
+
+
+class DeepExpressionTest(EngineTestCase):
+    """The register generator walks expressions without recursion, like the other generators"""
+
+    def testLongSum(self):
+        self.assertSameOutput(
+            f"mrINTernational x = 1; showMeYourGoods({' + '.join(['x'] * DEPTH)});",
+            REGISTERS)
+
+    def testNestedParentheses(self):
+        self.assertSameOutput(
+            f"mrINTernational x = 1; showMeYourGoods({'(x - ' * DEPTH}x{')' * DEPTH});",
+            REGISTERS)
+
+    def testLongShortCircuit(self):
+        self.assertSameOutput(
+            f"bool b = False; showMeYourGoods({' || '.join(['b'] * DEPTH)} || True);",
+            REGISTERS)
+
+
+if __name__ == "__main__":
+    unittest.main()
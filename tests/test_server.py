@@ -0,0 +1,155 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+from sgm_lang.Server import Server
+from helpers import SGM
+
+ENDLESS = 'mrINTernational i = 0; showMeYourGoods("start"); youSpinMeRound(True) { i = i + 1; }'
+
+
+class ServerTest(unittest.TestCase):
+    """Requests sent over the socket of a Server running in the event loop of the test"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socketPath = os.path.join(self.directory.name, "sgm.sock")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def serve(self, test, **options):
+        """Runs 'test(server, request)' while the server listens, request sends one line and returns the response"""
+        server = Server(self.socketPath, 1, **options)
+
+        async def main():
+            server.startWorkers().result()
+            listening = asyncio.Event()
+            task = asyncio.create_task(server.listen(listening.set))
+            await listening.wait()
+            reader, writer = await asyncio.open_unix_connection(self.socketPath)
+
+            async def request(message) -> dict:
+                writer.write((message if isinstance(message, str) else json.dumps(message)).encode() + b"\n")
+                await writer.drain()
+                return json.loads(await reader.readline())
+
+            try:
+                await test(server, request)
+            finally:
+                writer.close()
+                task.cancel()
+                server.executor.shutdown(cancel_futures=True)
+
+        asyncio.run(main())
+
+    def testRequest(self):
+        async def test(server, request):
+            source = 'mrINTernational r = n * 2; showMeYourGoods(r);'
+            response = await request({"source": source, "level": 1, "inputs": {"n": 21}})
+            self.assertEqual("42", response["output"])
+            self.assertEqual({"n": 21, "r": 42}, response["variables"])
+            # The program is run again by its key, with other inputs
+            response = await request({"key": response["key"], "inputs": {"n": 2}})
+            self.assertEqual(("4", {"n": 2, "r": 4}), (response["output"], response["variables"]))
+            # The key depends on the level and input types
+            keys = {(await request({"source": source, "level": level, "inputs": {"n": n}}))["key"]
+                    for level in (0, 1) for n in (1, 1.5)}
+            self.assertEqual(4, len(keys))
+
+        self.serve(test)
+
+    def testErrors(self):
+        async def test(server, request):
+            response = await request({"source": 'showMeYourGoods("a"); showMeYourGoods(1 % z);', "inputs": {"z": 0}})
+            self.assertEqual("a", response["output"])
+            self.assertIn("integer modulo by zero", response["error"])
+            self.assertIn("Invalid syntax", (await request({"source": 'showMeYourGoods(;'}))["error"])
+            self.assertIn("Unknown program", (await request({"key": "0" * 64}))["error"])
+            self.assertIn("Invalid request", (await request("{"))["error"])
+            self.assertIn("Invalid request", (await request({"source": "", "inputs": {"x": [1]}}))["error"])
+
+        self.serve(test)
+
+    def testBudget(self):
+        async def test(server, request):
+            response = await request({"source": ENDLESS})
+            self.assertEqual("start", response["output"])
+            self.assertIn("Instruction budget of 10000 exceeded", response["error"])
+            # The worker is free for the next request
+            self.assertEqual("1", (await request({"source": 'showMeYourGoods(1);'}))["output"])
+
+        self.serve(test, maxInstructions=10000, timeout=None)
+
+    def testTimeout(self):
+        async def test(server, request):
+            self.assertIn("Time budget of 0.1 seconds exceeded", (await request({"source": ENDLESS}))["error"])
+
+        self.serve(test, timeout=0.1)
+
+    def testJitThresholdNeedsNoBudget(self):
+        self.assertRaises(ValueError, Server, self.socketPath, jitThreshold=10)
+        Server(self.socketPath, jitThreshold=10, timeout=None)
+
+    def testBrokenWorkers(self):
+        async def test(server, request):
+            source = {"source": 'showMeYourGoods(1);'}
+            self.assertEqual("1", (await request(source))["output"])
+            broken = server.executor
+            with self.assertRaises(BrokenProcessPool):
+                broken.submit(os._exit, 1).result()
+            self.assertIn("worker process running the program died", (await request(source))["error"])
+            self.assertIsNot(broken, server.executor)
+            self.assertEqual("1", (await request(source))["output"])
+
+        self.serve(test)
+
+    def testRunningServer(self):
+        async def test(server, request):
+            with self.assertRaises(OSError):
+                Server(self.socketPath).removeStaleSocket()
+
+        self.serve(test)
+
+
+class ServeCommandTest(unittest.TestCase):
+
+    def testClient(self):
+        with tempfile.TemporaryDirectory() as directory:
+            environment = dict(os.environ, SGM_SOCKET=os.path.join(directory, "sgm.sock"))
+            server = subprocess.Popen([sys.executable, SGM, "serve", "-j", "1", "--max-instructions", "5000"],
+                                      env=environment, stderr=subprocess.PIPE, text=True)
+            try:
+                self.assertIn("serving on", server.stderr.readline())
+                client = [sys.executable, SGM, "--client", "--input", "n=4"]
+                finished = subprocess.run(client, input='showMeYourGoods(n * n);', env=environment,
+                                          capture_output=True, text=True)
+                self.assertEqual((0, "16"), (finished.returncode, finished.stdout))
+                finished = subprocess.run([sys.executable, SGM, "--client"], input=ENDLESS, env=environment,
+                                          capture_output=True, text=True)
+                self.assertEqual((1, "start"), (finished.returncode, finished.stdout))
+                self.assertIn("Instruction budget", finished.stderr)
+            finally:
+                server.terminate()
+                server.wait()
+            self.assertFalse(os.path.exists(environment["SGM_SOCKET"]))
+
+    def testDefaultSocketDirectoryMustBePrivate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            environment = {name: value for name, value in os.environ.items()
+                           if name not in ("SGM_SOCKET", "XDG_RUNTIME_DIR")}
+            environment["TMPDIR"] = directory
+            os.mkdir(os.path.join(directory, f"sgm-{os.getuid()}"), 0o755)
+            os.chmod(os.path.join(directory, f"sgm-{os.getuid()}"), 0o755)
+            finished = subprocess.run([sys.executable, SGM, "serve"], env=environment, capture_output=True, text=True)
+            self.assertEqual(1, finished.returncode)
+            self.assertIn("is not a directory accessible only to you", finished.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from helpers import EngineTestCase, run
+
+
+class ShortCircuitTest(EngineTestCase):
+    """&& and || of bools skip the right operand when the left one decides the result"""
+
+    def testSkipsRightOperand(self):
+        self.assertOutput("False", 'showMeYourGoods(False && (1 / 0 > 0));')
+        self.assertOutput("True", 'showMeYourGoods(True || (1 / 0 > 0));')
+
+    def testCondition(self):
+        self.assertOutput("2", 'mrINTernational z = 0; '
+                               'doItIf(!(z == 0) && 1 / z > 0) { showMeYourGoods(1); } showMeYourGoods(2);')
+
+    def testEvaluatesRightOperandWhenNeeded(self):
+        # The loop runs while z < 3, then || has to evaluate 1 / 0
+        self.assertFails("division by zero",
+                         'mrINTernational z = 0; youSpinMeRound(z < 3 || 1 / 0 > 0) { z = z + 1; } showMeYourGoods(z);')
+
+    def testIntsAreBitwise(self):
+        self.assertOutput("27", 'showMeYourGoods(6 && 3); showMeYourGoods(6 || 3);')
+        self.assertFails("integer modulo by zero", 'mrINTernational z = 0; showMeYourGoods(0 && 1 % z);')
+
+    def testJit(self):
+        source = 'mrINTernational i = 0; bool b = False; ' \
+                 'youSpinMeRound(i < 50) { b = i > 45 || (i < 0 && 1 % 0 == 0); ' \
+                 'doItIf(b) { showMeYourGoods(i); } i = i + 1; }'
+        self.assertEqual(("46474849", None), run(source, 0))
+        self.assertEqual(run(source, 0), run(source, 1, jitThreshold=1))
@@ -0,0 +1,40 @@
+import io
+import random
+import unittest
+
+from sgm_lang.tokenizer import Tokenizer, TokenizerError
+
+PIECES = ['"ab\\"c"', '"x\ny"', '"\\\\"', ' ', '\n', 'abc', '12', '1.5', '<=', '&&', '=', '(', ';', '#c"m\n', '"', '\\']
+
+
+def tokens(source: str, chunkSize: int = None):
+    """(type, value, line, column) of every token, or the error message"""
+    tokenizer = Tokenizer(source) if chunkSize is None else Tokenizer.fromStream(io.StringIO(source), chunkSize)
+    try:
+        return [(token.type, token.value, token.line, token.column) for token in tokenizer.generateTokens()]
+    except TokenizerError as e:
+        return str(e)
+
+
+class ChunkedTokenizerTest(unittest.TestCase):
+    """Reading the source in chunks gives the same tokens, positions and errors as reading it whole"""
+
+    def testRandomSources(self):
+        for seed in range(2000):
+            generator = random.Random(seed)
+            source = "".join(generator.choice(PIECES) for _ in range(generator.randint(0, 15)))
+            expected = tokens(source)
+            for chunkSize in (1, 2, 3, 5):
+                with self.subTest(source=source, chunkSize=chunkSize):
+                    self.assertEqual(expected, tokens(source, chunkSize))
+
+    def testStringOverManyChunks(self):
+        text = "a\\\"b\n" * 1000
+        self.assertEqual(tokens(f'x "{text}" y', 7), tokens(f'x "{text}" y'))
+
+    def testUnfinishedStringPosition(self):
+        self.assertEqual("Unfinished String at line 3, column 2", tokens('x\n\n "abc', 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
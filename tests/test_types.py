@@ -0,0 +1,91 @@
+import unittest
+
+from sgm_lang.Opcode import Opcode
+from sgm_lang.Program import ExecutionContext, buildAst, compileProgram, generateBytecode, tokenize
+from helpers import LEVELS, EngineTestCase
+
+INT_TO_FLOAT = """
+boatWhichFloat x = 1;
+mrINTernational i = 3;
+boatWhichFloat y = i * 2;
+showMeYourGoods(x); showMeYourGoods(" "); showMeYourGoods(y); showMeYourGoods(" ");
+y = i;
+showMeYourGoods(y / 1); showMeYourGoods(" ");
+youSpinMeRound(i < 5) { x = i; i = i + 1; showMeYourGoods(x); }
+"""
+
+
+class IntToFloatTest(EngineTestCase):
+    """An int assigned to a boatWhichFloat variable is converted, so the variable holds a float"""
+
+    def testOutput(self):
+        self.assertOutput("1.0 6.0 3.0 3.04.0", INT_TO_FLOAT)
+
+    def testVariables(self):
+        for level in LEVELS:
+            with self.subTest(level=level):
+                variables = ExecutionContext(compileProgram(INT_TO_FLOAT, level)).run()
+                self.assertEqual({"x": float, "y": float, "i": int},
+                                 {name: type(variables[name]) for name in ("x", "y", "i")})
+
+    def testJit(self):
+        program = compileProgram(INT_TO_FLOAT, 1)
+        self.assertEqual("1.0 6.0 3.0 3.04.0", program.run(jitThreshold=1))
+
+
+class TypeCheckerTest(unittest.TestCase):
+    """Programs with type errors are rejected before they run"""
+
+    def assertRejected(self, source: str, message: str):
+        for level in LEVELS:
+            with self.subTest(level=level):
+                with self.assertRaises(Exception) as raised:
+                    compileProgram(source, level)
+                self.assertEqual(message, str(raised.exception))
+
+    def testAssignmentOfWrongType(self):
+        self.assertRejected('bool zmienna = 1 + 3;',
+                            "Type error at line 1, column 14: cannot assign mrINTernational to bool variable zmienna")
+        self.assertRejected('mrINTernational x = 1;\nx = 1.5;',
+                            "Type error at line 2, column 3: cannot assign boatWhichFloat to mrINTernational variable x")
+
+    def testOperatorOfWrongTypes(self):
+        self.assertRejected('showMeYourGoods("a" - 1);',
+                            "Type error at line 1, column 21: - cannot be applied to stringiBoi and mrINTernational")
+
+    def testUndefinedVariables(self):
+        self.assertRejected('showMeYourGoods(y);', "Variable y was not defined")
+        self.assertRejected('mrINTernational x = 1; mrINTernational x = 2;', "Variable x redefinition")
+
+    def testErrorBeforeAnyOutput(self):
+        with self.assertRaises(Exception):
+            compileProgram('showMeYourGoods("printed"); stringiBoi s = True;')
+
+    def testInputs(self):
+        program = compileProgram('boatWhichFloat r = n * 2;', inputs={"n": int})
+        self.assertEqual({"n": 3, "r": 6.0}, ExecutionContext(program).run({"n": 3}))
+        self.assertRaises(Exception, compileProgram, 'bool r = n;', inputs={"n": int})
+
+
+class TypedOpcodeTest(unittest.TestCase):
+
+    def opcodes(self, source: str) -> list:
+        operations, _ = generateBytecode(buildAst(tokenize(source)))
+        return [operation.opcode for operation in operations]
+
+    def testOperandTypesSelectOpcodes(self):
+        source = 'mrINTernational i = 1; boatWhichFloat f = 0.5; stringiBoi s = "a"; ' \
+                 'showMeYourGoods(i + i); showMeYourGoods(f + i); showMeYourGoods(s + s); showMeYourGoods(i / i);'
+        opcodes = self.opcodes(source)
+        for opcode in (Opcode.IADD, Opcode.FADD, Opcode.SCONCAT, Opcode.FDIV):
+            with self.subTest(opcode=opcode):
+                self.assertIn(opcode, opcodes)
+        self.assertNotIn(Opcode.ADD, opcodes)
+
+    def testMixedTypesKeepGenericOpcodes(self):
+        # bool + int is accepted by the runtime, but has no typed opcode
+        self.assertIn(Opcode.ADD, self.opcodes('showMeYourGoods(1 + True);'))
+
+
+if __name__ == "__main__":
+    unittest.main()